@@ -12,7 +12,17 @@ def _ignore_warnings():
 
 _ignore_warnings()
 
-from .backend import download_df, serving, slackbot, upload_df
+from .backend import (
+    AdaptiveConcurrencyConfig,
+    CacheConfig,
+    StreamConfig,
+    TenantConfig,
+    WorkspaceFile,
+    download_df,
+    serving,
+    slackbot,
+    upload_df,
+)
 from .backend.slackbot import SlackBot
 from .backend.slackbot.memory import MemoryMode, get_memory
 
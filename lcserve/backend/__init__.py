@@ -1,4 +1,9 @@
 from .agentexecutor import ChainExecutor, LangchainAgentExecutor
+from .caching import CacheConfig
 from .decorators import serving, slackbot
 from .gateway import LangchainFastAPIGateway, PlaygroundGateway, ServingGateway
+from .limiter import AdaptiveConcurrencyConfig
+from .scheduling import TenantConfig
+from .streaming import StreamConfig
+from .uploads import WorkspaceFile
 from .utils import download_df, upload_df
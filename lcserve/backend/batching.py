@@ -0,0 +1,118 @@
+import asyncio
+import json
+import time
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Dict, List, Optional
+
+if TYPE_CHECKING:
+    from opentelemetry.sdk.metrics import Histogram
+
+
+def get_batch_item_type(annotation: Any) -> Any:
+    """Returns `T` for a `List[T]` annotation, None for anything else"""
+    if getattr(annotation, '__origin__', None) in (list, List):
+        _args = getattr(annotation, '__args__', None)
+        return _args[0] if _args else Any
+    return None
+
+
+def make_batch_key(envs: Dict, auth_response: Any = None) -> str:
+    """Requests are only batched together if they share envs & auth_response"""
+    return json.dumps([envs, auth_response], sort_keys=True, default=str)
+
+
+class _PendingBatch:
+    def __init__(self, run_batch: Callable[[List[Dict]], Awaitable[List[Any]]]):
+        self.run_batch = run_batch
+        self.items: List[Dict] = []
+        self.futures: List[asyncio.Future] = []
+        self.created_at = time.perf_counter()
+        self.timer: Optional[asyncio.TimerHandle] = None
+
+
+class MicroBatcher:
+    """Collects concurrent requests of a route into batches.
+
+    A batch is run as soon as it has `max_batch_size` items, or `max_wait_ms` after its first
+    item arrived, whichever comes first. `run_batch` gets the list of items and must return
+    one result per item, which is then sent back to the request waiting on it.
+    """
+
+    def __init__(
+        self,
+        route: str,
+        max_batch_size: int = 32,
+        max_wait_ms: float = 10,
+        batch_size_histogram: Optional['Histogram'] = None,
+        batch_wait_histogram: Optional['Histogram'] = None,
+    ):
+        if max_batch_size < 1:
+            raise ValueError(
+                f'max_batch_size must be a positive integer, got {max_batch_size}'
+            )
+        if max_wait_ms < 0:
+            raise ValueError(f'max_wait_ms must be non-negative, got {max_wait_ms}')
+
+        self.route = route
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.batch_size_histogram = batch_size_histogram
+        self.batch_wait_histogram = batch_wait_histogram
+        self._pending: Dict[str, _PendingBatch] = {}
+
+    async def submit(
+        self,
+        key: str,
+        item: Dict,
+        run_batch: Callable[[List[Dict]], Awaitable[List[Any]]],
+    ) -> Any:
+        loop = asyncio.get_event_loop()
+        _batch = self._pending.get(key)
+        if _batch is None:
+            _batch = _PendingBatch(run_batch)
+            _batch.timer = loop.call_later(self.max_wait_ms / 1000, self._flush, key)
+            self._pending[key] = _batch
+
+        _future = loop.create_future()
+        _batch.items.append(item)
+        _batch.futures.append(_future)
+        if len(_batch.items) >= self.max_batch_size:
+            self._flush(key)
+
+        return await _future
+
+    def _flush(self, key: str):
+        _batch = self._pending.pop(key, None)
+        if _batch is None:
+            return
+
+        _batch.timer.cancel()
+        asyncio.ensure_future(self._execute(_batch))
+
+    async def _execute(self, batch: _PendingBatch):
+        _attrs = {'route': self.route}
+        if self.batch_size_histogram:
+            self.batch_size_histogram.record(len(batch.items), _attrs)
+        if self.batch_wait_histogram:
+            self.batch_wait_histogram.record(
+                time.perf_counter() - batch.created_at, _attrs
+            )
+
+        try:
+            _results = await batch.run_batch(batch.items)
+            if len(_results) != len(batch.items):
+                raise ValueError(
+                    f'Batched function of `{self.route}` returned {len(_results)} results '
+                    f'for {len(batch.items)} inputs'
+                )
+        except BaseException as e:
+            for _future in batch.futures:
+                if not _future.done():
+                    _future.set_exception(e)
+            if not isinstance(e, Exception):
+                raise
+            return
+
+        for _future, _result in zip(batch.futures, _results):
+            # the request might have been cancelled while waiting on the batch
+            if not _future.done():
+                _future.set_result(_result)
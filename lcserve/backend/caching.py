@@ -0,0 +1,361 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Dict, Optional, Tuple, Union
+
+from pydantic import BaseModel
+
+from .playground.utils.helper import run_in_executor
+
+if TYPE_CHECKING:
+    from opentelemetry.sdk.metrics import Counter
+
+CACHE_DB_NAME = 'cache.sqlite'
+AUTH_CACHE_MAX_ENTRIES = 10000
+
+
+class CacheBackend:
+    MEMORY = 'memory'
+    WORKSPACE = 'workspace'
+
+
+@dataclass
+class CacheConfig:
+    """Configuration of the response cache of a `@serving` route.
+
+    :param ttl: seconds after which an entry expires, never if None
+    :param max_entries: maximum number of entries, least recently used ones are evicted first
+    :param backend: `memory` for an in-process LRU, `workspace` for a SQLite store in the
+        workspace, that survives restarts
+    :param include_envs: whether `envs` of the request are part of the cache key
+    :param vary_on_auth: whether the `auth_response` of the request is part of the cache key,
+        so that users don't get each other's responses
+    :param key: the part of the `auth_response` in the cache key, the whole `auth_response`
+        if None, the item or attribute of that name if a string, else a callable. It must
+        be JSON serializable.
+    """
+
+    ttl: Optional[float] = None
+    max_entries: int = 1024
+    backend: str = CacheBackend.MEMORY
+    include_envs: bool = False
+    vary_on_auth: bool = True
+    key: Union[str, Callable[[Any], Any], None] = None
+
+    def __post_init__(self):
+        if self.backend not in (CacheBackend.MEMORY, CacheBackend.WORKSPACE):
+            raise ValueError(
+                f'cache backend must be one of `memory` or `workspace`, got {self.backend}'
+            )
+        if self.max_entries < 1:
+            raise ValueError(
+                f'max_entries must be a positive integer, got {self.max_entries}'
+            )
+
+    def get_auth_key(self, auth_response: Any) -> Any:
+        if not self.vary_on_auth or auth_response is None:
+            return None
+        if callable(self.key):
+            return self.key(auth_response)
+        if self.key is None:
+            return auth_response
+        if isinstance(auth_response, dict):
+            return auth_response.get(self.key)
+        return getattr(auth_response, self.key, None)
+
+
+def make_cache_key(
+    route: str,
+    input_data: BaseModel,
+    include_envs: bool = False,
+    auth_response: Any = None,
+) -> str:
+    """Canonical hash of the validated input of a request.
+
+    Raises `TypeError` if `auth_response` isn't JSON serializable, as the string of an
+    arbitrary object may differ between requests of the same user, or match other users.
+    """
+    _data = input_data.dict()
+    if not include_envs:
+        _data.pop('envs', None)
+    if auth_response is not None:
+        try:
+            json.dumps(auth_response)
+        except (TypeError, ValueError) as e:
+            raise TypeError(
+                f'`auth_response` of type {type(auth_response).__name__} of route {route} '
+                "is not JSON serializable, it can't be part of a cache key. "
+                'Pick a JSON serializable part of it with `CacheConfig(key=...)`'
+            ) from e
+        _data['__auth_response__'] = auth_response
+
+    _canonical = json.dumps(
+        _data, sort_keys=True, separators=(',', ':'), ensure_ascii=False, default=str
+    )
+    return f'{route}:' + hashlib.sha256(_canonical.encode('utf-8')).hexdigest()
+
+
+class MemoryCache:
+    """In-process LRU cache with optional expiry, only accessed from the event loop"""
+
+    def __init__(self, max_entries: int, ttl: Optional[float] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: 'OrderedDict[str, Tuple[Optional[float], Dict]]' = OrderedDict()
+
+    async def get(self, key: str) -> Optional[Dict]:
+        _entry = self._entries.get(key)
+        if _entry is None:
+            return None
+
+        _expires_at, _value = _entry
+        if _expires_at is not None and _expires_at < time.time():
+            del self._entries[key]
+            return None
+
+        self._entries.move_to_end(key)
+        return _value
+
+    async def set(self, key: str, value: Dict):
+        _expires_at = time.time() + self.ttl if self.ttl is not None else None
+        self._entries[key] = (_expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def clear(self) -> int:
+        _count = len(self._entries)
+        self._entries.clear()
+        return _count
+
+
+class WorkspaceCache:
+    """SQLite cache stored in the workspace, so that entries survive restarts.
+
+    Queries run on the default executor, since the workspace can be a network filesystem.
+    """
+
+    def __init__(
+        self, workspace: str, route: str, max_entries: int, ttl: Optional[float] = None
+    ):
+        self.route = route
+        self.max_entries = max_entries
+        self.ttl = ttl
+        _dir = os.path.join(workspace, '.lcserve')
+        os.makedirs(_dir, exist_ok=True)
+        self.path = os.path.join(_dir, CACHE_DB_NAME)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            self.path, check_same_thread=False, isolation_level=None
+        )
+        with self._lock:
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS cache ('
+                'key TEXT PRIMARY KEY, route TEXT NOT NULL, value TEXT NOT NULL, '
+                'expires_at REAL, accessed_at REAL NOT NULL)'
+            )
+            self._conn.execute(
+                'CREATE INDEX IF NOT EXISTS cache_route_accessed_at '
+                'ON cache (route, accessed_at)'
+            )
+
+    def _get(self, key: str) -> Optional[Dict]:
+        _now = time.time()
+        with self._lock:
+            _row = self._conn.execute(
+                'SELECT value, expires_at FROM cache WHERE key = ?', (key,)
+            ).fetchone()
+            if _row is None:
+                return None
+
+            _value, _expires_at = _row
+            if _expires_at is not None and _expires_at < _now:
+                self._conn.execute('DELETE FROM cache WHERE key = ?', (key,))
+                return None
+
+            self._conn.execute(
+                'UPDATE cache SET accessed_at = ? WHERE key = ?', (_now, key)
+            )
+        return json.loads(_value)
+
+    def _set(self, key: str, value: Dict):
+        _now = time.time()
+        _expires_at = _now + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?, ?)',
+                (key, self.route, json.dumps(value), _expires_at, _now),
+            )
+            self._conn.execute(
+                'DELETE FROM cache WHERE key IN ('
+                'SELECT key FROM cache WHERE route = ? '
+                'ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)',
+                (self.route, self.max_entries),
+            )
+
+    def _clear(self) -> int:
+        with self._lock:
+            return self._conn.execute(
+                'DELETE FROM cache WHERE route = ?', (self.route,)
+            ).rowcount
+
+    async def get(self, key: str) -> Optional[Dict]:
+        return await run_in_executor(None, self._get, key=key)
+
+    async def set(self, key: str, value: Dict):
+        return await run_in_executor(None, self._set, key=key, value=value)
+
+    async def clear(self) -> int:
+        return await run_in_executor(None, self._clear)
+
+
+class RouteCache:
+    """Response cache of a single `@serving` route, counting hits & misses"""
+
+    def __init__(
+        self,
+        route: str,
+        config: CacheConfig,
+        workspace: str,
+        hit_counter: Optional['Counter'] = None,
+        miss_counter: Optional['Counter'] = None,
+    ):
+        self.route = route
+        self.config = config
+        self.hit_counter = hit_counter
+        self.miss_counter = miss_counter
+        if config.backend == CacheBackend.WORKSPACE:
+            self._backend = WorkspaceCache(
+                workspace=workspace,
+                route=route,
+                max_entries=config.max_entries,
+                ttl=config.ttl,
+            )
+        else:
+            self._backend = MemoryCache(max_entries=config.max_entries, ttl=config.ttl)
+
+    def key(self, input_data: BaseModel, auth_response: Any = None) -> str:
+        return make_cache_key(
+            route=self.route,
+            input_data=input_data,
+            include_envs=self.config.include_envs,
+            auth_response=self.config.get_auth_key(auth_response),
+        )
+
+    async def get(self, key: str) -> Optional[Dict]:
+        _value = await self._backend.get(key)
+        _counter = self.hit_counter if _value is not None else self.miss_counter
+        if _counter:
+            _counter.add(1, {'route': self.route})
+        return _value
+
+    async def set(self, key: str, value: Dict):
+        await self._backend.set(key, value)
+
+    async def clear(self) -> int:
+        return await self._backend.clear()
+
+
+class SingleFlight:
+    """Shares a single execution between concurrent requests with the same key.
+
+    The execution runs as a separate task, so that a disconnecting request doesn't
+    cancel it for the others waiting on it.
+    """
+
+    def __init__(self, route: str, coalesced_counter: Optional['Counter'] = None):
+        self.route = route
+        self.coalesced_counter = coalesced_counter
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    def key(self, input_data: BaseModel, auth_response: Any = None) -> Optional[str]:
+        """None if the request can't be told apart from others, i.e. its `auth_response`
+        isn't JSON serializable, and must not be coalesced"""
+        try:
+            return make_cache_key(
+                route=self.route,
+                input_data=input_data,
+                include_envs=True,
+                auth_response=auth_response,
+            )
+        except TypeError:
+            return None
+
+    async def do(self, key: str, func: Callable[[], Awaitable[Any]]) -> Any:
+        _task = self._inflight.get(key)
+        if _task is None:
+            _task = asyncio.ensure_future(func())
+            self._inflight[key] = _task
+            _task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        elif self.coalesced_counter:
+            self.coalesced_counter.add(1, {'route': self.route})
+
+        return await asyncio.shield(_task)
+
+
+class AuthCache:
+    """Caches the `auth_response` of each bearer token, so that the auth function (often a
+    remote identity provider) isn't called on every request.
+
+    Concurrent lookups of the same token share a single call. Failures are cached for
+    `negative_ttl` seconds if set, so that a flood of invalid tokens doesn't reach the
+    identity provider either. Tokens are only kept hashed.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        ttl: float,
+        negative_ttl: Optional[float] = None,
+        max_entries: int = AUTH_CACHE_MAX_ENTRIES,
+        hit_counter: Optional['Counter'] = None,
+        miss_counter: Optional['Counter'] = None,
+    ):
+        if ttl <= 0 or (negative_ttl is not None and negative_ttl <= 0):
+            raise ValueError('auth cache ttls must be positive numbers')
+
+        self.name = name
+        self.negative_ttl = negative_ttl
+        self.hit_counter = hit_counter
+        self.miss_counter = miss_counter
+        self._responses = MemoryCache(max_entries=max_entries, ttl=ttl)
+        self._failures = MemoryCache(max_entries=max_entries, ttl=negative_ttl)
+        self._singleflight = SingleFlight(route=name)
+
+    def _count(self, hit: bool):
+        _counter = self.hit_counter if hit else self.miss_counter
+        if _counter:
+            _counter.add(1, {'auth': self.name})
+
+    async def authorize(self, token: str, lookup: Callable[[], Awaitable[Any]]) -> Any:
+        """Returns the cached `auth_response` of the token, else awaits `lookup()`"""
+        _key = hashlib.sha256(token.encode('utf-8')).hexdigest()
+        _cached = await self._responses.get(_key)
+        if _cached is not None:
+            self._count(hit=True)
+            return _cached['auth_response']
+
+        _failed = await self._failures.get(_key)
+        if _failed is not None:
+            self._count(hit=True)
+            raise PermissionError(_failed['error'])
+
+        self._count(hit=False)
+        return await self._singleflight.do(_key, lambda: self._lookup(_key, lookup))
+
+    async def _lookup(self, key: str, lookup: Callable[[], Awaitable[Any]]) -> Any:
+        try:
+            _auth_response = await lookup()
+        except Exception as e:
+            if self.negative_ttl is not None:
+                await self._failures.set(key, {'error': str(e)})
+            raise
+
+        await self._responses.set(key, {'auth_response': _auth_response})
+        return _auth_response
@@ -0,0 +1,244 @@
+import asyncio
+import threading
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    List,
+    Optional,
+)
+
+from ..errors import RouteOverloadedError, RunCancelledError
+
+if TYPE_CHECKING:
+    from fastapi import Request, WebSocket
+    from opentelemetry.metrics import Counter
+
+
+class CancelReason:
+    CANCELLED = 'cancelled'
+    DISCONNECTED = 'disconnected'
+    TIMEOUT = 'timeout'
+
+
+class RunOutcome:
+    COMPLETED = 'completed'
+    FAILED = 'failed'
+    CANCELLED = 'cancelled'
+    TIMEOUT = 'timeout'
+
+
+class CancelToken:
+    """Cooperative cancellation of a sync function, passed as `cancel_token` in `kwargs`.
+
+    Threads can't be interrupted, so a sync function checks `cancelled` (or calls
+    `raise_if_cancelled()`) between its steps, to stop once its client is gone or its
+    deadline has passed.
+    """
+
+    def __init__(self):
+        self.reason: Optional[str] = None
+        self._event = threading.Event()
+        self._callbacks: List[Callable[['CancelToken'], Any]] = []
+
+    @classmethod
+    def all_of(cls, tokens: List['CancelToken']) -> 'CancelToken':
+        """A token cancelled once all of `tokens` are, e.g. those of the requests sharing
+        a batched run. It can still be cancelled on its own, e.g. by a deadline.
+        """
+        _token = cls()
+
+        def _on_cancel(token: 'CancelToken'):
+            if all(t.cancelled for t in tokens):
+                _token.cancel(token.reason)
+
+        for _t in tokens:
+            _t.add_callback(_on_cancel)
+        return _token
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self, reason: str = CancelReason.DISCONNECTED):
+        if not self._event.is_set():
+            self.reason = reason
+            self._event.set()
+            for _callback in self._callbacks:
+                _callback(self)
+
+    def add_callback(self, callback: Callable[['CancelToken'], Any]):
+        """Calls `callback(token)` once the token is cancelled, right away if it already is"""
+        self._callbacks.append(callback)
+        if self.cancelled:
+            callback(self)
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Sleeps for up to `timeout` seconds, returns True as soon as the run is cancelled"""
+        return self._event.wait(timeout)
+
+    def raise_if_cancelled(self):
+        if self.cancelled:
+            raise asyncio.CancelledError(f'Run cancelled: {self.reason}')
+
+
+class RunGuard:
+    """Runs the calls of a route under its deadline, and cancels them if their client
+    disconnects. Counts the outcome of every run.
+
+    Async functions are cancelled right away, sync functions are told to stop through
+    their `CancelToken`.
+    """
+
+    def __init__(
+        self,
+        route: str,
+        timeout: Optional[float] = None,
+        outcome_counter: Optional['Counter'] = None,
+    ):
+        if timeout is not None and timeout <= 0:
+            raise ValueError(f'timeout must be a positive number, got {timeout}')
+
+        self.route = route
+        self.timeout = timeout
+        self._outcome_counter = outcome_counter
+
+    def _count(self, outcome: str):
+        if self._outcome_counter is not None:
+            self._outcome_counter.add(1, {'route': self.route, 'outcome': outcome})
+
+    async def run(
+        self,
+        func: Callable[[], Awaitable[Any]],
+        cancel_token: Optional[CancelToken] = None,
+        disconnected: Optional[Callable[[], Awaitable[Any]]] = None,
+    ) -> Any:
+        """Awaits `func()`, raises `RunCancelledError` if `disconnected()` returns first or
+        the deadline passes.
+        """
+        _cancel_token = cancel_token or CancelToken()
+        _task = asyncio.ensure_future(func())
+        _watcher = asyncio.ensure_future(disconnected()) if disconnected else None
+        try:
+            _done, _ = await asyncio.wait(
+                [_t for _t in (_task, _watcher) if _t is not None],
+                timeout=self.timeout,
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+        except asyncio.CancelledError:
+            # the caller itself is cancelled, e.g. the rest of a bulk request is dropped
+            _cancel_token.cancel(CancelReason.DISCONNECTED)
+            _task.cancel()
+            self._count(RunOutcome.CANCELLED)
+            raise
+        finally:
+            if _watcher is not None:
+                _watcher.cancel()
+
+        if _task in _done:
+            try:
+                _result = _task.result()
+            except RouteOverloadedError:
+                # rejected before running, already counted as such
+                raise
+            except BaseException:
+                self._count(RunOutcome.FAILED)
+                raise
+            self._count(RunOutcome.COMPLETED)
+            return _result
+
+        if _watcher is not None and _watcher in _done:
+            _reason, _outcome = CancelReason.DISCONNECTED, RunOutcome.CANCELLED
+        else:
+            _reason, _outcome = CancelReason.TIMEOUT, RunOutcome.TIMEOUT
+
+        _cancel_token.cancel(_reason)
+        _task.cancel()
+        self._count(_outcome)
+        raise RunCancelledError(self.route, _reason, timeout=self.timeout)
+
+    async def stream(
+        self,
+        items: Callable[[], AsyncIterator[Any]],
+        cancel_token: Optional[CancelToken] = None,
+        disconnected: Optional[Callable[[], Awaitable[Any]]] = None,
+    ) -> AsyncIterator[Any]:
+        """Iterates `items()` as a single run: the deadline covers the whole stream, and
+        its outcome is counted once. Items are handed over one at a time, so the stream
+        doesn't run ahead of its consumer. Stops the stream if the consumer stops early.
+        """
+        _queue: asyncio.Queue = asyncio.Queue(maxsize=1)
+
+        async def _produce():
+            async for _item in items():
+                await _queue.put(_item)
+
+        _run = asyncio.ensure_future(
+            self.run(_produce, cancel_token=cancel_token, disconnected=disconnected)
+        )
+        _get: Optional[asyncio.Future] = None
+        try:
+            while True:
+                _get = asyncio.ensure_future(_queue.get())
+                await asyncio.wait([_get, _run], return_when=asyncio.FIRST_COMPLETED)
+                if _get.done():
+                    yield _get.result()
+                    continue
+
+                _get.cancel()
+                if _queue.empty():
+                    break
+
+            # raises the error of the stream, or the reason it was cancelled
+            _run.result()
+        finally:
+            if _get is not None:
+                _get.cancel()
+            if not _run.done():
+                # the consumer is gone, e.g. its client disconnected
+                _run.cancel()
+
+
+async def wait_for_http_disconnect(request: 'Request'):
+    """Returns once the client of a request, whose body was already read, disconnects"""
+    while True:
+        _message = await request.receive()
+        if _message['type'] == 'http.disconnect':
+            return
+
+
+class WebsocketInbox:
+    """Receives the messages of a websocket while a function runs, so that a disconnect is
+    noticed right away. Messages received meanwhile are human inputs, handed over to
+    `input()`.
+    """
+
+    def __init__(self, websocket: 'WebSocket'):
+        self.websocket = websocket
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._watching = False
+
+    async def wait_for_disconnect(self):
+        self._watching = True
+        try:
+            while True:
+                _message = await self.websocket.receive()
+                if _message['type'] == 'websocket.disconnect':
+                    self._queue.put_nowait(_message)
+                    return
+                self._queue.put_nowait(_message)
+        finally:
+            self._watching = False
+
+    async def receive_text(self) -> str:
+        from fastapi import WebSocketDisconnect
+
+        if not self._watching and self._queue.empty():
+            return await self.websocket.receive_text()
+
+        _message = await self._queue.get()
+        if _message['type'] == 'websocket.disconnect':
+            raise WebSocketDisconnect(_message.get('code', 1000))
+        return _message.get('text') or (_message.get('bytes') or b'').decode()
@@ -0,0 +1,134 @@
+import gzip
+from typing import Optional, Tuple
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from .playground.utils.helper import run_in_executor
+
+DEFAULT_MINIMUM_SIZE = 1024
+# Larger bodies are compressed on the default executor, not to block the event loop
+OFFLOAD_SIZE = 256 * 1024
+
+_COMPRESSIBLE_TYPES = (
+    'text/',
+    'application/json',
+    'application/x-ndjson',
+    'application/javascript',
+    'application/xml',
+)
+
+
+class CompressionType:
+    NONE = 'none'
+    GZIP = 'gzip'
+    BROTLI = 'br'
+
+
+def import_brotli():
+    try:
+        import brotli
+    except ImportError:
+        raise ImportError('Please install brotli using `pip install brotli`')
+    return brotli
+
+
+def _accepts(accept_encoding: str, encoding: str) -> bool:
+    for _part in accept_encoding.split(','):
+        _name, _, _params = _part.strip().partition(';')
+        if _name.strip().lower() in (encoding, '*'):
+            return _params.replace(' ', '').lower() not in ('q=0', 'q=0.0', 'q=0.00')
+    return False
+
+
+def _is_compressible(content_type: Optional[str]) -> bool:
+    return content_type is not None and content_type.startswith(_COMPRESSIBLE_TYPES)
+
+
+class CompressionMiddleware:
+    """Compresses HTTP responses with brotli or gzip, whichever the client accepts.
+
+    Only complete bodies of at least `minimum_size` bytes are compressed. Streamed
+    responses are sent as they come, so that their tokens aren't held back.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        compression: str = CompressionType.GZIP,
+        minimum_size: int = DEFAULT_MINIMUM_SIZE,
+        gzip_level: int = 6,
+        brotli_quality: int = 4,
+    ):
+        if compression not in (CompressionType.GZIP, CompressionType.BROTLI):
+            raise ValueError(
+                f'compression must be one of `gzip` or `br`, got {compression}'
+            )
+
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self._brotli = (
+            import_brotli() if compression == CompressionType.BROTLI else None
+        )
+        self._encodings: Tuple[str, ...] = (
+            (CompressionType.BROTLI, CompressionType.GZIP)
+            if self._brotli is not None
+            else (CompressionType.GZIP,)
+        )
+
+    def _compress(self, body: bytes, encoding: str) -> bytes:
+        if encoding == CompressionType.BROTLI:
+            return self._brotli.compress(body, quality=self.brotli_quality)
+        return gzip.compress(body, compresslevel=self.gzip_level)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+
+        _accept_encoding = Headers(scope=scope).get('accept-encoding', '')
+        _encoding = next(
+            (e for e in self._encodings if _accepts(_accept_encoding, e)), None
+        )
+        if _encoding is None:
+            return await self.app(scope, receive, send)
+
+        _start: Optional[Message] = None
+
+        async def _send(message: Message):
+            nonlocal _start
+            if message['type'] == 'http.response.start':
+                _start = message
+                return
+
+            if _start is None or message['type'] != 'http.response.body':
+                return await send(message)
+
+            _body = message.get('body', b'')
+            _headers = MutableHeaders(scope=_start)
+            if (
+                message.get('more_body', False)
+                or len(_body) < self.minimum_size
+                or 'content-encoding' in _headers
+                or not _is_compressible(_headers.get('content-type'))
+            ):
+                await send(_start)
+                _start = None
+                return await send(message)
+
+            if len(_body) >= OFFLOAD_SIZE:
+                _compressed = await run_in_executor(
+                    None, self._compress, body=_body, encoding=_encoding
+                )
+            else:
+                _compressed = self._compress(_body, _encoding)
+
+            _headers['Content-Encoding'] = _encoding
+            _headers['Content-Length'] = str(len(_compressed))
+            _headers.add_vary_header('Accept-Encoding')
+            await send(_start)
+            _start = None
+            await send({'type': 'http.response.body', 'body': _compressed})
+
+        await self.app(scope, receive, _send)
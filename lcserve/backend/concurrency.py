@@ -0,0 +1,405 @@
+import asyncio
+import inspect
+import math
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from contextlib import asynccontextmanager
+from importlib import import_module
+from importlib.util import module_from_spec, spec_from_file_location
+from io import BytesIO
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    AsyncIterator,
+    Callable,
+    Dict,
+    Optional,
+    Tuple,
+    Union,
+)
+
+from ..errors import RouteOverloadedError
+from .playground.utils.helper import (
+    RequestCtxtManager,
+    StdoutCapture,
+    WorkingDir,
+    install_contextual_environ,
+    run_in_executor_until_done,
+)
+from .scheduling import FairQueue, RateLimiter, TenantConfig
+from .streaming import iterate
+
+if TYPE_CHECKING:
+    from opentelemetry.sdk.metrics import Counter, Histogram, UpDownCounter
+
+QUEUE_FULL_STATUS_CODE = 429
+QUEUE_TIMEOUT_STATUS_CODE = 503
+
+
+class ExecutorType:
+    THREAD = 'thread'
+    PROCESS = 'process'
+
+
+class UploadFilePayload:
+    """Picklable copy of an `UploadFile`, rebuilt in the worker process."""
+
+    def __init__(self, filename: str, content_type: str, data: bytes):
+        self.filename = filename
+        self.content_type = content_type
+        self.data = data
+
+    @classmethod
+    async def from_upload_file(cls, upload_file: Any) -> 'UploadFilePayload':
+        data = await upload_file.read()
+        await upload_file.seek(0)
+        return cls(
+            filename=upload_file.filename,
+            content_type=upload_file.content_type,
+            data=data,
+        )
+
+    def to_upload_file(self) -> Any:
+        from fastapi import UploadFile
+        from starlette.datastructures import Headers
+
+        try:
+            return UploadFile(
+                file=BytesIO(self.data),
+                filename=self.filename,
+                headers=Headers({'content-type': self.content_type or ''}),
+            )
+        except TypeError:
+            # older starlette versions accept `content_type` instead of `headers`
+            return UploadFile(
+                filename=self.filename,
+                file=BytesIO(self.data),
+                content_type=self.content_type or '',
+            )
+
+
+class ProcessTarget:
+    """Picklable reference to a `@serving` function, resolved in the worker process.
+
+    Functions registered from a file are not importable by module name, so they are
+    loaded from their source file instead.
+    """
+
+    _resolved: Dict[Tuple[str, str, str], Callable] = {}
+
+    def __init__(self, func: Callable):
+        self.module = func.__module__
+        self.name = func.__name__
+        self.file = inspect.unwrap(func).__code__.co_filename
+
+    @property
+    def _key(self) -> Tuple[str, str, str]:
+        return self.module, self.file, self.name
+
+    def resolve(self) -> Callable:
+        if self._key in self._resolved:
+            return self._resolved[self._key]
+
+        if self.module in sys.modules:
+            mod = sys.modules[self.module]
+        else:
+            try:
+                mod = import_module(self.module)
+            except ImportError:
+                spec = spec_from_file_location(self.module, self.file)
+                mod = module_from_spec(spec)
+                spec.loader.exec_module(mod)
+
+        func = getattr(mod, self.name)
+        self._resolved[self._key] = func
+        return func
+
+
+def _init_process_worker():
+    install_contextual_environ()
+
+
+def _ping() -> int:
+    return os.getpid()
+
+
+def _call_in_process(
+    target: ProcessTarget, kwargs: Dict, envs: Dict, dirname: Optional[str]
+) -> Tuple[Any, str]:
+    func = target.resolve()
+    kwargs = {
+        k: v.to_upload_file() if isinstance(v, UploadFilePayload) else v
+        for k, v in kwargs.items()
+    }
+    # workers run a single call at a time, so the working directory can be changed directly
+    with RequestCtxtManager(envs, dirname), StdoutCapture() as stdout:
+        result = func(**kwargs)
+        if inspect.iscoroutine(result):
+            result = asyncio.run(result)
+
+    return result, stdout.buffer.getvalue()
+
+
+class RouteWorkerPool:
+    """Bounded worker pool and wait queue for a single `@serving` route.
+
+    At most `max_concurrency` invocations run at the same time. Sync functions run on
+    a dedicated pool of the same size, so a slow route can't exhaust the event loop's
+    default executor. Requests beyond that wait in a queue of `queue_size` (unbounded
+    if None). When the queue is full the request is rejected with 429, and when it
+    waits longer than `queue_timeout` seconds it is rejected with 503.
+
+    With `executor='process'`, the function runs in a pool of `workers` processes
+    started from a fork server instead. Arguments & results are pickled, uploaded files are read and
+    re-created in the worker, and the stdout of the worker is replayed in the gateway.
+
+    With `tenants`, the queue is shared fairly between the tenants of the route instead
+    of first come first served, and each tenant is rate limited on its own (see
+    `TenantConfig`). Requests over a tenant's rate or queue size are rejected with 429.
+    """
+
+    def __init__(
+        self,
+        route: str,
+        max_concurrency: Optional[int] = None,
+        queue_size: Optional[int] = None,
+        queue_timeout: Optional[float] = None,
+        executor: str = ExecutorType.THREAD,
+        workers: Optional[int] = None,
+        dirname: Optional[str] = None,
+        tenants: Optional[TenantConfig] = None,
+        queue_wait_histogram: Optional['Histogram'] = None,
+        rejected_counter: Optional['Counter'] = None,
+        tenant_queue_counter: Optional['UpDownCounter'] = None,
+    ):
+        if executor not in (ExecutorType.THREAD, ExecutorType.PROCESS):
+            raise ValueError(
+                f'executor must be one of `thread` or `process`, got {executor}'
+            )
+        if executor == ExecutorType.PROCESS:
+            workers = workers or os.cpu_count() or 1
+            max_concurrency = max_concurrency or workers
+        elif max_concurrency is None:
+            raise ValueError('max_concurrency is required for a thread worker pool')
+
+        if max_concurrency < 1:
+            raise ValueError(
+                f'max_concurrency must be a positive integer, got {max_concurrency}'
+            )
+        if queue_size is not None and queue_size < 0:
+            raise ValueError(f'queue_size must not be negative, got {queue_size}')
+
+        self.route = route
+        self.max_concurrency = max_concurrency
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.executor_type = executor
+        self.dirname = dirname
+        self.tenants = tenants
+        self.queue_wait_histogram = queue_wait_histogram
+        self.rejected_counter = rejected_counter
+        self.tenant_queue_counter = tenant_queue_counter
+        self._executor = self._create_executor(workers)
+        # created lazily, so that it binds to the loop serving the requests
+        self._semaphore: Optional[Union[asyncio.Semaphore, FairQueue]] = None
+        self._waiting = 0
+        self._running = 0
+        self._rate_limiter = (
+            RateLimiter(tenants.rate, tenants.burst)
+            if tenants is not None and tenants.rate is not None
+            else None
+        )
+
+    def _create_executor(self, workers: Optional[int]) -> Executor:
+        if self.executor_type == ExecutorType.THREAD:
+            return ThreadPoolExecutor(
+                max_workers=self.max_concurrency,
+                thread_name_prefix=f'lcserve-{self.route.strip("/")}',
+            )
+
+        # Workers aren't forked from the gateway, whose threads (e.g. the event loop)
+        # may hold locks that a forked child would inherit held
+        mp_context = multiprocessing.get_context(
+            'forkserver'
+            if 'forkserver' in multiprocessing.get_all_start_methods()
+            else 'spawn'
+        )
+        executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=mp_context,
+            initializer=_init_process_worker,
+        )
+        # Start all the workers now, rather than on the first requests
+        wait([executor.submit(_ping) for _ in range(workers)])
+        return executor
+
+    @property
+    def waiting(self) -> int:
+        return self._waiting
+
+    @property
+    def running(self) -> int:
+        return self._running
+
+    def get_tenant(self, auth_response: Any) -> Optional[str]:
+        if self.tenants is None:
+            return None
+        return self.tenants.get_tenant(auth_response)
+
+    def _reject(
+        self,
+        status_code: int,
+        retry_after: Optional[float] = None,
+        tenant: Optional[str] = None,
+    ):
+        if self.rejected_counter:
+            _attributes = {'route': self.route, 'status_code': status_code}
+            if tenant is not None:
+                _attributes['tenant'] = tenant
+            self.rejected_counter.add(1, _attributes)
+        raise RouteOverloadedError(
+            self.route, status_code=status_code, retry_after=retry_after
+        )
+
+    def _admit_tenant(self, tenant: str):
+        if self._rate_limiter is not None:
+            _retry_after = self._rate_limiter.take(tenant)
+            if _retry_after:
+                self._reject(
+                    QUEUE_FULL_STATUS_CODE,
+                    retry_after=math.ceil(_retry_after),
+                    tenant=tenant,
+                )
+
+        if (
+            self.tenants.queue_size is not None
+            and self._semaphore.locked()
+            and self._semaphore.waiting(tenant) >= self.tenants.queue_size
+        ):
+            self._reject(QUEUE_FULL_STATUS_CODE, retry_after=1, tenant=tenant)
+
+    def _acquire(self, tenant: Optional[str]):
+        if self.tenants is not None:
+            return self._semaphore.acquire(tenant, self.tenants.get_weight(tenant))
+        return self._semaphore.acquire()
+
+    @asynccontextmanager
+    async def slot(self, tenant: Optional[str] = None):
+        if self._semaphore is None:
+            self._semaphore = (
+                FairQueue(self.max_concurrency)
+                if self.tenants is not None
+                else asyncio.Semaphore(self.max_concurrency)
+            )
+
+        _attributes = {'route': self.route}
+        if self.tenants is not None:
+            tenant = tenant or ''
+            _attributes['tenant'] = tenant
+            self._admit_tenant(tenant)
+
+        if (
+            self._semaphore.locked()
+            and self.queue_size is not None
+            and self._waiting >= self.queue_size
+        ):
+            self._reject(QUEUE_FULL_STATUS_CODE, retry_after=1, tenant=tenant)
+
+        start_time = time.perf_counter()
+        self._waiting += 1
+        if self.tenant_queue_counter and self.tenants is not None:
+            self.tenant_queue_counter.add(1, _attributes)
+        try:
+            if self.queue_timeout is not None:
+                await asyncio.wait_for(self._acquire(tenant), self.queue_timeout)
+            else:
+                await self._acquire(tenant)
+        except asyncio.TimeoutError:
+            self._reject(
+                QUEUE_TIMEOUT_STATUS_CODE, retry_after=self.queue_timeout, tenant=tenant
+            )
+        finally:
+            self._waiting -= 1
+            if self.tenant_queue_counter and self.tenants is not None:
+                self.tenant_queue_counter.add(-1, _attributes)
+
+        if self.queue_wait_histogram:
+            self.queue_wait_histogram.record(
+                time.perf_counter() - start_time, _attributes
+            )
+
+        self._running += 1
+        try:
+            yield
+        finally:
+            self._running -= 1
+            self._semaphore.release()
+
+    async def run(
+        self,
+        func: Callable,
+        kwargs: Dict,
+        envs: Optional[Dict] = None,
+        tenant: Optional[str] = None,
+    ):
+        if self.executor_type == ExecutorType.PROCESS:
+            return await self._run_in_process(func, kwargs, envs or {}, tenant)
+
+        # the working directory is only taken once the call has a slot
+        async with self.slot(tenant), WorkingDir(self.dirname):
+            if inspect.iscoroutinefunction(func):
+                return await func(**kwargs)
+            else:
+                return await run_in_executor_until_done(self._executor, func, **kwargs)
+
+    async def stream(
+        self,
+        func: Callable,
+        kwargs: Dict,
+        tenant: Optional[str] = None,
+    ) -> AsyncIterator:
+        """Iterates the result of a generator function, holding its slot until the
+        generator is exhausted rather than releasing it once the generator is created.
+        """
+        async with self.slot(tenant):
+            async with WorkingDir(self.dirname):
+                if inspect.iscoroutinefunction(func):
+                    result = await func(**kwargs)
+                else:
+                    result = await run_in_executor_until_done(
+                        self._executor, func, **kwargs
+                    )
+            async for item in iterate(result, dirname=self.dirname):
+                yield item
+
+    async def _run_in_process(
+        self, func: Callable, kwargs: Dict, envs: Dict, tenant: Optional[str] = None
+    ):
+        from starlette.datastructures import UploadFile
+
+        _kwargs = {}
+        for k, v in kwargs.items():
+            if isinstance(v, UploadFile):
+                _kwargs[k] = await UploadFilePayload.from_upload_file(v)
+            else:
+                _kwargs[k] = v
+
+        async with self.slot(tenant):
+            result, stdout = await run_in_executor_until_done(
+                self._executor,
+                _call_in_process,
+                target=ProcessTarget(func),
+                kwargs=_kwargs,
+                envs=envs,
+                dirname=self.dirname,
+            )
+
+        if stdout:
+            print(stdout, end='')
+        return result
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
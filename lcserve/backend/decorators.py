@@ -1,6 +1,12 @@
 import inspect
 from functools import wraps
-from typing import Callable, Dict
+from typing import TYPE_CHECKING, Callable, Dict, Optional, Union
+
+if TYPE_CHECKING:
+    from .caching import CacheConfig
+    from .limiter import AdaptiveConcurrencyConfig
+    from .scheduling import TenantConfig
+    from .streaming import StreamConfig
 
 
 def serving(
@@ -9,8 +15,54 @@ def serving(
     websocket: bool = False,
     openai_tracing: bool = False,
     auth: Callable = None,
+    max_concurrency: Optional[int] = None,
+    queue_size: Optional[int] = None,
+    queue_timeout: Optional[float] = None,
+    executor: str = 'thread',
+    workers: Optional[int] = None,
+    capture_stdout: bool = True,
+    cache: Union['CacheConfig', bool, None] = None,
+    coalesce: bool = False,
+    batch: bool = False,
+    max_batch_size: int = 32,
+    max_wait_ms: float = 10,
+    streaming: bool = False,
+    stream_config: Optional['StreamConfig'] = None,
+    json_encoder: str = 'default',
+    timeout: Optional[float] = None,
+    multiplex: bool = False,
+    auth_cache_ttl: Optional[float] = None,
+    auth_cache_negative_ttl: Optional[float] = None,
+    tenants: Optional['TenantConfig'] = None,
+    adaptive_concurrency: Union['AdaptiveConcurrencyConfig', bool, None] = None,
 ):
+    if websocket and executor == 'process':
+        raise ValueError('`executor=\'process\'` is not supported for websocket routes')
+    if websocket and batch:
+        raise ValueError('`batch=True` is not supported for websocket routes')
+    if websocket and cache:
+        raise ValueError('`cache` is not supported for websocket routes')
+    if websocket and coalesce:
+        raise ValueError('`coalesce=True` is not supported for websocket routes')
+    if multiplex and not websocket:
+        raise ValueError('`multiplex=True` is only supported for websocket routes')
+    if tenants is not None and auth is None:
+        raise ValueError('`tenants` requires an `auth` function to identify tenants')
+    if tenants is not None and max_concurrency is None and executor != 'process':
+        raise ValueError('`tenants` requires `max_concurrency` to schedule requests')
+
     def decorator(func):
+        if multiplex:
+            # the fields of a multiplexed message tagging & cancelling an invocation
+            _reserved = {'request_id', 'cancel'} & set(
+                inspect.signature(func).parameters
+            )
+            if _reserved:
+                raise ValueError(
+                    f"`{func.__name__}` can't take {', '.join(sorted(_reserved))} with "
+                    "`multiplex=True`, they're fields of the messages of the connection"
+                )
+
         @wraps(func)
         async def async_wrapper(*args, **kwargs):
             return await func(*args, **kwargs)
@@ -32,6 +84,41 @@ def serving(
                 'openai_tracing': openai_tracing,
                 # If websocket is True, pass the callback handlers to the client.
                 'auth': auth,
+                # If auth_cache_ttl is set, results of the auth function are cached by token for that many seconds,
+                # and its failures for auth_cache_negative_ttl seconds.
+                'auth_cache_ttl': auth_cache_ttl,
+                'auth_cache_negative_ttl': auth_cache_negative_ttl,
+                # If max_concurrency is set, the route gets its own bounded worker pool & wait queue.
+                'max_concurrency': max_concurrency,
+                'queue_size': queue_size,
+                'queue_timeout': queue_timeout,
+                # If tenants is set, the queue is shared fairly & rate limited per tenant of the auth_response.
+                'tenants': tenants,
+                # If adaptive_concurrency is set, requests over a limit adapting to the latency & errors of the route are rejected with 503.
+                'adaptive_concurrency': adaptive_concurrency,
+                # If executor is `process`, the function runs in a pool of `workers` processes.
+                'executor': executor,
+                'workers': workers,
+                # If capture_stdout is False, stdout isn't captured & returned in the response.
+                'capture_stdout': capture_stdout,
+                # If cache is set, responses are cached by the input of the request.
+                'cache': cache,
+                # If coalesce is True, identical concurrent requests share a single execution.
+                'coalesce': coalesce,
+                # If batch is True, concurrent requests are collected into a single call with lists of inputs.
+                'batch': batch,
+                'max_batch_size': max_batch_size,
+                'max_wait_ms': max_wait_ms,
+                # If streaming is True, the HTTP route gets a `streaming_handler` & streams its tokens.
+                'streaming': streaming,
+                # If stream_config is set, it tunes how streamed tokens are coalesced into websocket frames.
+                'stream_config': stream_config,
+                # If json_encoder is `orjson`, responses are serialized with orjson, skipping validation of JSON-native results.
+                'json_encoder': json_encoder,
+                # If timeout is set, runs taking longer than `timeout` seconds are cancelled.
+                'timeout': timeout,
+                # If multiplex is True, a websocket connection runs concurrent invocations tagged by `request_id`.
+                'multiplex': multiplex,
             },
         }
         if websocket:
@@ -1,11 +1,14 @@
 import asyncio
+import collections.abc
 import inspect
+import json
 import os
 import shutil
 import sys
 import time
 import traceback
 import uuid
+from contextlib import nullcontext
 from enum import Enum
 from functools import cached_property
 from importlib import import_module
@@ -14,12 +17,15 @@ from pathlib import Path
 from typing import (
     TYPE_CHECKING,
     Any,
+    AsyncIterator,
     Callable,
     Dict,
+    Iterable,
     List,
     Optional,
     Tuple,
     Type,
+    TypeVar,
     Union,
 )
 
@@ -30,16 +36,50 @@ from jina.serve.runtimes.gateway.composite import CompositeGateway
 from jina.serve.runtimes.gateway.http.fastapi import FastAPIBaseGateway
 from opentelemetry.trace import get_current_span
 from pydantic import BaseModel, Field, ValidationError, create_model
-from starlette.types import ASGIApp, Receive, Scope, Send
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 from websockets.exceptions import ConnectionClosed
 
+from ..errors import RouteOverloadedError, RunCancelledError, UploadTooLargeError
+from .batching import MicroBatcher, get_batch_item_type, make_batch_key
+from .caching import AuthCache, CacheConfig, RouteCache, SingleFlight
+from .cancellation import (
+    CancelReason,
+    CancelToken,
+    RunGuard,
+    WebsocketInbox,
+    wait_for_http_disconnect,
+)
+from .compression import DEFAULT_MINIMUM_SIZE, CompressionMiddleware, CompressionType
+from .concurrency import ExecutorType, RouteWorkerPool
+from .invoker import RouteInvoker
 from .langchain_helper import (
+    AsyncStreamingQueueCallbackHandler,
     AsyncStreamingWebsocketCallbackHandler,
     BuiltinsWrapper,
     OpenAITracingCallbackHandler,
+    StreamingQueueCallbackHandler,
     StreamingWebsocketCallbackHandler,
     TracingCallbackHandler,
 )
+from .limiter import AdaptiveConcurrencyConfig, AdaptiveLimiter
+from .metrics import (
+    INTER_TOKEN_GAP_BUCKETS,
+    LLM_LATENCY_BUCKETS,
+    TIME_TO_FIRST_TOKEN_BUCKETS,
+    TOKENS_PER_SECOND_BUCKETS,
+    InflightRequests,
+    TokenHistograms,
+    TokenMetrics,
+    create_histogram,
+    get_route_path,
+)
+from .monitoring import (
+    DEFAULT_LOOP_LAG_THRESHOLD,
+    LOOP_LAG_BUCKETS,
+    InstrumentedThreadPoolExecutor,
+    LoopLagMonitor,
+)
 from .playground.utils.helper import (
     AGENT_OUTPUT,
     APPDIR,
@@ -48,22 +88,67 @@ from .playground.utils.helper import (
     LANGCHAIN_PLAYGROUND_PORT,
     RESULT,
     SERVING,
-    Capturing,
     ChangeDirCtxtManager,
     EnvironmentVarCtxtManager,
+    RequestCtxtManager,
+    StdoutCapture,
+    WorkingDir,
     import_from_string,
+    install_contextual_environ,
+    install_contextual_stdout,
     parse_uses_with,
     run_cmd,
     run_function,
 )
+from .profiling import (
+    DEFAULT_PROFILE_SECONDS,
+    MAX_PROFILE_SECONDS,
+    PROFILE_CONTENT_TYPE,
+    PROFILE_ID_HEADER,
+    PROFILE_ID_STATE,
+    InvocationProfiles,
+    SamplingProfiler,
+    get_code,
+)
+from .prometheus import CONTENT_TYPE as PROMETHEUS_CONTENT_TYPE
+from .prometheus import PrometheusRegistry
+from .scheduling import TenantConfig
+from .serialization import (
+    JSONEncoderType,
+    import_orjson,
+    is_json_native_type,
+    orjson_dumps,
+)
+from .streaming import (
+    FrameKind,
+    StreamConfig,
+    StreamingOutputResponse,
+    TokenPipeline,
+    TokenStream,
+    is_generator_function,
+    iterate,
+)
+from .uploads import WorkspaceFile, save_to_workspace, unwrap_optional
 
 if TYPE_CHECKING:
     from fastapi import FastAPI
-    from opentelemetry.sdk.metrics import Counter
+    from opentelemetry.metrics import Observation
+    from opentelemetry.sdk.metrics import Counter, Histogram
     from opentelemetry.trace import Tracer
 
 cur_dir = os.path.dirname(__file__)
 
+# Number of inputs of a bulk request run in parallel, by default & at most
+BULK_CONCURRENCY = 8
+BULK_MAX_CONCURRENCY = 64
+# Return types of generator functions, whose routes send a result per yielded item
+GENERATOR_ORIGINS = (
+    collections.abc.Generator,
+    collections.abc.Iterator,
+    collections.abc.AsyncGenerator,
+    collections.abc.AsyncIterator,
+)
+
 
 class RouteType(str, Enum):
     """RouteType is the type of route"""
@@ -291,12 +376,29 @@ class ServingGateway(FastAPIBaseGateway):
         self._modules = modules
         self._fastapi_app_str = fastapi_app_str
         self._lcserve_app = lcserve_app
+        self._route_pools: Dict[str, RouteWorkerPool] = {}
+        # functions of the routes, sampled by the profiler of a route
+        self._route_funcs: Dict[str, Callable] = {}
+        # routes sharing an auth function & its ttls share the cache of its results
+        self._auth_caches: Dict[Tuple, AuthCache] = {}
+        # envs passed with a request are only visible to that request
+        install_contextual_environ()
+        # stdout of a request is captured per request, without swapping sys.stdout
+        install_contextual_stdout()
+        # installed as the default executor of the loop on startup, to observe its saturation
+        self._default_executor = InstrumentedThreadPoolExecutor(
+            thread_name_prefix='lcserve-default'
+        )
         self._fix_sys_path()
         self._init_fastapi_app()
         self._configure_cors()
+        self._configure_compression()
         self._register_healthz()
         # _setup_metrics needs to be invoked before _register_modules since slack requires tracking metrics
         self._setup_metrics()
+        self._setup_loop_monitoring()
+        # _setup_profiling needs to be invoked before _register_modules since routes profile their invocations
+        self._setup_profiling()
         self._register_modules()
         self._setup_logging()
 
@@ -304,6 +406,12 @@ class ServingGateway(FastAPIBaseGateway):
     def app(self) -> 'FastAPI':
         return self._app
 
+    async def shutdown(self):
+        await super().shutdown()
+        self._loop_lag_monitor.stop()
+        for pool in self._route_pools.values():
+            pool.shutdown()
+
     @cached_property
     def workspace(self) -> str:
         import tempfile
@@ -321,6 +429,12 @@ class ServingGateway(FastAPIBaseGateway):
             self.logger.warning(f'Failed to get workspace directory: {e}')
             return _temp_dir
 
+    @cached_property
+    def max_upload_size(self) -> Optional[int]:
+        # Set through the envs of the gateway, e.g. with `--env`
+        _max_upload_size = os.environ.get('LCSERVE_MAX_UPLOAD_SIZE')
+        return int(_max_upload_size) if _max_upload_size else None
+
     def _init_fastapi_app(self):
         from fastapi import FastAPI
 
@@ -344,6 +458,47 @@ class ServingGateway(FastAPIBaseGateway):
                 allow_headers=['*'],
             )
 
+    def _configure_compression(self):
+        # Set through the envs of the gateway, e.g. with `--env`
+        _compression = os.environ.get('LCSERVE_COMPRESSION', CompressionType.GZIP)
+        if _compression == CompressionType.NONE:
+            return
+
+        _minimum_size = int(
+            os.environ.get('LCSERVE_COMPRESSION_MIN_SIZE', DEFAULT_MINIMUM_SIZE)
+        )
+        self.logger.info(
+            f'Enabling {_compression} compression of responses over {_minimum_size} bytes'
+        )
+        self._app.add_middleware(
+            CompressionMiddleware,
+            compression=_compression,
+            minimum_size=_minimum_size,
+        )
+
+    @staticmethod
+    def _prometheus_enabled() -> bool:
+        # Set through the envs of the gateway, e.g. with `--env`
+        return os.environ.get('LCSERVE_PROMETHEUS_METRICS', '').lower() in (
+            '1',
+            'true',
+            'yes',
+        )
+
+    def _setup_prometheus_endpoint(self) -> PrometheusRegistry:
+        from fastapi.responses import PlainTextResponse
+
+        self.logger.info('Exposing metrics in the Prometheus format at /metrics')
+        registry = PrometheusRegistry()
+
+        @self.app.get("/metrics", include_in_schema=False)
+        async def __metrics():
+            return PlainTextResponse(
+                registry.render(), media_type=PROMETHEUS_CONTENT_TYPE
+            )
+
+        return registry
+
     def _fix_sys_path(self):
         if os.getcwd() not in sys.path:
             sys.path.append(os.getcwd())
@@ -360,33 +515,300 @@ class ServingGateway(FastAPIBaseGateway):
     def _setup_metrics(self):
         from opentelemetry.instrumentation.fastapi import FastAPIInstrumentor
 
-        if not self.meter_provider:
-            self.duration_counter = None
+        if not self.meter_provider and not self._prometheus_enabled():
+            self.duration_histogram = None
+            self.token_histograms = None
             self.request_counter = None
+            self.queue_wait_histogram = None
+            self.rejected_request_counter = None
+            self.tenant_queue_counter = None
+            self.concurrency_limit_counter = None
+            self.cache_hit_counter = None
+            self.cache_miss_counter = None
+            self.coalesced_request_counter = None
+            self.batch_size_histogram = None
+            self.batch_wait_histogram = None
+            self.run_outcome_counter = None
+            self.auth_cache_hit_counter = None
+            self.auth_cache_miss_counter = None
+            self.loop_lag_histogram = None
             return
 
-        FastAPIInstrumentor.instrument_app(
-            self._app,
-            meter_provider=self.meter_provider,
-            tracer_provider=self.tracer_provider,
-        )
+        if self.meter_provider:
+            FastAPIInstrumentor.instrument_app(
+                self._app,
+                meter_provider=self.meter_provider,
+                tracer_provider=self.tracer_provider,
+            )
+            meter = self.meter
+        else:
+            meter = self._setup_prometheus_endpoint()
 
-        self.duration_counter = self.meter.create_counter(
+        self.duration_histogram = create_histogram(
+            meter,
             name="lcserve_request_duration_seconds",
             description="Lc-serve Request duration in seconds",
             unit="s",
+            boundaries=LLM_LATENCY_BUCKETS,
         )
 
-        self.request_counter = self.meter.create_counter(
+        self.request_counter = meter.create_counter(
             name="lcserve_request_count",
             description="Lc-serve Request count",
         )
 
+        self.token_histograms = TokenHistograms(
+            time_to_first_token=create_histogram(
+                meter,
+                name="lcserve_time_to_first_token_seconds",
+                description="Lc-serve time from the start of an LLM call to its first streamed token in seconds",
+                unit="s",
+                boundaries=TIME_TO_FIRST_TOKEN_BUCKETS,
+            ),
+            inter_token_gap=create_histogram(
+                meter,
+                name="lcserve_inter_token_gap_seconds",
+                description="Lc-serve time between two streamed tokens of an LLM call in seconds",
+                unit="s",
+                boundaries=INTER_TOKEN_GAP_BUCKETS,
+            ),
+            tokens_per_second=create_histogram(
+                meter,
+                name="lcserve_tokens_per_second",
+                description="Lc-serve tokens streamed per second by an LLM call, after its first token",
+                boundaries=TOKENS_PER_SECOND_BUCKETS,
+            ),
+        )
+
+        self.queue_wait_histogram = create_histogram(
+            meter,
+            name="lcserve_queue_wait_seconds",
+            description="Lc-serve time spent waiting for a route worker in seconds",
+            unit="s",
+            boundaries=LLM_LATENCY_BUCKETS,
+        )
+
+        self.rejected_request_counter = meter.create_counter(
+            name="lcserve_rejected_request_count",
+            description="Lc-serve count of requests rejected by a full route queue",
+        )
+
+        self.tenant_queue_counter = meter.create_up_down_counter(
+            name="lcserve_tenant_queue_depth",
+            description="Lc-serve number of requests waiting for a route worker per tenant",
+        )
+
+        self.concurrency_limit_counter = meter.create_up_down_counter(
+            name="lcserve_concurrency_limit",
+            description="Lc-serve adaptive limit of in-flight requests of a route",
+        )
+
+        self.cache_hit_counter = meter.create_counter(
+            name="lcserve_cache_hit_count",
+            description="Lc-serve count of responses served from the route cache",
+        )
+
+        self.cache_miss_counter = meter.create_counter(
+            name="lcserve_cache_miss_count",
+            description="Lc-serve count of requests not found in the route cache",
+        )
+
+        self.coalesced_request_counter = meter.create_counter(
+            name="lcserve_coalesced_request_count",
+            description="Lc-serve count of requests that shared the execution of an identical request",
+        )
+
+        self.batch_size_histogram = meter.create_histogram(
+            name="lcserve_batch_size",
+            description="Lc-serve number of requests per batch of a batched route",
+        )
+
+        self.batch_wait_histogram = meter.create_histogram(
+            name="lcserve_batch_wait_seconds",
+            description="Lc-serve time spent collecting a batch in seconds",
+            unit="s",
+        )
+
+        self.run_outcome_counter = meter.create_counter(
+            name="lcserve_run_count",
+            description="Lc-serve count of function runs by outcome: completed, failed, cancelled or timeout",
+        )
+
+        self.auth_cache_hit_counter = meter.create_counter(
+            name="lcserve_auth_cache_hit_count",
+            description="Lc-serve count of auth results served from the auth cache",
+        )
+
+        self.auth_cache_miss_counter = meter.create_counter(
+            name="lcserve_auth_cache_miss_count",
+            description="Lc-serve count of tokens not found in the auth cache",
+        )
+
+        # Read by the metric reader on each collection, rather than reported by each request
+        self.inflight_requests = InflightRequests()
+        meter.create_observable_gauge(
+            name="lcserve_inflight_requests",
+            callbacks=[self.inflight_requests.observe_count],
+            description="Lc-serve number of requests being served",
+        )
+        meter.create_observable_gauge(
+            name="lcserve_inflight_request_age_seconds",
+            callbacks=[self.inflight_requests.observe_age],
+            description="Lc-serve time the oldest request being served has been running in seconds",
+            unit="s",
+        )
+
+        meter.create_observable_gauge(
+            name="lcserve_route_workers_busy",
+            callbacks=[self._observe_route_workers],
+            description="Lc-serve number of running invocations of a route with a worker pool",
+        )
+        meter.create_observable_gauge(
+            name="lcserve_route_queue_depth",
+            callbacks=[self._observe_route_queues],
+            description="Lc-serve number of requests waiting for a route worker",
+        )
+
+        self.loop_lag_histogram = create_histogram(
+            meter,
+            name="lcserve_event_loop_lag_seconds",
+            description="Lc-serve delay of the event loop in running a scheduled callback in seconds",
+            unit="s",
+            boundaries=LOOP_LAG_BUCKETS,
+        )
+        meter.create_observable_gauge(
+            name="lcserve_default_executor_active",
+            callbacks=[self._observe_default_executor_active],
+            description="Lc-serve number of work items running in the default executor of the event loop",
+        )
+        meter.create_observable_gauge(
+            name="lcserve_default_executor_queued",
+            callbacks=[self._observe_default_executor_queued],
+            description="Lc-serve number of work items waiting for a thread of the default executor of the event loop",
+        )
+
         self.app.add_middleware(
             MetricsMiddleware,
-            duration_counter=self.duration_counter,
+            duration_histogram=self.duration_histogram,
             request_counter=self.request_counter,
+            inflight_requests=self.inflight_requests,
+        )
+
+    def _observe_route_workers(self, options: Any) -> Iterable['Observation']:
+        from opentelemetry.metrics import Observation
+
+        for name, pool in list(self._route_pools.items()):
+            yield Observation(pool.running, {'route': f'/{name}'})
+
+    def _observe_route_queues(self, options: Any) -> Iterable['Observation']:
+        from opentelemetry.metrics import Observation
+
+        for name, pool in list(self._route_pools.items()):
+            yield Observation(pool.waiting, {'route': f'/{name}'})
+
+    def _observe_default_executor_active(self, options: Any) -> Iterable['Observation']:
+        from opentelemetry.metrics import Observation
+
+        yield Observation(self._default_executor.active)
+
+    def _observe_default_executor_queued(self, options: Any) -> Iterable['Observation']:
+        from opentelemetry.metrics import Observation
+
+        yield Observation(self._default_executor.queued)
+
+    def _setup_loop_monitoring(self):
+        # Set through the envs of the gateway, e.g. with `--env`, 0 disables the stack dumps
+        _threshold = float(
+            os.environ.get('LCSERVE_LOOP_LAG_THRESHOLD', DEFAULT_LOOP_LAG_THRESHOLD)
+        )
+        self._loop_lag_monitor = LoopLagMonitor(
+            logger=self.logger,
+            threshold=_threshold,
+            lag_histogram=self.loop_lag_histogram,
+        )
+
+        # the loop serving the app only runs from the startup of the server
+        @self.app.on_event('startup')
+        async def __start_loop_monitoring():
+            asyncio.get_running_loop().set_default_executor(self._default_executor)
+            self._loop_lag_monitor.start()
+
+    def _setup_profiling(self):
+        # Set through the envs of the gateway, e.g. with `--env`, profiling is disabled without it
+        _token = os.environ.get('LCSERVE_DEBUG_TOKEN')
+        if not _token:
+            self.profiles = None
+            return
+
+        from fastapi import Depends, HTTPException, Query, Security, status
+        from fastapi.responses import PlainTextResponse
+        from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+
+        self.logger.info('Exposing the sampling profiler at /debug/profile')
+        self.profiles = InvocationProfiles(token=_token)
+        self.app.add_middleware(ProfileIdMiddleware)
+        bearer_scheme = HTTPBearer()
+
+        def _the_debug_authorizer(
+            credentials: HTTPAuthorizationCredentials = Security(bearer_scheme),
+        ):
+            if not self.profiles.authorize(credentials.credentials):
+                raise HTTPException(
+                    status_code=status.HTTP_401_UNAUTHORIZED,
+                    detail="Invalid bearer token",
+                )
+
+        def _profile_response(collapsed: str, name: str) -> PlainTextResponse:
+            # Collapsed stacks, e.g. for `flamegraph.pl` or speedscope
+            return PlainTextResponse(
+                collapsed,
+                media_type=PROFILE_CONTENT_TYPE,
+                headers={
+                    'Content-Disposition': f'attachment; filename="{name}.folded"'
+                },
+            )
+
+        @self.app.get(
+            "/debug/profile",
+            include_in_schema=False,
+            dependencies=[Depends(_the_debug_authorizer)],
         )
+        async def __profile(
+            seconds: float = Query(
+                DEFAULT_PROFILE_SECONDS, gt=0, le=MAX_PROFILE_SECONDS
+            ),
+            route: Optional[str] = None,
+        ):
+            _code = None
+            if route is not None:
+                _func = self._route_funcs.get(route.strip('/'))
+                if _func is None:
+                    raise HTTPException(
+                        status_code=status.HTTP_404_NOT_FOUND,
+                        detail=f'Route {route} not found',
+                    )
+                _code = get_code(_func)
+
+            with SamplingProfiler(code=_code) as profiler:
+                await asyncio.sleep(seconds)
+            return _profile_response(
+                profiler.collapsed(),
+                name=f'profile-{route.strip("/")}' if route else 'profile',
+            )
+
+        @self.app.get(
+            "/debug/profile/{profile_id}",
+            include_in_schema=False,
+            dependencies=[Depends(_the_debug_authorizer)],
+        )
+        async def __invocation_profile(profile_id: str):
+            _collapsed = self.profiles.pop(profile_id)
+            if _collapsed is None:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail=f'Profile {profile_id} not found',
+                )
+            return _profile_response(_collapsed, name=f'profile-{profile_id}')
 
     def _setup_logging(self):
         self.app.add_middleware(LoggingMiddleware, logger=self.logger)
@@ -466,6 +888,28 @@ class ServingGateway(FastAPIBaseGateway):
                 dirname=dirname,
                 auth=_decorator_params.get('auth', None),
                 openai_tracing=_decorator_params.get('openai_tracing', False),
+                max_concurrency=_decorator_params.get('max_concurrency', None),
+                queue_size=_decorator_params.get('queue_size', None),
+                queue_timeout=_decorator_params.get('queue_timeout', None),
+                tenants=_decorator_params.get('tenants', None),
+                adaptive_concurrency=_decorator_params.get(
+                    'adaptive_concurrency', None
+                ),
+                executor=_decorator_params.get('executor', 'thread'),
+                workers=_decorator_params.get('workers', None),
+                capture_stdout=_decorator_params.get('capture_stdout', True),
+                cache=_decorator_params.get('cache', None),
+                coalesce=_decorator_params.get('coalesce', False),
+                batch=_decorator_params.get('batch', False),
+                max_batch_size=_decorator_params.get('max_batch_size', 32),
+                max_wait_ms=_decorator_params.get('max_wait_ms', 10),
+                streaming=_decorator_params.get('streaming', False),
+                json_encoder=_decorator_params.get('json_encoder', 'default'),
+                timeout=_decorator_params.get('timeout', None),
+                auth_cache_ttl=_decorator_params.get('auth_cache_ttl', None),
+                auth_cache_negative_ttl=_decorator_params.get(
+                    'auth_cache_negative_ttl', None
+                ),
             )
         elif hasattr(func, '__ws_serving__'):
             self._register_ws_route(
@@ -476,6 +920,21 @@ class ServingGateway(FastAPIBaseGateway):
                     'include_ws_callback_handlers', False
                 ),
                 openai_tracing=_decorator_params.get('openai_tracing', False),
+                max_concurrency=_decorator_params.get('max_concurrency', None),
+                queue_size=_decorator_params.get('queue_size', None),
+                queue_timeout=_decorator_params.get('queue_timeout', None),
+                tenants=_decorator_params.get('tenants', None),
+                adaptive_concurrency=_decorator_params.get(
+                    'adaptive_concurrency', None
+                ),
+                stream_config=_decorator_params.get('stream_config', None),
+                json_encoder=_decorator_params.get('json_encoder', 'default'),
+                timeout=_decorator_params.get('timeout', None),
+                auth_cache_ttl=_decorator_params.get('auth_cache_ttl', None),
+                auth_cache_negative_ttl=_decorator_params.get(
+                    'auth_cache_negative_ttl', None
+                ),
+                multiplex=_decorator_params.get('multiplex', False),
             )
         elif hasattr(func, '__slackbot__'):
             self._register_slackbot(
@@ -529,6 +988,26 @@ class ServingGateway(FastAPIBaseGateway):
         route_type: RouteType = RouteType.HTTP,
         include_ws_callback_handlers: bool = False,
         openai_tracing: bool = False,
+        max_concurrency: Optional[int] = None,
+        queue_size: Optional[int] = None,
+        queue_timeout: Optional[float] = None,
+        tenants: Optional[TenantConfig] = None,
+        adaptive_concurrency: Union[AdaptiveConcurrencyConfig, bool, None] = None,
+        executor: str = 'thread',
+        workers: Optional[int] = None,
+        capture_stdout: bool = True,
+        cache: Union[CacheConfig, bool, None] = None,
+        coalesce: bool = False,
+        batch: bool = False,
+        max_batch_size: int = 32,
+        max_wait_ms: float = 10,
+        streaming: bool = False,
+        stream_config: Optional[StreamConfig] = None,
+        json_encoder: str = JSONEncoderType.DEFAULT,
+        timeout: Optional[float] = None,
+        multiplex: bool = False,
+        auth_cache_ttl: Optional[float] = None,
+        auth_cache_negative_ttl: Optional[float] = None,
         **kwargs,
     ):
         _name = func.__name__.title().replace('_', '')
@@ -541,7 +1020,24 @@ class ServingGateway(FastAPIBaseGateway):
         class Config:
             arbitrary_types_allowed = True
 
+        if route_type == RouteType.HTTP and (streaming or is_generator_function(func)):
+            if executor == ExecutorType.PROCESS:
+                raise ValueError(
+                    f'Streaming function `{func.__name__}` is not supported with `executor=\'process\'`'
+                )
+            if cache or coalesce or batch:
+                self.logger.warning(
+                    f'Response cache, coalescing & batching are not supported for streaming `{func.__name__}`. Skipping...'
+                )
+                cache, coalesce, batch = None, False, False
+
         _input_fields, _file_fields = _get_input_model_fields(func)
+        if batch:
+            if len(_file_fields) > 0:
+                raise ValueError(
+                    f'Batching is not supported for `{func.__name__}` with file params'
+                )
+            _input_fields = _get_batch_item_fields(func, _input_fields)
 
         file_params = _get_file_field_params(_file_fields)
         input_model = create_model(
@@ -554,9 +1050,103 @@ class ServingGateway(FastAPIBaseGateway):
         output_model = create_model(
             f'Output{_name}',
             __config__=Config,
-            **_get_output_model_fields(func),
+            **_get_output_model_fields(func, batch=batch),
         )
 
+        # Read the signature once, rather than on every request
+        invoker = RouteInvoker(func, workspace=self.workspace)
+
+        if json_encoder == JSONEncoderType.ORJSON:
+            import_orjson()
+        elif json_encoder != JSONEncoderType.DEFAULT:
+            raise ValueError(
+                f'json_encoder must be one of `default` or `orjson`, got {json_encoder}'
+            )
+
+        # Runs are cancelled past their deadline, or once their client disconnects
+        route_guard = RunGuard(
+            route=f'/{func.__name__}',
+            timeout=timeout,
+            outcome_counter=self.run_outcome_counter,
+        )
+
+        auth_cache = None
+        if auth is not None and auth_cache_ttl is not None:
+            auth_cache = self._get_auth_cache(
+                auth, ttl=auth_cache_ttl, negative_ttl=auth_cache_negative_ttl
+            )
+
+        route_pool = None
+        if max_concurrency is not None or executor == ExecutorType.PROCESS:
+            self.logger.info(f'Using a {executor} worker pool for `{func.__name__}`')
+            route_pool = RouteWorkerPool(
+                route=f'/{func.__name__}',
+                max_concurrency=max_concurrency,
+                queue_size=queue_size,
+                queue_timeout=queue_timeout,
+                executor=executor,
+                workers=workers,
+                dirname=dirname,
+                tenants=tenants,
+                queue_wait_histogram=self.queue_wait_histogram,
+                rejected_counter=self.rejected_request_counter,
+                tenant_queue_counter=self.tenant_queue_counter,
+            )
+            self._route_pools[func.__name__] = route_pool
+
+        route_limiter = None
+        if adaptive_concurrency:
+            route_limiter = AdaptiveLimiter(
+                route=f'/{func.__name__}',
+                config=adaptive_concurrency
+                if isinstance(adaptive_concurrency, AdaptiveConcurrencyConfig)
+                else AdaptiveConcurrencyConfig(),
+                limit_counter=self.concurrency_limit_counter,
+                rejected_counter=self.rejected_request_counter,
+            )
+
+        route_cache = None
+        if cache and route_type == RouteType.HTTP:
+            if len(file_params) > 0:
+                self.logger.warning(
+                    f'Response cache is not supported for `{func.__name__}` with file params. Skipping...'
+                )
+            else:
+                route_cache = RouteCache(
+                    route=f'/{func.__name__}',
+                    config=cache if isinstance(cache, CacheConfig) else CacheConfig(),
+                    workspace=self.workspace,
+                    hit_counter=self.cache_hit_counter,
+                    miss_counter=self.cache_miss_counter,
+                )
+
+        route_batcher = None
+        if batch and route_type == RouteType.HTTP:
+            self.logger.info(
+                f'Batching up to {max_batch_size} requests of `{func.__name__}`'
+            )
+            route_batcher = MicroBatcher(
+                route=f'/{func.__name__}',
+                max_batch_size=max_batch_size,
+                max_wait_ms=max_wait_ms,
+                batch_size_histogram=self.batch_size_histogram,
+                batch_wait_histogram=self.batch_wait_histogram,
+            )
+
+        route_singleflight = None
+        if coalesce and route_type == RouteType.HTTP:
+            if len(file_params) > 0:
+                self.logger.warning(
+                    f'Request coalescing is not supported for `{func.__name__}` with file params. Skipping...'
+                )
+            else:
+                route_singleflight = SingleFlight(
+                    route=f'/{func.__name__}',
+                    coalesced_counter=self.coalesced_request_counter,
+                )
+
+        self._route_funcs[func.__name__] = func
+
         if route_type == RouteType.HTTP:
             self.logger.info(f'Registering HTTP route: {func.__name__}')
 
@@ -565,10 +1155,23 @@ class ServingGateway(FastAPIBaseGateway):
                 func=func,
                 dirname=dirname,
                 auth_func=auth,
+                auth_cache=auth_cache,
                 file_params=file_params,
                 input_model=input_model,
                 output_model=output_model,
                 openai_tracing=openai_tracing,
+                route_pool=route_pool,
+                route_limiter=route_limiter,
+                token_histograms=self.token_histograms,
+                profiles=self.profiles,
+                capture_stdout=capture_stdout,
+                route_cache=route_cache,
+                route_singleflight=route_singleflight,
+                route_batcher=route_batcher,
+                streaming=streaming,
+                invoker=invoker,
+                json_encoder=json_encoder,
+                route_guard=route_guard,
                 post_kwargs={
                     'path': f'/{func.__name__}',
                     'name': _name,
@@ -576,6 +1179,7 @@ class ServingGateway(FastAPIBaseGateway):
                     'tags': [SERVING],
                 },
                 workspace=self.workspace,
+                max_upload_size=self.max_upload_size,
                 logger=self.logger,
                 tracer=self.tracer,
             )
@@ -589,6 +1193,7 @@ class ServingGateway(FastAPIBaseGateway):
                 func=func,
                 dirname=dirname,
                 auth=auth,
+                auth_cache=auth_cache,
                 input_model=input_model,
                 output_model=output_model,
                 ws_kwargs={
@@ -597,11 +1202,36 @@ class ServingGateway(FastAPIBaseGateway):
                 },
                 include_ws_callback_handlers=include_ws_callback_handlers,
                 openai_tracing=openai_tracing,
+                route_pool=route_pool,
+                route_limiter=route_limiter,
+                token_histograms=self.token_histograms,
+                stream_config=stream_config,
+                invoker=invoker,
+                json_encoder=json_encoder,
+                route_guard=route_guard,
+                multiplex=multiplex,
                 workspace=self.workspace,
                 logger=self.logger,
                 tracer=self.tracer,
             )
 
+    def _get_auth_cache(
+        self, auth: Callable, ttl: float, negative_ttl: Optional[float] = None
+    ) -> AuthCache:
+        _key = (auth, ttl, negative_ttl)
+        if _key not in self._auth_caches:
+            self.logger.info(
+                f'Caching the results of auth `{auth.__name__}` for {ttl}s'
+            )
+            self._auth_caches[_key] = AuthCache(
+                name=auth.__name__,
+                ttl=ttl,
+                negative_ttl=negative_ttl,
+                hit_counter=self.auth_cache_hit_counter,
+                miss_counter=self.auth_cache_miss_counter,
+            )
+        return self._auth_caches[_key]
+
     def _register_slackbot(
         self,
         func: Callable,
@@ -628,7 +1258,7 @@ class ServingGateway(FastAPIBaseGateway):
 
             bot = SlackBot(
                 workspace=self.workspace,
-                duration_counter=self.duration_counter,
+                duration_histogram=self.duration_histogram,
                 request_counter=self.request_counter,
                 tracing_handler=tracing_handler,
             )
@@ -646,66 +1276,31 @@ def _get_files_data(kwargs: Dict) -> Dict:
 
     _files_data = {}
     for k, v in kwargs.items():
-        if isinstance(v, (UploadFile, StarletteUploadFile)):
+        # files left out are `None`, the default of an `Optional` file without one
+        if v is None or isinstance(v, (UploadFile, StarletteUploadFile)):
             _files_data[k] = v
 
     return _files_data
 
 
-def _get_func_data(
-    func: Callable,
-    input_data: Union[str, Dict, BaseModel],
-    files_data: Dict,
-    auth_response: Any = None,
-    workspace: str = None,
-    to_support_in_kwargs: Dict = {},
-) -> Tuple[Dict[str, Any], Dict[str, str]]:
-    import json
-
-    if isinstance(input_data, BaseModel):
-        _func_data = dict(input_data)
-    elif isinstance(input_data, str):
-        _func_data = json.loads(input_data)
-    else:
-        _func_data = input_data
-
-    _envs = _func_data.pop('envs', {})
-
-    if files_data:
-        _func_data.update(files_data)
-
-    # Read functions signature and check if `auth_response` is required or kwargs is present
-    _func_params_names = list(inspect.signature(func).parameters.keys())
-    if 'auth_response' in _func_params_names:
-        _func_data['auth_response'] = auth_response
-    elif 'kwargs' in _func_params_names:
-        _func_data.update({'auth_response': auth_response})
-
-    # Workspace handle
-    if 'workspace' in _func_params_names:
-        _func_data['workspace'] = workspace
-    elif 'kwargs' in _func_params_names:
-        _func_data.update({'workspace': workspace})
-
-    # Populate extra kwargs
-    if to_support_in_kwargs and 'kwargs' in _func_params_names:
-        _func_data.update(to_support_in_kwargs)
-
-    return _func_data, _envs
-
-
 def _get_updated_signature(
     file_params: List[inspect.Parameter],
     output_model: BaseModel,
     include_token: bool = False,
 ) -> inspect.Signature:
+    from fastapi import Request
+
     _params = [
-        *file_params,
         inspect.Parameter(
             name='input_data',
             kind=inspect.Parameter.POSITIONAL_OR_KEYWORD,
             annotation=str,
         ),
+        inspect.Parameter(
+            name='request',
+            kind=inspect.Parameter.POSITIONAL_OR_KEYWORD,
+            annotation=Request,
+        ),
     ]
 
     if include_token:
@@ -716,6 +1311,8 @@ def _get_updated_signature(
                 annotation=str,
             )
         )
+    # keyword-only, so that files left out by default can come before required ones
+    _params.extend(file_params)
     return inspect.Signature(parameters=_params, return_annotation=output_model)
 
 
@@ -732,13 +1329,115 @@ def create_http_route(
     workspace: str,
     logger: JinaLogger,
     tracer: 'Tracer',
+    route_pool: Optional[RouteWorkerPool] = None,
+    capture_stdout: bool = True,
+    route_cache: Optional[RouteCache] = None,
+    route_singleflight: Optional[SingleFlight] = None,
+    route_batcher: Optional[MicroBatcher] = None,
+    streaming: bool = False,
+    invoker: Optional[RouteInvoker] = None,
+    json_encoder: str = JSONEncoderType.DEFAULT,
+    route_guard: Optional[RunGuard] = None,
+    auth_cache: Optional[AuthCache] = None,
+    route_limiter: Optional[AdaptiveLimiter] = None,
+    token_histograms: Optional[TokenHistograms] = None,
+    profiles: Optional[InvocationProfiles] = None,
+    max_upload_size: Optional[int] = None,
 ):
-    from fastapi import Depends, Form, HTTPException, Security, UploadFile, status
+    from fastapi import (
+        Depends,
+        Form,
+        HTTPException,
+        Query,
+        Request,
+        Security,
+        UploadFile,
+        status,
+    )
     from fastapi.encoders import jsonable_encoder
+    from fastapi.responses import ORJSONResponse, StreamingResponse
     from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 
     bearer_scheme = HTTPBearer()
 
+    _in_process = (
+        route_pool is not None and route_pool.executor_type == ExecutorType.PROCESS
+    )
+    _batch_params = [k for k in input_model.__fields__ if k != 'envs']
+    _invoker = invoker or RouteInvoker(func, workspace=workspace)
+    # Generator functions & functions using the `streaming_handler` stream their outputs
+    _generates = is_generator_function(func)
+    _streams = streaming or _generates
+    _orjson = json_encoder == JSONEncoderType.ORJSON
+    # With orjson, JSON-native results are sent as returned, skipping the pydantic validation
+    _skip_validation = _orjson and is_json_native_type(
+        output_model.__fields__['result'].outer_type_
+    )
+    _dumps = orjson_dumps if _orjson else json.dumps
+    _guard = route_guard or RunGuard(route=post_kwargs['path'])
+
+    async def _run(
+        func_data: Dict,
+        envs: Dict,
+        tenant: Optional[str] = None,
+        profiler: Optional[SamplingProfiler] = None,
+    ):
+        if route_limiter is not None:
+            async with route_limiter.acquire():
+                return await _run_in_pool(func_data, envs, tenant, profiler)
+        return await _run_in_pool(func_data, envs, tenant, profiler)
+
+    async def _run_in_pool(
+        func_data: Dict,
+        envs: Dict,
+        tenant: Optional[str] = None,
+        profiler: Optional[SamplingProfiler] = None,
+    ):
+        _func = profiler.wrap(func) if profiler is not None else func
+        if route_pool is not None:
+            return await route_pool.run(_func, func_data, envs=envs, tenant=tenant)
+        # the working directory is only held while the function runs
+        async with WorkingDir(dirname):
+            return await run_function(_func, **func_data)
+
+    async def _iterate(
+        func_data: Dict, envs: Dict, tenant: Optional[str] = None
+    ) -> AsyncIterator:
+        # The slots of the route are held until the generator is exhausted
+        if route_limiter is not None:
+            async with route_limiter.acquire():
+                async for _item in _iterate_in_pool(func_data, envs, tenant):
+                    yield _item
+        else:
+            async for _item in _iterate_in_pool(func_data, envs, tenant):
+                yield _item
+
+    async def _iterate_in_pool(
+        func_data: Dict, envs: Dict, tenant: Optional[str] = None
+    ) -> AsyncIterator:
+        if route_pool is not None and not _in_process:
+            async for _item in route_pool.stream(func, func_data, tenant=tenant):
+                yield _item
+        else:
+            async for _item in iterate(
+                await _run_in_pool(func_data, envs, tenant),
+                dirname=None if _in_process else dirname,
+            ):
+                yield _item
+
+    def _get_tenant(auth_response: Any) -> Optional[str]:
+        if route_pool is None:
+            return None
+        return route_pool.get_tenant(auth_response)
+
+    def _get_profiler(request: Optional[Request]) -> Optional[SamplingProfiler]:
+        # Functions run in a worker process can't be sampled by the gateway
+        if profiles is None or request is None or _in_process:
+            return None
+        if not profiles.requested(request.headers):
+            return None
+        return SamplingProfiler(wrapped=True)
+
     async def _the_authorizer(
         credentials: HTTPAuthorizationCredentials = Security(bearer_scheme),
     ) -> Any:
@@ -748,7 +1447,15 @@ def create_http_route(
             )
 
         try:
-            auth_response = await run_function(auth_func, token=credentials.credentials)
+            if auth_cache is not None:
+                auth_response = await auth_cache.authorize(
+                    credentials.credentials,
+                    lambda: run_function(auth_func, token=credentials.credentials),
+                )
+            else:
+                auth_response = await run_function(
+                    auth_func, token=credentials.credentials
+                )
         except Exception as e:
             logger.error(f'Could not verify token: {e}')
             raise HTTPException(
@@ -761,45 +1468,285 @@ def create_http_route(
         input_data: input_model,
         files_data: Dict[str, UploadFile] = {},
         auth_response: Any = None,
+        request: Optional[Request] = None,
     ) -> output_model:
-        _output, _error = '', ''
-        # Tracing handler provided if kwargs is present
-        if openai_tracing:
-            to_support_in_kwargs = {
-                'tracing_handler': OpenAITracingCallbackHandler(
+        _cache_key = None
+        if route_cache is not None and not files_data:
+            _cache_key = route_cache.key(input_data, auth_response)
+            _cached = await route_cache.get(_cache_key)
+            if _cached is not None:
+                return output_model(**_cached)
+
+        _flight_key = None
+        if route_singleflight is not None and not files_data:
+            _flight_key = route_singleflight.key(input_data, auth_response)
+
+        if _flight_key is not None:
+            # Identical concurrent requests share a single execution, which isn't cancelled
+            # when one of their clients disconnects
+            _response = await route_singleflight.do(
+                _flight_key,
+                lambda: _invoke(input_data, files_data, auth_response),
+            )
+        else:
+            _response = await _invoke(input_data, files_data, auth_response, request)
+
+        if _cache_key is not None and _response.error == '':
+            await route_cache.set(_cache_key, jsonable_encoder(_response))
+        return _response
+
+    async def _invoke(
+        input_data: input_model,
+        files_data: Dict[str, UploadFile],
+        auth_response: Any,
+        request: Optional[Request] = None,
+    ) -> output_model:
+        # Tracing handler & cancel token provided if kwargs is present, they can't be pickled to a worker process
+        to_support_in_kwargs = {}
+        _cancel_token = CancelToken()
+        if _invoker.takes_kwargs and not _in_process:
+            to_support_in_kwargs['cancel_token'] = _cancel_token
+            if openai_tracing:
+                to_support_in_kwargs['tracing_handler'] = OpenAITracingCallbackHandler(
                     tracer=tracer, parent_span=get_current_span()
                 )
-            }
-        else:
-            to_support_in_kwargs = {
-                'tracing_handler': TracingCallbackHandler(
+            else:
+                to_support_in_kwargs['tracing_handler'] = TracingCallbackHandler(
                     tracer=tracer, parent_span=get_current_span()
                 )
-            }
 
-        _func_data, _envs = _get_func_data(
-            func=func,
+        _token_stream = None
+        if streaming and _invoker.takes_kwargs:
+            _token_stream = TokenStream()
+            _token_metrics = TokenMetrics(
+                route=post_kwargs['path'],
+                histograms=token_histograms,
+                span=get_current_span(),
+            )
+            to_support_in_kwargs.update(
+                {
+                    'streaming_handler': StreamingQueueCallbackHandler(
+                        _token_stream, token_metrics=_token_metrics
+                    ),
+                    'async_streaming_handler': AsyncStreamingQueueCallbackHandler(
+                        _token_stream, token_metrics=_token_metrics
+                    ),
+                }
+            )
+
+        if _invoker.workspace_files and files_data:
+            try:
+                files_data = {
+                    k: await save_to_workspace(v, workspace, max_size=max_upload_size)
+                    if k in _invoker.workspace_files and v is not None
+                    else v
+                    for k, v in files_data.items()
+                }
+            except UploadTooLargeError as e:
+                raise HTTPException(
+                    status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=str(e)
+                )
+
+        _func_data, _envs = _invoker.get_func_data(
             input_data=input_data,
             files_data=files_data,
             auth_response=auth_response,
-            workspace=workspace,
             to_support_in_kwargs=to_support_in_kwargs,
         )
-        with EnvironmentVarCtxtManager(_envs), ChangeDirCtxtManager(dirname):
-            with Capturing() as stdout:
+        _tenant = _get_tenant(auth_response)
+        if _streams:
+            return StreamingOutputResponse(
+                _stream_outputs(
+                    _func_data, _envs, _token_stream, _cancel_token, tenant=_tenant
+                ),
+                dumps=_dumps,
+            )
+
+        if route_batcher is not None:
+            try:
+                return await route_batcher.submit(
+                    key=make_batch_key(_envs, auth_response),
+                    item=_func_data,
+                    run_batch=lambda items: _invoke_batch(items, _envs, tenant=_tenant),
+                )
+            except asyncio.CancelledError:
+                # e.g. dropped from a bulk request, its batch stops once all its requests are
+                _cancel_token.cancel(CancelReason.DISCONNECTED)
+                raise
+
+        _output, _error, _stdout = await _call(
+            _func_data,
+            _envs,
+            cancel_token=_cancel_token,
+            request=request,
+            tenant=_tenant,
+        )
+        return _make_output(result=_output, error=_error, stdout=_stdout)
+
+    async def _invoke_batch(
+        items: List[Dict], envs: Dict, tenant: Optional[str] = None
+    ) -> List[output_model]:
+        # Batched params are passed as lists, the injected ones are the ones of the first
+        # request, e.g. its tracing handler, except for the cancel token of the batch
+        _func_data = {k: v for k, v in items[0].items() if k not in _batch_params}
+        for k in _batch_params:
+            _func_data[k] = [item[k] for item in items]
+
+        _cancel_token = None
+        if 'cancel_token' in _func_data:
+            _cancel_token = CancelToken.all_of([item['cancel_token'] for item in items])
+            _func_data['cancel_token'] = _cancel_token
+
+        _output, _error, _stdout = await _call(
+            _func_data, envs, cancel_token=_cancel_token, tenant=tenant
+        )
+        if _error == '' and (
+            not isinstance(_output, (list, tuple)) or len(_output) != len(items)
+        ):
+            _error = (
+                f'Batched function `{func.__name__}` must return a list of '
+                f'{len(items)} results, got {_output!r:.100}'
+            )
+            logger.error(_error)
+
+        # The stdout of the call is returned once, to the first request of the batch
+        if _error != '':
+            return [
+                _make_output(result='', error=_error, stdout=_stdout if i == 0 else '')
+                for i in range(len(items))
+            ]
+        return [
+            _make_output(result=_result, error='', stdout=_stdout if i == 0 else '')
+            for i, _result in enumerate(_output)
+        ]
+
+    _make_output = output_model.construct if _skip_validation else output_model
+
+    def _respond(response: Any) -> Any:
+        if not (_orjson and isinstance(response, BaseModel)):
+            return response
+        elif _skip_validation:
+            try:
+                return ORJSONResponse(
+                    {
+                        'result': response.result,
+                        'error': response.error,
+                        'stdout': response.stdout,
+                    }
+                )
+            except TypeError:
+                # the result holds values orjson can't encode, e.g. sets or custom objects
+                pass
+        return ORJSONResponse(jsonable_encoder(response))
+
+    def _get_output(result: Any, error: str = '') -> Dict:
+        try:
+            return jsonable_encoder(output_model(result=result, error=error))
+        except ValidationError:
+            return jsonable_encoder({'result': result, 'error': error, 'stdout': ''})
+
+    async def _stream_outputs(
+        func_data: Dict,
+        envs: Dict,
+        token_stream: Optional[TokenStream],
+        cancel_token: CancelToken,
+        tenant: Optional[str] = None,
+    ) -> AsyncIterator[Dict]:
+        async def _outputs() -> AsyncIterator[Any]:
+            if _generates:
+                async for _item in _iterate(func_data, envs, tenant):
+                    yield _item
+                return
+
+            _task = asyncio.ensure_future(_run(func_data, envs, tenant))
+            try:
+                if token_stream is not None:
+                    # Stream the tokens sent to the `streaming_handler`, then the result
+                    _task.add_done_callback(lambda _: token_stream.close())
+                    async for _token in token_stream:
+                        yield _token
+
+                _returned_data = await _task
+                if inspect.isgenerator(_returned_data) or inspect.isasyncgen(
+                    _returned_data
+                ):
+                    async for _item in iterate(_returned_data, dirname=dirname):
+                        yield _item
+                else:
+                    yield _returned_data
+            finally:
+                _task.cancel()
+
+        async with RequestCtxtManager(envs):
+            try:
+                # The tokens & the items of a generator are produced under the deadline
+                # of the route, a client disconnecting cancels the response itself
+                async for _item in _guard.stream(_outputs, cancel_token=cancel_token):
+                    yield _get_output(_item)
+
+            except RouteOverloadedError as e:
+                logger.warning(f'Rejecting request to `{func.__name__}`: {e}')
+                yield _get_output('', error=str(e))
+
+            except RunCancelledError as e:
+                logger.warning(f'Stream of `{func.__name__}` was cancelled: {e}')
+                yield _get_output('', error=str(e))
+
+            except Exception as e:
+                logger.error(f'Got an exception: {e}')
+                _error = str(traceback.format_exc())
+                print(f'Error: {_error}')
+                yield _get_output('', error=_error)
+
+    async def _call(
+        func_data: Dict,
+        envs: Dict,
+        cancel_token: Optional[CancelToken] = None,
+        request: Optional[Request] = None,
+        tenant: Optional[str] = None,
+    ) -> Tuple[Any, str, str]:
+        _output, _error = '', ''
+        _capture = StdoutCapture() if capture_stdout else None
+        _profiler = _get_profiler(request)
+        async with RequestCtxtManager(envs):
+            with _capture or nullcontext(), _profiler or nullcontext():
                 try:
-                    _output = await run_function(func, **_func_data)
+                    _output = await _guard.run(
+                        lambda: _run(func_data, envs, tenant, _profiler),
+                        cancel_token=cancel_token,
+                        disconnected=(lambda: wait_for_http_disconnect(request))
+                        if request is not None
+                        else None,
+                    )
+                except RouteOverloadedError as e:
+                    logger.warning(f'Rejecting request to `{func.__name__}`: {e}')
+                    raise HTTPException(
+                        status_code=e.status_code,
+                        detail=str(e),
+                        headers={'Retry-After': str(int(e.retry_after or 1))},
+                    )
+                except RunCancelledError as e:
+                    if e.reason == CancelReason.TIMEOUT:
+                        logger.warning(f'Request to `{func.__name__}` timed out: {e}')
+                        raise HTTPException(
+                            status_code=status.HTTP_504_GATEWAY_TIMEOUT, detail=str(e)
+                        )
+                    # nobody is left to read the response
+                    logger.info(f'Cancelled request to `{func.__name__}`: {e}')
+                    _error = str(e)
                 except Exception as e:
                     logger.error(f'Got an exception: {e}')
                     _error = str(traceback.format_exc())
 
             if _error != '':
                 print(f'Error: {_error}')
-            return output_model(
-                result=_output,
-                error=_error,
-                stdout='\n'.join(stdout),
+
+        if _profiler is not None:
+            # fetched from /debug/profile/{id}, with the id sent in the response headers
+            setattr(
+                request.state, PROFILE_ID_STATE, profiles.add(_profiler.collapsed())
             )
+        return _output, _error, _capture.getvalue() if _capture else ''
 
     def _the_parser(data: str = Form(...)) -> input_model:
         try:
@@ -820,14 +1767,18 @@ def create_http_route(
             # the input data included in the Form and parsed correctly.
 
             async def _the_http_route(
+                request: Request,
                 input_data: input_model = Depends(_the_parser),
                 auth_response: Any = Depends(_the_authorizer),
                 **kwargs,
             ) -> output_model:
-                return await _the_route(
-                    input_data=input_data,
-                    files_data=_get_files_data(kwargs),
-                    auth_response=auth_response,
+                return _respond(
+                    await _the_route(
+                        input_data=input_data,
+                        files_data=_get_files_data(kwargs),
+                        auth_response=auth_response,
+                        request=request,
+                    )
                 )
 
             _the_http_route.__signature__ = _get_updated_signature(
@@ -838,12 +1789,17 @@ def create_http_route(
             # If no file params are present, we include the input args in the Body.
 
             async def _the_http_route(
-                input_data: input_model, auth_response: Any = Depends(_the_authorizer)
+                input_data: input_model,
+                request: Request,
+                auth_response: Any = Depends(_the_authorizer),
             ) -> output_model:
-                return await _the_route(
-                    input_data=input_data,
-                    files_data={},
-                    auth_response=auth_response,
+                return _respond(
+                    await _the_route(
+                        input_data=input_data,
+                        files_data={},
+                        auth_response=auth_response,
+                        request=request,
+                    )
                 )
 
     else:
@@ -854,12 +1810,17 @@ def create_http_route(
             # the input data included in the Form and parsed correctly.
 
             async def _the_http_route(
-                input_data: input_model = Depends(_the_parser), **kwargs
+                request: Request,
+                input_data: input_model = Depends(_the_parser),
+                **kwargs,
             ) -> output_model:
-                return await _the_route(
-                    input_data=input_data,
-                    files_data=_get_files_data(kwargs),
-                    auth_response=None,
+                return _respond(
+                    await _the_route(
+                        input_data=input_data,
+                        files_data=_get_files_data(kwargs),
+                        auth_response=None,
+                        request=request,
+                    )
                 )
 
             _the_http_route.__signature__ = _get_updated_signature(
@@ -869,16 +1830,114 @@ def create_http_route(
         else:
             # If no file params are present, we include the input args in the Body.
 
-            async def _the_http_route(input_data: input_model) -> output_model:
-                return await _the_route(
-                    input_data=input_data,
-                    files_data={},
-                    auth_response=None,
+            async def _the_http_route(
+                input_data: input_model, request: Request
+            ) -> output_model:
+                return _respond(
+                    await _the_route(
+                        input_data=input_data,
+                        files_data={},
+                        auth_response=None,
+                        request=request,
+                    )
                 )
 
     # Add the route to the app with POST method
     app.post(**post_kwargs)(_the_http_route)
 
+    if len(file_params) == 0 and not _streams:
+        # Add a route to run a list of inputs, streaming results as NDJSON as they complete
+
+        async def _the_bulk_results(
+            inputs: List[input_model], auth_response: Any, concurrency: int
+        ):
+            _semaphore = asyncio.Semaphore(concurrency)
+
+            async def _run_one(index: int, input_data: input_model) -> Dict:
+                async with _semaphore:
+                    try:
+                        _response = jsonable_encoder(
+                            await _the_route(
+                                input_data=input_data,
+                                files_data={},
+                                auth_response=auth_response,
+                            )
+                        )
+                    except HTTPException as e:
+                        _response = {'result': '', 'error': e.detail, 'stdout': ''}
+                return {'index': index, **_response}
+
+            _tasks = [
+                asyncio.ensure_future(_run_one(index, input_data))
+                for index, input_data in enumerate(inputs)
+            ]
+            try:
+                for _next in asyncio.as_completed(_tasks):
+                    yield _dumps(await _next) + '\n'
+            finally:
+                # client disconnected, no need to run the remaining inputs
+                for _task in _tasks:
+                    _task.cancel()
+
+        _concurrency_query = Query(
+            BULK_CONCURRENCY,
+            ge=1,
+            le=BULK_MAX_CONCURRENCY,
+            description='Number of inputs run in parallel',
+        )
+
+        if auth_func is not None:
+
+            async def _the_bulk_route(
+                inputs: List[input_model],
+                concurrency: int = _concurrency_query,
+                auth_response: Any = Depends(_the_authorizer),
+            ) -> StreamingResponse:
+                return StreamingResponse(
+                    _the_bulk_results(inputs, auth_response, concurrency),
+                    media_type='application/x-ndjson',
+                )
+
+        else:
+
+            async def _the_bulk_route(
+                inputs: List[input_model],
+                concurrency: int = _concurrency_query,
+            ) -> StreamingResponse:
+                return StreamingResponse(
+                    _the_bulk_results(inputs, None, concurrency),
+                    media_type='application/x-ndjson',
+                )
+
+        app.post(
+            path=f'{post_kwargs["path"]}/batch',
+            name=f'{post_kwargs["name"]}Batch',
+            description=f'Run a list of inputs on `{post_kwargs["path"]}`, streaming newline-delimited results as they complete',
+            tags=post_kwargs['tags'],
+            response_class=StreamingResponse,
+        )(_the_bulk_route)
+
+    if route_cache is not None:
+        # Add a route to invalidate the response cache with DELETE method
+        if auth_func is not None:
+
+            async def _the_cache_route(
+                auth_response: Any = Depends(_the_authorizer),
+            ) -> Dict[str, int]:
+                return {'deleted': await route_cache.clear()}
+
+        else:
+
+            async def _the_cache_route() -> Dict[str, int]:
+                return {'deleted': await route_cache.clear()}
+
+        app.delete(
+            path=f'{post_kwargs["path"]}/cache',
+            name=f'{post_kwargs["name"]}Cache',
+            description=f'Invalidate the response cache of `{post_kwargs["path"]}`',
+            tags=post_kwargs['tags'],
+        )(_the_cache_route)
+
 
 # TODO: add file upload support for websocket routes
 def create_websocket_route(
@@ -894,6 +1953,15 @@ def create_websocket_route(
     workspace: str,
     logger: JinaLogger,
     tracer: 'Tracer',
+    route_pool: Optional[RouteWorkerPool] = None,
+    stream_config: Optional[StreamConfig] = None,
+    invoker: Optional[RouteInvoker] = None,
+    json_encoder: str = JSONEncoderType.DEFAULT,
+    route_guard: Optional[RunGuard] = None,
+    multiplex: bool = False,
+    auth_cache: Optional[AuthCache] = None,
+    route_limiter: Optional[AdaptiveLimiter] = None,
+    token_histograms: Optional[TokenHistograms] = None,
 ):
     from fastapi import (
         Depends,
@@ -903,9 +1971,88 @@ def create_websocket_route(
         WebSocketException,
         status,
     )
+    from fastapi.encoders import jsonable_encoder
     from fastapi.security.utils import get_authorization_scheme_param
     from fastapi.websockets import WebSocketState
 
+    _invoker = invoker or RouteInvoker(func, workspace=workspace)
+    _generates = is_generator_function(func)
+    _orjson = json_encoder == JSONEncoderType.ORJSON
+    # With orjson, JSON-native results are sent as returned, skipping the pydantic validation
+    _skip_validation = _orjson and is_json_native_type(
+        output_model.__fields__['result'].outer_type_
+    )
+    _make_output = output_model.construct if _skip_validation else output_model
+    _guard = route_guard or RunGuard(route=ws_kwargs['path'])
+
+    def _encode(data: BaseModel) -> str:
+        if not _orjson:
+            return data.json()
+        try:
+            return orjson_dumps(data.dict())
+        except TypeError:
+            # the result holds values orjson can't encode, e.g. sets or custom objects
+            return orjson_dumps(jsonable_encoder(data))
+
+    async def _run(func_data: Dict, envs: Dict, tenant: Optional[str] = None):
+        if route_limiter is not None:
+            async with route_limiter.acquire():
+                return await _run_in_pool(func_data, envs, tenant)
+        return await _run_in_pool(func_data, envs, tenant)
+
+    async def _run_in_pool(func_data: Dict, envs: Dict, tenant: Optional[str] = None):
+        if route_pool is not None:
+            return await route_pool.run(func, func_data, envs=envs, tenant=tenant)
+        # the working directory is only held while the function runs
+        async with WorkingDir(dirname):
+            return await run_function(func, **func_data)
+
+    async def _iterate(func_data: Dict, tenant: Optional[str] = None) -> AsyncIterator:
+        # The slots of the route are held until the generator is exhausted
+        if route_limiter is not None:
+            async with route_limiter.acquire():
+                async for _item in _iterate_in_pool(func_data, tenant):
+                    yield _item
+        else:
+            async for _item in _iterate_in_pool(func_data, tenant):
+                yield _item
+
+    async def _iterate_in_pool(
+        func_data: Dict, tenant: Optional[str] = None
+    ) -> AsyncIterator:
+        if route_pool is not None:
+            async for _item in route_pool.stream(func, func_data, tenant=tenant):
+                yield _item
+        else:
+            async with WorkingDir(dirname):
+                _result = await run_function(func, **func_data)
+            async for _item in iterate(_result, dirname=dirname):
+                yield _item
+
+    def _get_tenant(auth_response: Any) -> Optional[str]:
+        if route_pool is None:
+            return None
+        return route_pool.get_tenant(auth_response)
+
+    async def _outputs(
+        func_data: Dict, envs: Dict, tenant: Optional[str] = None
+    ) -> AsyncIterator[Tuple[Any, bool]]:
+        """Yields the items of a generator, or the result of a function, each with
+        whether it was generated
+        """
+        if _generates:
+            async for _item in _iterate(func_data, tenant):
+                yield _item, True
+            return
+
+        _returned_data = await _run(func_data, envs, tenant)
+        if inspect.isgenerator(_returned_data) or inspect.isasyncgen(_returned_data):
+            # Sync generators are driven from a worker thread, so that they don't block the event loop.
+            async for _item in iterate(_returned_data, dirname=dirname):
+                yield _item, True
+        else:
+            yield _returned_data, False
+
     async def _the_authorizer(
         authorization: Union[str, None] = Header(None, alias="Authorization"),
     ) -> Any:
@@ -921,7 +2068,12 @@ def create_websocket_route(
             )
 
         try:
-            auth_response = await run_function(auth, token=token)
+            if auth_cache is not None:
+                auth_response = await auth_cache.authorize(
+                    token, lambda: run_function(auth, token=token)
+                )
+            else:
+                auth_response = await run_function(auth, token=token)
         except Exception as e:
             logger.error(f'Could not verify token: {e}')
             raise WebSocketException(
@@ -930,12 +2082,87 @@ def create_websocket_route(
 
         return auth_response
 
+    def _get_frame_data(kind: str, text: str) -> Dict:
+        if kind == FrameKind.STDOUT:
+            _kwargs = {'result': '', 'error': '', 'stdout': text}
+        else:
+            _kwargs = {'result': text, 'error': ''}
+        try:
+            return _make_output(**_kwargs).dict()
+        except ValidationError:
+            return _kwargs
+
+    def _get_kwargs_support(
+        websocket: WebSocket, token_pipeline: TokenPipeline, cancel_token: CancelToken
+    ) -> Dict:
+        # Tracing handler & cancel token provided if kwargs is present
+        to_support_in_kwargs = {}
+        if not _invoker.takes_kwargs:
+            return to_support_in_kwargs
+
+        to_support_in_kwargs['cancel_token'] = cancel_token
+        if openai_tracing:
+            to_support_in_kwargs['tracing_handler'] = OpenAITracingCallbackHandler(
+                tracer=tracer, parent_span=get_current_span()
+            )
+        else:
+            to_support_in_kwargs['tracing_handler'] = TracingCallbackHandler(
+                tracer=tracer, parent_span=get_current_span()
+            )
+
+        # If the function is a streaming response, we pass the websocket callback handler,
+        # so that stream data can be sent back to the client.
+        if include_ws_callback_handlers:
+            _token_metrics = TokenMetrics(
+                route=ws_kwargs['path'],
+                histograms=token_histograms,
+                span=get_current_span(),
+            )
+            if not multiplex:
+                # sends on a multiplexed connection must be tagged with their `request_id`
+                to_support_in_kwargs['websocket'] = websocket
+            to_support_in_kwargs.update(
+                {
+                    'streaming_handler': StreamingWebsocketCallbackHandler(
+                        websocket=websocket,
+                        output_model=output_model,
+                        token_pipeline=token_pipeline,
+                        token_metrics=_token_metrics,
+                    ),
+                    'async_streaming_handler': AsyncStreamingWebsocketCallbackHandler(
+                        websocket=websocket,
+                        output_model=output_model,
+                        token_pipeline=token_pipeline,
+                        token_metrics=_token_metrics,
+                    ),
+                }
+            )
+        return to_support_in_kwargs
+
     async def _the_route(websocket: WebSocket, auth_response: Any = None):
+        async def _send_frame(kind: str, text: str):
+            _data = _get_frame_data(kind, text)
+            if _orjson:
+                await websocket.send_text(orjson_dumps(_data))
+            else:
+                await websocket.send_json(_data)
+
+        async def _send_output(data: BaseModel):
+            # Streamed tokens are sent before the outputs that follow them
+            await _token_pipeline.flush()
+            await websocket.send_text(_encode(data))
+
+        # Streaming handlers of this connection push their tokens to a single sender task
+        _token_pipeline = TokenPipeline(_send_frame, config=stream_config).start()
+        # Receives human inputs while the function runs, watching for a disconnect
+        _inbox = WebsocketInbox(websocket)
         with BuiltinsWrapper(
             loop=asyncio.get_event_loop(),
             websocket=websocket,
             output_model=output_model,
             wrap_print=False,
+            token_pipeline=_token_pipeline,
+            inbox=_inbox,
         ):
 
             def _get_error_msg(e: Union[WebSocketDisconnect, ConnectionClosed]) -> str:
@@ -973,70 +2200,36 @@ def create_websocket_route(
                             result='',
                             error=_ws_serving_error,
                         )
-                        await websocket.send_text(_data.json())
+                        await websocket.send_text(_encode(_data))
                         continue
 
-                    # Tracing handler provided if kwargs is present
-                    if openai_tracing:
-                        to_support_in_kwargs = {
-                            'tracing_handler': OpenAITracingCallbackHandler(
-                                tracer=tracer, parent_span=get_current_span()
-                            )
-                        }
-                    else:
-                        to_support_in_kwargs = {
-                            'tracing_handler': TracingCallbackHandler(
-                                tracer=tracer, parent_span=get_current_span()
-                            )
-                        }
-
-                    # If the function is a streaming response, we pass the websocket callback handler,
-                    # so that stream data can be sent back to the client.
-                    if include_ws_callback_handlers:
-                        to_support_in_kwargs.update(
-                            {
-                                'websocket': websocket,
-                                'streaming_handler': StreamingWebsocketCallbackHandler(
-                                    websocket=websocket,
-                                    output_model=output_model,
-                                ),
-                                'async_streaming_handler': AsyncStreamingWebsocketCallbackHandler(
-                                    websocket=websocket,
-                                    output_model=output_model,
-                                ),
-                            }
-                        )
+                    _cancel_token = CancelToken()
+                    to_support_in_kwargs = _get_kwargs_support(
+                        websocket, _token_pipeline, _cancel_token
+                    )
                     _returned_data, _ws_serving_error = '', ''
                     # TODO: add support for file upload
-                    _func_data, _envs = _get_func_data(
-                        func=func,
+                    _func_data, _envs = _invoker.get_func_data(
                         input_data=_input_data,
-                        files_data={},
                         auth_response=auth_response,
-                        workspace=workspace,
                         to_support_in_kwargs=to_support_in_kwargs,
                     )
-                    with EnvironmentVarCtxtManager(_envs), ChangeDirCtxtManager(
-                        dirname
-                    ):
+                    async with RequestCtxtManager(_envs):
                         try:
-                            _returned_data = await run_function(func, **_func_data)
-                            if inspect.isgenerator(_returned_data):
-                                # If the function is a generator, we iterate through the generator and send each item back to the client.
-                                for _stream in _returned_data:
-                                    _data = output_model(
-                                        result=_stream,
-                                        error=_ws_serving_error,
-                                    )
-                                    await websocket.send_text(_data.json())
-
-                            else:
-                                # If the function is not a generator, we send the result back to the client.
-                                _data = output_model(
-                                    result=_returned_data,
+                            # If the function is a generator, each of its items is sent back to the client,
+                            # all of them produced under the deadline of the route.
+                            async for _item, _ in _guard.stream(
+                                lambda: _outputs(
+                                    _func_data, _envs, _get_tenant(auth_response)
+                                ),
+                                cancel_token=_cancel_token,
+                                disconnected=_inbox.wait_for_disconnect,
+                            ):
+                                _data = _make_output(
+                                    result=_item,
                                     error=_ws_serving_error,
                                 )
-                                await websocket.send_text(_data.json())
+                                await _send_output(_data)
 
                             # Once the generator is exhausted/ function call is completed, send a close message
                             logger.info(
@@ -1049,15 +2242,39 @@ def create_websocket_route(
                             logger.info(_get_error_msg(e))
                             break
 
+                        except RouteOverloadedError as e:
+                            logger.warning(
+                                f'Rejecting connection to `{func.__name__}`: {e}'
+                            )
+                            await websocket.close(
+                                code=status.WS_1013_TRY_AGAIN_LATER, reason=str(e)
+                            )
+                            break
+
+                        except RunCancelledError as e:
+                            if e.reason == CancelReason.DISCONNECTED:
+                                logger.info(
+                                    f'Client {websocket.client} disconnected from `{func.__name__}`, cancelled its run'
+                                )
+                                break
+
+                            logger.warning(
+                                f'Run of `{func.__name__}` for client {websocket.client} timed out: {e}'
+                            )
+                            _ws_serving_error = str(e)
+                            await _send_output(
+                                _make_output(result='', error=_ws_serving_error)
+                            )
+
                         except Exception as e:
                             logger.error(f'Got an exception: {e}', exc_info=True)
                             _ws_serving_error = str(traceback.format_exc())
                             # For other errors, we send the error back to the client.
-                            _data = output_model(
+                            _data = _make_output(
                                 result='',
                                 error=_ws_serving_error,
                             )
-                            await websocket.send_text(_data.json())
+                            await _send_output(_data)
 
                         if _ws_serving_error != '':
                             print(f'Error: {_ws_serving_error}')
@@ -1066,6 +2283,160 @@ def create_websocket_route(
                 logger.info(_get_error_msg(e))
                 return
 
+            finally:
+                await _token_pipeline.aclose()
+                if _token_pipeline.dropped:
+                    logger.warning(
+                        f'Dropped {_token_pipeline.dropped} tokens of `{func.__name__}` for client {websocket.client}'
+                    )
+
+    async def _the_multiplexed_route(websocket: WebSocket, auth_response: Any = None):
+        # Every message carries a `request_id`, invocations run concurrently & all their
+        # outputs are tagged with it. The connection stays open until the client closes it.
+        _send_lock = asyncio.Lock()
+        _inflight: Dict[str, Tuple[asyncio.Future, CancelToken]] = {}
+
+        async def _send_tagged(request_id: Any, data: Dict, done: bool):
+            _data = {'request_id': request_id, **data, 'done': done}
+            _text = orjson_dumps(_data) if _orjson else json.dumps(_data)
+            async with _send_lock:
+                await websocket.send_text(_text)
+
+        def _to_data(data: BaseModel) -> Dict:
+            return data.dict() if _orjson else jsonable_encoder(data)
+
+        async def _invoke(
+            request_id: Any, input_data: BaseModel, cancel_token: CancelToken
+        ):
+            def _forget():
+                # the id may be reused by a new invocation once this one is done or
+                # cancelled, and a late cancel of it is ignored
+                if _inflight.get(request_id, (None, None))[1] is cancel_token:
+                    _inflight.pop(request_id)
+
+            async def _send(data: Dict, done: bool):
+                if done:
+                    _forget()
+                await _send_tagged(request_id, data, done=done)
+
+            async def _send_frame(kind: str, text: str):
+                await _send(_get_frame_data(kind, text), done=False)
+
+            _token_pipeline = TokenPipeline(_send_frame, config=stream_config).start()
+            _func_data, _envs = _invoker.get_func_data(
+                input_data=input_data,
+                auth_response=auth_response,
+                to_support_in_kwargs=_get_kwargs_support(
+                    websocket, _token_pipeline, cancel_token
+                ),
+            )
+            try:
+                async with RequestCtxtManager(_envs):
+                    try:
+                        # The result of a function is the last output, the items of a
+                        # generator are followed by an empty one
+                        _done = False
+                        async for _item, _generated in _guard.stream(
+                            lambda: _outputs(
+                                _func_data, _envs, _get_tenant(auth_response)
+                            ),
+                            cancel_token=cancel_token,
+                        ):
+                            _data = _make_output(result=_item, error='')
+                            _done = not _generated
+                            await _token_pipeline.flush()
+                            await _send(_to_data(_data), done=_done)
+                        if not _done:
+                            await _token_pipeline.flush()
+                            await _send({}, done=True)
+
+                    except (WebSocketDisconnect, ConnectionClosed):
+                        raise
+
+                    except (RouteOverloadedError, RunCancelledError) as e:
+                        logger.warning(
+                            f'Request {request_id} to `{func.__name__}` failed: {e}'
+                        )
+                        await _send({'result': '', 'error': str(e)}, done=True)
+
+                    except Exception as e:
+                        logger.error(f'Got an exception: {e}', exc_info=True)
+                        _error = str(traceback.format_exc())
+                        print(f'Error: {_error}')
+                        await _token_pipeline.flush()
+                        await _send(
+                            _to_data(_make_output(result='', error=_error)), done=True
+                        )
+            except (WebSocketDisconnect, ConnectionClosed):
+                pass
+            finally:
+                await _token_pipeline.aclose()
+                _forget()
+
+        await websocket.accept()
+        logger.info(
+            f'Client {websocket.client} connected to `{func.__name__}`, multiplexed.'
+        )
+        try:
+            while True:
+                _data = await websocket.receive_json()
+                _request_id = (
+                    _data.pop('request_id', None) if isinstance(_data, dict) else None
+                )
+                if _request_id is None:
+                    await _send_tagged(
+                        None, {'result': '', 'error': '`request_id` is required'}, True
+                    )
+                    continue
+
+                if _data.pop('cancel', False):
+                    if _request_id in _inflight:
+                        _task, _cancel_token = _inflight.pop(_request_id)
+                        _cancel_token.cancel(CancelReason.CANCELLED)
+                        _task.cancel()
+                        await _send_tagged(
+                            _request_id, {'result': '', 'error': 'Cancelled'}, True
+                        )
+                    continue
+
+                if _request_id in _inflight:
+                    await _send_tagged(
+                        _request_id,
+                        {'result': '', 'error': f'{_request_id} is already running'},
+                        True,
+                    )
+                    continue
+
+                try:
+                    _input_data = input_model(**_data)
+                except ValidationError as e:
+                    logger.error(f'Exception while converting data to input model: {e}')
+                    await _send_tagged(
+                        _request_id, {'result': '', 'error': str(e)}, True
+                    )
+                    continue
+
+                _cancel_token = CancelToken()
+                _inflight[_request_id] = (
+                    asyncio.ensure_future(
+                        _invoke(_request_id, _input_data, _cancel_token)
+                    ),
+                    _cancel_token,
+                )
+
+        except (WebSocketDisconnect, ConnectionClosed) as e:
+            logger.info(
+                f'Client {websocket.client} disconnected from `{func.__name__}` with code {e.code}'
+            )
+
+        finally:
+            # nobody is left to read the outputs of the running invocations
+            for _task, _cancel_token in list(_inflight.values()):
+                _cancel_token.cancel(CancelReason.DISCONNECTED)
+                _task.cancel()
+
+    _the_ws_route = _the_multiplexed_route if multiplex else _the_route
+
     if auth is not None:
         logger.info(f'Auth enabled for `{func.__name__}`')
 
@@ -1073,13 +2444,13 @@ def create_websocket_route(
         async def _create_ws_route(
             websocket: WebSocket, auth_response: Any = Depends(_the_authorizer)
         ) -> output_model:
-            return await _the_route(websocket=websocket, auth_response=auth_response)
+            return await _the_ws_route(websocket=websocket, auth_response=auth_response)
 
     else:
 
         @app.websocket(**ws_kwargs)
         async def _create_ws_route(websocket: WebSocket) -> output_model:
-            return await _the_route(websocket=websocket, auth_response=None)
+            return await _the_ws_route(websocket=websocket, auth_response=None)
 
 
 def _get_input_model_fields(
@@ -1100,11 +2471,15 @@ def _get_input_model_fields(
                 'Please add type annotations to all parameters.'
             )
 
-        if _param.annotation == UploadFile:
-            if _param.default is inspect.Parameter.empty:
-                _file_fields[_name] = (_param.annotation, ...)
+        if unwrap_optional(_param.annotation) in (UploadFile, WorkspaceFile):
+            # `WorkspaceFile` params are uploaded as files too, then stored in the workspace
+            if _param.default is not inspect.Parameter.empty:
+                _file_fields[_name] = (UploadFile, _param.default)
+            elif unwrap_optional(_param.annotation) is not _param.annotation:
+                # an `Optional` file can be left out
+                _file_fields[_name] = (UploadFile, None)
             else:
-                _file_fields[_name] = (_param.annotation, _param.default)
+                _file_fields[_name] = (UploadFile, ...)
         else:
             if _param.default is inspect.Parameter.empty:
                 _input_model_fields[_name] = (_param.annotation, ...)
@@ -1114,6 +2489,23 @@ def _get_input_model_fields(
     return _input_model_fields, _file_fields
 
 
+def _get_batch_item_fields(
+    func: Callable, fields: Dict[str, Tuple[Type, Any]]
+) -> Dict[str, Tuple[Type, Any]]:
+    # A batched function takes a `List[T]` per param, while each request sends a single `T`
+    _item_fields = {}
+    for _name, (_annotation, _default) in fields.items():
+        _item_type = get_batch_item_type(_annotation)
+        if _item_type is None:
+            raise ValueError(
+                f'Parameter {_name} of batched function {func.__name__} must be annotated '
+                f'with `List[...]`, got {_annotation}'
+            )
+        _item_fields[_name] = (_item_type, _default)
+
+    return _item_fields
+
+
 def _get_file_field_params(
     fields: Dict[str, Tuple[Type, Any]]
 ) -> List[inspect.Parameter]:
@@ -1122,7 +2514,7 @@ def _get_file_field_params(
         _file_field_params.append(
             inspect.Parameter(
                 _name,
-                inspect.Parameter.POSITIONAL_ONLY,
+                inspect.Parameter.KEYWORD_ONLY,
                 annotation=_field[0],
                 default=_field[1],
             )
@@ -1130,11 +2522,19 @@ def _get_file_field_params(
     return _file_field_params
 
 
-def _get_output_model_fields(func: Callable) -> Dict[str, Tuple[Type, Any]]:
+def _get_output_model_fields(
+    func: Callable, batch: bool = False
+) -> Dict[str, Tuple[Type, Any]]:
     def _get_result_type():
         if 'return' in func.__annotations__:
             _return = func.__annotations__['return']
-            if hasattr(_return, '__next__'):  # if a Generator, return the first type
+            if batch:  # a batched function returns a `List[T]`, each request gets a `T`
+                return get_batch_item_type(_return) or Any
+            elif getattr(_return, '__origin__', None) in GENERATOR_ORIGINS:
+                # e.g. `Generator[str, None, None]` or `AsyncIterator[str]` yield `str`s
+                _args = getattr(_return, '__args__', None) or (Any,)
+                return Any if isinstance(_args[0], TypeVar) else _args[0]
+            elif hasattr(_return, '__next__'):  # if a Generator, return the first type
                 return _return.__next__.__annotations__['return']
             elif _return is None:
                 return str
@@ -1152,43 +2552,20 @@ def _get_output_model_fields(func: Callable) -> Dict[str, Tuple[Type, Any]]:
     return _output_model_fields
 
 
-class Timer:
-    class SharedData:
-        def __init__(self, last_reported_time):
-            self.last_reported_time = last_reported_time
-
-    def __init__(self, interval: int):
-        self.interval = interval
-
-    async def send_duration_periodically(
-        self,
-        shared_data: SharedData,
-        route: str,
-        protocol: str,
-        counter: Optional['Counter'] = None,
-    ):
-        while True:
-            await asyncio.sleep(self.interval)
-            current_time = time.perf_counter()
-            if counter:
-                counter.add(
-                    current_time - shared_data.last_reported_time,
-                    {'route': route, 'protocol': protocol},
-                )
-
-            shared_data.last_reported_time = current_time
-
-
 class MetricsMiddleware:
     def __init__(
         self,
         app: ASGIApp,
-        duration_counter: Optional['Counter'] = None,
+        duration_histogram: Optional['Histogram'] = None,
         request_counter: Optional['Counter'] = None,
+        inflight_requests: Optional[InflightRequests] = None,
     ):
         self.app = app
-        self.duration_counter = duration_counter
+        self.duration_histogram = duration_histogram
         self.request_counter = request_counter
+        self.inflight_requests = (
+            inflight_requests if inflight_requests is not None else InflightRequests()
+        )
         # TODO: figure out solution for static assets
         self.skip_routes = [
             '/docs',
@@ -1197,6 +2574,8 @@ class MetricsMiddleware:
             '/healthz',
             '/dry_run',
             '/metrics',
+            '/debug/profile',
+            '/debug/profile/{profile_id}',
             '/favicon.ico',
             '/slack/events',
         ]
@@ -1205,30 +2584,50 @@ class MetricsMiddleware:
         # Not all Scope objs have path key, e.g., lifespan type of scope
         path = scope.get('path')
         if path and path not in self.skip_routes:
-            timer = Timer(5)
-            shared_data = timer.SharedData(last_reported_time=time.perf_counter())
-            send_duration_task = asyncio.create_task(
-                timer.send_duration_periodically(
-                    shared_data, path, scope['type'], self.duration_counter
-                )
-            )
+            request_id = self.inflight_requests.start(scope)
             try:
                 await self.app(scope, receive, send)
             finally:
-                send_duration_task.cancel()
-                if self.duration_counter:
-                    self.duration_counter.add(
-                        time.perf_counter() - shared_data.last_reported_time,
-                        {'route': path, 'protocol': scope['type']},
-                    )
-                if self.request_counter:
-                    self.request_counter.add(
-                        1, {'route': path, 'protocol': scope['type']}
-                    )
+                # labelled with the template of the route, requests matching none aren't recorded
+                route = get_route_path(scope)
+                duration = self.inflight_requests.end(
+                    request_id, report=route not in self.skip_routes
+                )
+                if route is not None and route not in self.skip_routes:
+                    if self.duration_histogram:
+                        self.duration_histogram.record(
+                            duration, {'route': route, 'protocol': scope['type']}
+                        )
+                    if self.request_counter:
+                        self.request_counter.add(
+                            1, {'route': route, 'protocol': scope['type']}
+                        )
         else:
             await self.app(scope, receive, send)
 
 
+class ProfileIdMiddleware:
+    """Sends the id of the profile of an invocation, requested with the `X-LCServe-Profile`
+    header, in the `X-LCServe-Profile-Id` header of its response"""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        async def _send(message: Message) -> None:
+            if message['type'] == 'http.response.start':
+                _profile_id = scope.get('state', {}).get(PROFILE_ID_STATE)
+                if _profile_id is not None:
+                    MutableHeaders(scope=message).append(PROFILE_ID_HEADER, _profile_id)
+            await send(message)
+
+        await self.app(scope, receive, _send)
+
+
 class LoggingMiddleware:
     def __init__(self, app: ASGIApp, logger: JinaLogger):
         self.app = app
@@ -1240,6 +2639,8 @@ class LoggingMiddleware:
             '/healthz',
             '/dry_run',
             '/metrics',
+            '/debug/profile',
+            '/debug/profile/{profile_id}',
             '/favicon.ico',
             '/slack/events',
         ]
@@ -1280,7 +2681,10 @@ class LoggingMiddleware:
             end_time = time.perf_counter()
             duration = round(end_time - start_time, 3)
 
-            if scope["type"] == "http":
+            if get_route_path(scope) in self.skip_routes:
+                # e.g. `/debug/profile/{profile_id}`, only known once routed
+                pass
+            elif scope["type"] == "http":
                 self.logger.info(
                     f"HTTP request: {request_id} - Path: {path} - Client IP: {ip_address} - Status code: {status_code} - Duration: {duration} s"
                 )
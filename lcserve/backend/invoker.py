@@ -0,0 +1,61 @@
+import inspect
+import json
+from typing import Any, Callable, Dict, Optional, Tuple, Union
+
+from pydantic import BaseModel
+
+from .uploads import WorkspaceFile, unwrap_optional
+
+
+class RouteInvoker:
+    """Builds the kwargs of a route function, from what its signature asks for.
+
+    The signature is read once at registration, so that requests only build the injectables
+    (`auth_response`, `workspace`, and handlers passed in `kwargs`) the function takes.
+    """
+
+    def __init__(self, func: Callable, workspace: Optional[str] = None):
+        _params = inspect.signature(func).parameters
+        _params_names = set(_params.keys())
+        self.func = func
+        self.workspace = workspace
+        # Handlers like `tracing_handler` or `streaming_handler` are only passed in `kwargs`
+        self.takes_kwargs = 'kwargs' in _params_names
+        self.takes_auth_response = 'auth_response' in _params_names or self.takes_kwargs
+        self.takes_workspace = 'workspace' in _params_names or self.takes_kwargs
+        # Uploads of these params are stored in the workspace, rather than passed as is
+        self.workspace_files = {
+            k
+            for k, p in _params.items()
+            if unwrap_optional(p.annotation) is WorkspaceFile
+        }
+
+    def get_func_data(
+        self,
+        input_data: Union[str, Dict, BaseModel],
+        files_data: Optional[Dict] = None,
+        auth_response: Any = None,
+        to_support_in_kwargs: Optional[Dict] = None,
+    ) -> Tuple[Dict[str, Any], Dict[str, str]]:
+        if isinstance(input_data, BaseModel):
+            _func_data = dict(input_data)
+        elif isinstance(input_data, str):
+            _func_data = json.loads(input_data)
+        else:
+            _func_data = dict(input_data)
+
+        _envs = _func_data.pop('envs', {})
+
+        if files_data:
+            _func_data.update(files_data)
+
+        if self.takes_auth_response:
+            _func_data['auth_response'] = auth_response
+
+        if self.takes_workspace:
+            _func_data['workspace'] = self.workspace
+
+        if to_support_in_kwargs and self.takes_kwargs:
+            _func_data.update(to_support_in_kwargs)
+
+        return _func_data, _envs
@@ -3,7 +3,7 @@ import copy
 import json
 import logging
 from dataclasses import dataclass
-from typing import Any, Dict, List, Optional, Union
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Union
 from uuid import UUID
 
 from fastapi import WebSocket
@@ -20,6 +20,14 @@ from opentelemetry.trace import (
 )
 from pydantic import BaseModel, ValidationError
 
+from .metrics import TokenMetrics, TokenTimer
+from .playground.utils.helper import paused_working_dir
+from .streaming import FrameKind
+
+if TYPE_CHECKING:
+    from .cancellation import WebsocketInbox
+    from .streaming import TokenPipeline, TokenStream
+
 
 def get_tracing_logger():
     logger = logging.getLogger("tracing")
@@ -61,6 +69,7 @@ class TracingCallbackHandlerMixin(BaseCallbackHandler):
         self.cost_per_llm_op = 0
         self.total_tokens = 0
         self.total_cost = 0
+        self._token_timer = TokenTimer()
 
     def _register_span(self, run_id, span):
         _span_map[run_id] = span
@@ -106,6 +115,7 @@ class TracingCallbackHandlerMixin(BaseCallbackHandler):
                 )
                 self.logger.info(json.dumps(trace_info.__dict__))
                 self._register_span(run_id, span)
+                self._token_timer.start(run_id)
         except Exception:
             self.logger.error("Error in tracing callback handler", exc_info=True)
 
@@ -142,6 +152,16 @@ class TracingCallbackHandlerMixin(BaseCallbackHandler):
             )
             self.logger.info(json.dumps(trace_info.__dict__))
             span.add_event("outputs", {"data": texts})
+
+            # only set for LLMs streaming their tokens
+            timings = self._token_timer.end(run_id)
+            if timings is not None:
+                span.set_attribute(
+                    "time_to_first_token_seconds", timings.time_to_first_token
+                )
+                span.set_attribute("streamed_tokens", timings.tokens)
+                if timings.tokens_per_second is not None:
+                    span.set_attribute("tokens_per_second", timings.tokens_per_second)
         except Exception:
             self.logger.error("Error in tracing callback handler", exc_info=True)
         finally:
@@ -282,7 +302,8 @@ class TracingCallbackHandlerMixin(BaseCallbackHandler):
         parent_run_id: Optional[UUID] = None,
         **kwargs: Any,
     ) -> None:
-        pass
+        # `on_llm_end` isn't called for failed runs
+        self._token_timer.end(run_id)
 
     def on_llm_new_token(
         self,
@@ -292,7 +313,14 @@ class TracingCallbackHandlerMixin(BaseCallbackHandler):
         parent_run_id: Optional[UUID] = None,
         **kwargs: Any,
     ) -> Any:
-        pass
+        if not self.tracer:
+            return
+
+        first, _ = self._token_timer.token(run_id)
+        if first:
+            span = self._current_span(run_id)
+            if span:
+                span.add_event("first_token")
 
     def on_text(
         self,
@@ -330,11 +358,41 @@ class OpenAITracingCallbackHandler(TracingCallbackHandlerMixin, OpenAICallbackHa
         TracingCallbackHandlerMixin.on_llm_end(self, response, run_id=run_id, **kwargs)
 
 
-class AsyncStreamingWebsocketCallbackHandler(StreamingStdOutCallbackHandler):
-    def __init__(self, websocket: "WebSocket", output_model: "BaseModel"):
+class TokenMetricsCallbackHandler(StreamingStdOutCallbackHandler):
+    """Times the tokens streamed to the client, if given `token_metrics`."""
+
+    def __init__(self, token_metrics: Optional[TokenMetrics] = None):
         super().__init__()
+        self.token_metrics = token_metrics
+
+    # sync, to be called by both the sync & async callback managers
+    def on_llm_start(
+        self, serialized: Dict[str, Any], prompts: List[str], **kwargs: Any
+    ) -> None:
+        if self.token_metrics is not None:
+            self.token_metrics.on_start(kwargs.get("run_id"))
+
+    def on_llm_end(self, response: LLMResult, **kwargs: Any) -> None:
+        if self.token_metrics is not None:
+            self.token_metrics.on_end(kwargs.get("run_id"))
+
+    def _time_token(self, kwargs: Dict[str, Any]):
+        if self.token_metrics is not None:
+            self.token_metrics.on_token(kwargs.get("run_id"))
+
+
+class AsyncStreamingWebsocketCallbackHandler(TokenMetricsCallbackHandler):
+    def __init__(
+        self,
+        websocket: "WebSocket",
+        output_model: "BaseModel",
+        token_pipeline: Optional["TokenPipeline"] = None,
+        token_metrics: Optional[TokenMetrics] = None,
+    ):
+        super().__init__(token_metrics=token_metrics)
         self.websocket = websocket
         self.output_model = output_model
+        self.token_pipeline = token_pipeline
 
     @property
     def always_verbose(self) -> bool:
@@ -345,6 +403,11 @@ class AsyncStreamingWebsocketCallbackHandler(StreamingStdOutCallbackHandler):
         return True
 
     async def on_llm_new_token(self, token: str, **kwargs) -> None:
+        self._time_token(kwargs)
+        if self.token_pipeline is not None:
+            self.token_pipeline.put(token)
+            return
+
         try:
             data = self.output_model(result=token, error="").dict()
         except ValidationError:
@@ -352,6 +415,10 @@ class AsyncStreamingWebsocketCallbackHandler(StreamingStdOutCallbackHandler):
         await self.websocket.send_json(data)
 
     async def on_text(self, text: str, **kwargs: Any) -> None:
+        if self.token_pipeline is not None:
+            self.token_pipeline.put(text)
+            return
+
         try:
             data = self.output_model(result=text, error="").dict()
         except ValidationError:
@@ -381,6 +448,18 @@ class AsyncTracingCallbackHandler(TracingCallbackHandler):
     ) -> None:
         super().on_llm_end(response, run_id=run_id, **kwargs)
 
+    async def on_llm_new_token(
+        self,
+        token: str,
+        *,
+        run_id: UUID,
+        parent_run_id: Optional[UUID] = None,
+        **kwargs: Any,
+    ) -> None:
+        super().on_llm_new_token(
+            token, run_id=run_id, parent_run_id=parent_run_id, **kwargs
+        )
+
     async def on_chain_start(
         self,
         serialized: Dict[str, Any],
@@ -434,12 +513,62 @@ class StreamingWebsocketCallbackHandler(AsyncStreamingWebsocketCallbackHandler):
         return False
 
     def on_llm_new_token(self, token: str, **kwargs) -> None:
+        if self.token_pipeline is not None:
+            self._time_token(kwargs)
+            # Runs on the worker thread, the pipeline sends the token from the event loop
+            self.token_pipeline.put(token)
+            return
+
         asyncio.run(super().on_llm_new_token(token, **kwargs))
 
     def on_text(self, text: str, **kwargs: Any) -> None:
+        if self.token_pipeline is not None:
+            self.token_pipeline.put(text)
+            return
+
         asyncio.run(super().on_text(text, **kwargs))
 
 
+class AsyncStreamingQueueCallbackHandler(TokenMetricsCallbackHandler):
+    """Streams tokens to an HTTP response through a `TokenStream`."""
+
+    def __init__(
+        self,
+        token_stream: "TokenStream",
+        token_metrics: Optional[TokenMetrics] = None,
+    ):
+        super().__init__(token_metrics=token_metrics)
+        self.token_stream = token_stream
+
+    @property
+    def always_verbose(self) -> bool:
+        return True
+
+    @property
+    def is_async(self) -> bool:
+        return True
+
+    async def on_llm_new_token(self, token: str, **kwargs) -> None:
+        self._time_token(kwargs)
+        self.token_stream.put(token)
+
+    async def on_text(self, text: str, **kwargs: Any) -> None:
+        self.token_stream.put(text)
+
+
+class StreamingQueueCallbackHandler(AsyncStreamingQueueCallbackHandler):
+    @property
+    def is_async(self) -> bool:
+        return False
+
+    def on_llm_new_token(self, token: str, **kwargs) -> None:
+        self._time_token(kwargs)
+        self.token_stream.put(token)
+
+    def on_text(self, text: str, **kwargs: Any) -> None:
+        self.token_stream.put(text)
+
+
 class _HumanInput(BaseModel):
     prompt: str
 
@@ -452,16 +581,28 @@ class InputWrapper:
         loop: asyncio.AbstractEventLoop,
         websocket: "WebSocket",
         recv_lock: asyncio.Lock,
+        token_pipeline: Optional["TokenPipeline"] = None,
+        inbox: Optional["WebsocketInbox"] = None,
     ):
         self.loop = loop
         self.websocket = websocket
         self.recv_lock = recv_lock
+        self.token_pipeline = token_pipeline
+        self.inbox = inbox
 
     async def __acall__(self, __prompt: str = ""):
+        if self.token_pipeline is not None:
+            # Send the pending tokens before asking the human
+            await self.token_pipeline.flush()
+
         _human_input = _HumanInput(prompt=__prompt)
         async with self.recv_lock:
             await self.websocket.send_json(_human_input.dict())
-        return await self.websocket.receive_text()
+        # requests for other directories can run while the human answers
+        async with paused_working_dir():
+            if self.inbox is not None:
+                return await self.inbox.receive_text()
+            return await self.websocket.receive_text()
 
     def __call__(self, __prompt: str = ""):
         return asyncio.run_coroutine_threadsafe(
@@ -475,12 +616,21 @@ class PrintWrapper:
         loop: asyncio.AbstractEventLoop,
         websocket: "WebSocket",
         output_model: "BaseModel",
+        token_pipeline: Optional["TokenPipeline"] = None,
     ):
         self.loop = loop
         self.websocket = websocket
         self.output_model = output_model
+        self.token_pipeline = token_pipeline
 
     def __call__(self, *args: Any, **kwds: Any) -> Any:
+        if self.token_pipeline is not None:
+            self.token_pipeline.put(
+                kwds.get("sep", " ").join(map(str, args)) + kwds.get("end", "\n"),
+                kind=FrameKind.STDOUT,
+            )
+            return
+
         asyncio.run_coroutine_threadsafe(self.__acall__(*args, **kwds), self.loop)
 
     async def __acall__(self, *args: Any, **kwds: Any) -> Any:
@@ -499,23 +649,35 @@ class BuiltinsWrapper:
         output_model: "BaseModel",
         wrap_print: bool = True,
         wrap_input: bool = True,
+        token_pipeline: Optional["TokenPipeline"] = None,
+        inbox: Optional["WebsocketInbox"] = None,
     ):
         self.loop = loop
         self.websocket = websocket
         self.output_model = output_model
         self._wrap_print = wrap_print
         self._wrap_input = wrap_input
+        self._token_pipeline = token_pipeline
+        self._inbox = inbox
 
     def __enter__(self):
         import builtins
 
         if self._wrap_print:
             self._print = builtins.print
-            builtins.print = PrintWrapper(self.loop, self.websocket, self.output_model)
+            builtins.print = PrintWrapper(
+                self.loop, self.websocket, self.output_model, self._token_pipeline
+            )
 
         if self._wrap_input:
             self._input = builtins.input
-            builtins.input = InputWrapper(self.loop, self.websocket, asyncio.Lock())
+            builtins.input = InputWrapper(
+                self.loop,
+                self.websocket,
+                asyncio.Lock(),
+                self._token_pipeline,
+                self._inbox,
+            )
 
     def __exit__(self, exc_type, exc_val, exc_tb):
         import builtins
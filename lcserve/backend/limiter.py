@@ -0,0 +1,164 @@
+import math
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Optional
+
+from ..errors import RouteOverloadedError
+
+if TYPE_CHECKING:
+    from opentelemetry.sdk.metrics import Counter, UpDownCounter
+
+LIMIT_EXCEEDED_STATUS_CODE = 503
+TOO_MANY_REQUESTS_STATUS_CODE = 429
+# Weight of a new sample in the baseline latency, which follows the last ~100 requests
+BASELINE_ALPHA = 2 / (100 + 1)
+
+
+class LimitAlgorithm:
+    GRADIENT = 'gradient'
+    AIMD = 'aimd'
+
+
+@dataclass
+class AdaptiveConcurrencyConfig:
+    """Adaptive limit of the in-flight requests of a `@serving` route.
+
+    :param algorithm: `gradient` scales the limit by how much slower requests got than the
+        baseline latency, `aimd` adds 1 after each fast request & backs off on slow ones
+    :param initial_limit: limit before any request completed
+    :param min_limit: the limit never goes below this
+    :param max_limit: the limit never goes above this
+    :param tolerance: ratio of the baseline latency above which requests count as slow
+    :param backoff_ratio: factor the limit is multiplied by when a request fails, or is slow
+        with `aimd`
+    :param smoothing: weight of each new limit computed by `gradient`
+    """
+
+    algorithm: str = LimitAlgorithm.GRADIENT
+    initial_limit: int = 20
+    min_limit: int = 1
+    max_limit: int = 200
+    tolerance: float = 2.0
+    backoff_ratio: float = 0.9
+    smoothing: float = 0.2
+
+    def __post_init__(self):
+        if self.algorithm not in (LimitAlgorithm.GRADIENT, LimitAlgorithm.AIMD):
+            raise ValueError(
+                f'algorithm must be one of `gradient` or `aimd`, got {self.algorithm}'
+            )
+        if not 1 <= self.min_limit <= self.initial_limit <= self.max_limit:
+            raise ValueError(
+                'limits must satisfy 1 <= min_limit <= initial_limit <= max_limit'
+            )
+        if self.tolerance < 1:
+            raise ValueError(f'tolerance must be at least 1, got {self.tolerance}')
+        if not 0 < self.backoff_ratio < 1:
+            raise ValueError(
+                f'backoff_ratio must be between 0 and 1, got {self.backoff_ratio}'
+            )
+
+
+class AdaptiveLimiter:
+    """Sheds the requests of a route above a limit of in-flight requests, which adapts
+    to the latency & errors of the completed ones.
+
+    When an upstream slows down, the limit shrinks, so that new requests are rejected
+    early with 503 instead of piling up behind the slow ones.
+    """
+
+    def __init__(
+        self,
+        route: str,
+        config: Optional[AdaptiveConcurrencyConfig] = None,
+        limit_counter: Optional['UpDownCounter'] = None,
+        rejected_counter: Optional['Counter'] = None,
+    ):
+        self.route = route
+        self.config = config or AdaptiveConcurrencyConfig()
+        self.limit_counter = limit_counter
+        self.rejected_counter = rejected_counter
+        self._limit = float(self.config.initial_limit)
+        self._baseline: Optional[float] = None
+        self._inflight = 0
+        if self.limit_counter:
+            self.limit_counter.add(self.limit, {'route': self.route})
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    @property
+    def inflight(self) -> int:
+        return self._inflight
+
+    def _reject(self):
+        if self.rejected_counter:
+            self.rejected_counter.add(
+                1, {'route': self.route, 'status_code': LIMIT_EXCEEDED_STATUS_CODE}
+            )
+        raise RouteOverloadedError(
+            self.route,
+            status_code=LIMIT_EXCEEDED_STATUS_CODE,
+            retry_after=max(1, math.ceil(self._baseline or 1)),
+        )
+
+    def _next_limit(self, latency: float, dropped: bool) -> float:
+        _config = self.config
+        if dropped:
+            return self._limit * _config.backoff_ratio
+
+        # Only grow when the limit is actually used, not to drift up while idle
+        _can_grow = self._inflight * 2 >= self._limit
+        if _config.algorithm == LimitAlgorithm.AIMD:
+            if latency > self._baseline * _config.tolerance:
+                return self._limit * _config.backoff_ratio
+            return self._limit + 1 if _can_grow else self._limit
+
+        _gradient = max(0.5, min(1.0, _config.tolerance * self._baseline / latency))
+        _limit = self._limit * _gradient + math.sqrt(self._limit)
+        if _limit > self._limit and not _can_grow:
+            return self._limit
+        return self._limit * (1 - _config.smoothing) + _limit * _config.smoothing
+
+    def record(self, latency: float, dropped: bool = False):
+        """Updates the limit with the latency of a request, `dropped` if it failed"""
+        if not dropped:
+            latency = max(latency, 1e-6)
+            self._baseline = (
+                latency
+                if self._baseline is None
+                else self._baseline * (1 - BASELINE_ALPHA) + latency * BASELINE_ALPHA
+            )
+
+        _previous = self.limit
+        self._limit = max(
+            self.config.min_limit,
+            min(self.config.max_limit, self._next_limit(latency, dropped)),
+        )
+        if self.limit_counter and self.limit != _previous:
+            self.limit_counter.add(self.limit - _previous, {'route': self.route})
+
+    @asynccontextmanager
+    async def acquire(self):
+        if self._inflight >= self.limit:
+            self._reject()
+
+        self._inflight += 1
+        start_time = time.perf_counter()
+        try:
+            yield
+        except RouteOverloadedError as e:
+            # a tenant over its rate limit says nothing about the upstream
+            if e.status_code != TOO_MANY_REQUESTS_STATUS_CODE:
+                self.record(time.perf_counter() - start_time, dropped=True)
+            raise
+        except BaseException:
+            # failures, timeouts & cancellations all hint at an overloaded upstream
+            self.record(time.perf_counter() - start_time, dropped=True)
+            raise
+        else:
+            self.record(time.perf_counter() - start_time)
+        finally:
+            self._inflight -= 1
@@ -0,0 +1,250 @@
+import itertools
+import time
+from dataclasses import dataclass
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+)
+
+if TYPE_CHECKING:
+    from opentelemetry.metrics import CallbackOptions, Meter, Observation
+    from opentelemetry.sdk.metrics import Histogram
+    from opentelemetry.trace import Span
+    from starlette.types import Scope
+
+# LLM calls take from a fraction of a second to minutes, unlike the default buckets
+# made for web requests, which stop at 10s
+LLM_LATENCY_BUCKETS = (
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1,
+    2.5,
+    5,
+    10,
+    20,
+    30,
+    60,
+    120,
+    300,
+)
+
+
+def create_histogram(
+    meter: 'Meter',
+    name: str,
+    description: str = '',
+    unit: str = '',
+    boundaries: Optional[Sequence[float]] = None,
+) -> 'Histogram':
+    if boundaries is not None:
+        try:
+            return meter.create_histogram(
+                name=name,
+                description=description,
+                unit=unit,
+                explicit_bucket_boundaries_advisory=boundaries,
+            )
+        except TypeError:
+            # bucket advisories need opentelemetry-api>=1.23, older ones use the default buckets
+            pass
+    return meter.create_histogram(name=name, description=description, unit=unit)
+
+
+def get_route_path(scope: 'Scope') -> Optional[str]:
+    """The path template of the route a request matched, e.g. `/debug/profile/{profile_id}`,
+    None until it's routed, or if it matched none"""
+    return getattr(scope.get('route'), 'path', None)
+
+
+class InflightRequests:
+    """Requests being served by the gateway, by route & protocol.
+
+    Observed by the metric reader on each collection, so long running requests (e.g.
+    websocket connections) are visible before they end, without a task per request.
+
+    Requests are labelled with the template of the route they matched rather than their
+    path, so that probes of random paths don't add label values. Requests yet to be
+    routed, or matching no route, aren't reported.
+    """
+
+    def __init__(self):
+        self._requests: Dict[int, Tuple['Scope', float]] = {}
+        self._ids = itertools.count()
+        # routes with requests since the last collection of each observer, reported even
+        # with 0 requests left, then dropped
+        self._recent: Dict[str, Set[Tuple[str, str]]] = {'count': set(), 'age': set()}
+
+    def __len__(self) -> int:
+        return len(self._requests)
+
+    def start(self, scope: 'Scope') -> int:
+        _id = next(self._ids)
+        self._requests[_id] = (scope, time.perf_counter())
+        return _id
+
+    def end(self, request_id: int, report: bool = True) -> float:
+        """Returns the duration of the request in seconds. Its route is reported at 0 on
+        the next collections, unless `report` is False"""
+        _scope, _start_time = self._requests.pop(request_id)
+        _route = get_route_path(_scope)
+        if _route is not None and report:
+            for _routes in self._recent.values():
+                _routes.add((_route, _scope['type']))
+        return time.perf_counter() - _start_time
+
+    def _by_route(self, observer: str) -> Dict[Tuple[str, str], Tuple[int, float]]:
+        _now = time.perf_counter()
+        _recent, self._recent[observer] = self._recent[observer], set()
+        _stats: Dict[Tuple[str, str], Tuple[int, float]] = {
+            _key: (0, 0.0) for _key in _recent
+        }
+        for _scope, _start_time in list(self._requests.values()):
+            _route = get_route_path(_scope)
+            if _route is None:
+                continue
+            _key = (_route, _scope['type'])
+            _count, _age = _stats.get(_key, (0, 0.0))
+            _stats[_key] = (_count + 1, max(_age, _now - _start_time))
+        return _stats
+
+    def observe_count(self, options: 'CallbackOptions') -> Iterable['Observation']:
+        from opentelemetry.metrics import Observation
+
+        for (_route, _protocol), (_count, _) in self._by_route('count').items():
+            yield Observation(_count, {'route': _route, 'protocol': _protocol})
+
+    def observe_age(self, options: 'CallbackOptions') -> Iterable['Observation']:
+        from opentelemetry.metrics import Observation
+
+        for (_route, _protocol), (_, _age) in self._by_route('age').items():
+            yield Observation(_age, {'route': _route, 'protocol': _protocol})
+
+
+# Time to the first token of an LLM, from its call
+TIME_TO_FIRST_TOKEN_BUCKETS = (0.05, 0.1, 0.25, 0.5, 0.75, 1, 1.5, 2, 3, 5, 10, 30)
+# Gaps between the streamed tokens of an LLM
+INTER_TOKEN_GAP_BUCKETS = (0.005, 0.01, 0.02, 0.03, 0.05, 0.075, 0.1, 0.2, 0.5, 1, 2)
+TOKENS_PER_SECOND_BUCKETS = (1, 5, 10, 20, 30, 50, 75, 100, 150, 200, 500)
+
+
+@dataclass
+class TokenTimings:
+    time_to_first_token: float
+    tokens: int
+    tokens_per_second: Optional[float] = None
+
+
+class TokenTimer:
+    """Times the tokens streamed by each LLM run, keyed by their `run_id`.
+
+    Runs started before the timer, or by callbacks not getting `on_llm_start`, are
+    timed from the creation of the timer.
+    """
+
+    def __init__(self):
+        self._created_at = time.perf_counter()
+        # run_id -> [started at, first token at, last token at, tokens]
+        self._runs: Dict[Any, List] = {}
+
+    def start(self, run_id: Any):
+        self._runs[run_id] = [time.perf_counter(), None, None, 0]
+
+    def token(self, run_id: Any) -> Tuple[bool, float]:
+        """Returns whether it's the first token of the run, and the seconds since the
+        start of the run if so, else since the previous token"""
+        _now = time.perf_counter()
+        _run = self._runs.setdefault(run_id, [self._created_at, None, None, 0])
+        _started_at, _first_at, _last_at, _tokens = _run
+        _run[2] = _now
+        _run[3] = _tokens + 1
+        if _first_at is None:
+            _run[1] = _now
+            return True, _now - _started_at
+        return False, _now - _last_at
+
+    def end(self, run_id: Any) -> Optional[TokenTimings]:
+        """Returns the timings of the run, None if it streamed no tokens"""
+        _run = self._runs.pop(run_id, None)
+        if _run is None or _run[1] is None:
+            return None
+
+        _started_at, _first_at, _last_at, _tokens = _run
+        _timings = TokenTimings(
+            time_to_first_token=_first_at - _started_at, tokens=_tokens
+        )
+        if _tokens > 1 and _last_at > _first_at:
+            _timings.tokens_per_second = (_tokens - 1) / (_last_at - _first_at)
+        return _timings
+
+
+@dataclass
+class TokenHistograms:
+    time_to_first_token: Optional['Histogram'] = None
+    inter_token_gap: Optional['Histogram'] = None
+    tokens_per_second: Optional['Histogram'] = None
+
+
+class TokenMetrics:
+    """Records the time to first token, the gaps between tokens & the tokens per second
+    of the LLM runs of a request, in histograms by route and on the request span.
+    """
+
+    def __init__(
+        self,
+        route: str,
+        histograms: Optional[TokenHistograms] = None,
+        span: Optional['Span'] = None,
+    ):
+        self.route = route
+        self.histograms = histograms or TokenHistograms()
+        self.span = span
+        self._timer = TokenTimer()
+        self._attributes = {'route': route}
+        self._tokens = 0
+        self._first_token_seen = False
+
+    def on_start(self, run_id: Any):
+        self._timer.start(run_id)
+
+    def on_token(self, run_id: Any):
+        _first, _seconds = self._timer.token(run_id)
+        self._tokens += 1
+        if _first:
+            if self.histograms.time_to_first_token:
+                self.histograms.time_to_first_token.record(_seconds, self._attributes)
+            if not self._first_token_seen and self._is_recording():
+                # the latency felt by the client is the one of its first token
+                self.span.set_attribute('llm.time_to_first_token_seconds', _seconds)
+                self.span.add_event('first_token')
+            self._first_token_seen = True
+        elif self.histograms.inter_token_gap:
+            self.histograms.inter_token_gap.record(_seconds, self._attributes)
+
+    def on_end(self, run_id: Any):
+        _timings = self._timer.end(run_id)
+        if _timings is None:
+            return
+
+        if _timings.tokens_per_second is not None:
+            if self.histograms.tokens_per_second:
+                self.histograms.tokens_per_second.record(
+                    _timings.tokens_per_second, self._attributes
+                )
+            if self._is_recording():
+                self.span.set_attribute(
+                    'llm.tokens_per_second', _timings.tokens_per_second
+                )
+        if self._is_recording():
+            self.span.set_attribute('llm.streamed_tokens', self._tokens)
+
+    def _is_recording(self) -> bool:
+        return self.span is not None and self.span.is_recording()
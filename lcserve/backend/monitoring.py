@@ -0,0 +1,118 @@
+import asyncio
+import contextvars
+import sys
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from logging import Logger
+from typing import TYPE_CHECKING, Any, Callable, Optional
+
+if TYPE_CHECKING:
+    from opentelemetry.sdk.metrics import Histogram
+
+LOOP_LAG_INTERVAL = 0.5
+DEFAULT_LOOP_LAG_THRESHOLD = 1.0
+LOOP_LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+class LoopLagMonitor:
+    """Measures how late the event loop wakes up a task sleeping `interval` seconds.
+
+    A lag measured after the fact doesn't tell what blocked the loop, so a watchdog
+    thread also checks on the task, and logs the stack of the loop thread while the
+    loop is blocked for more than `threshold` seconds, once per stall.
+    """
+
+    def __init__(
+        self,
+        logger: Logger,
+        interval: float = LOOP_LAG_INTERVAL,
+        threshold: Optional[float] = DEFAULT_LOOP_LAG_THRESHOLD,
+        lag_histogram: Optional['Histogram'] = None,
+    ):
+        self.logger = logger
+        self.interval = interval
+        self.threshold = threshold
+        self.lag_histogram = lag_histogram
+        self._heartbeat = time.perf_counter()
+        self._loop_thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Future] = None
+        self._stopped = threading.Event()
+
+    def start(self):
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.perf_counter()
+        self._stopped.clear()
+        self._task = asyncio.ensure_future(self._measure())
+        if self.threshold:
+            threading.Thread(
+                target=self._watch, name='lcserve-loop-watchdog', daemon=True
+            ).start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._task is not None:
+            self._task.cancel()
+
+    async def _measure(self):
+        while True:
+            _start_time = self._heartbeat = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            _lag = max(0.0, time.perf_counter() - _start_time - self.interval)
+            if self.lag_histogram:
+                self.lag_histogram.record(_lag)
+
+    def _blocked_for(self) -> float:
+        return time.perf_counter() - self._heartbeat - self.interval
+
+    def _watch(self):
+        _dumped_heartbeat = None
+        while not self._stopped.wait(self.interval):
+            _heartbeat = self._heartbeat
+            if _heartbeat != _dumped_heartbeat and self._blocked_for() > self.threshold:
+                _dumped_heartbeat = _heartbeat
+                self._dump_stack()
+
+    def _dump_stack(self):
+        _frame = sys._current_frames().get(self._loop_thread_id)
+        _stack = ''.join(traceback.format_stack(_frame)) if _frame is not None else ''
+        self.logger.warning(
+            f'Event loop blocked for {self._blocked_for():.2f}s, stack of the loop thread:\n{_stack}'
+        )
+
+
+class InstrumentedThreadPoolExecutor(ThreadPoolExecutor):
+    """Thread pool counting its running & queued work items.
+
+    Work items run in a copy of the context they were submitted from, so that as the
+    default executor of the loop, `loop.run_in_executor(None, ...)` calls (e.g. the sync
+    fallbacks of LangChain) see the envs of their request.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._active = 0
+        self._active_lock = threading.Lock()
+
+    @property
+    def active(self) -> int:
+        return self._active
+
+    @property
+    def queued(self) -> int:
+        return self._work_queue.qsize()
+
+    def submit(self, fn: Callable, *args: Any, **kwargs: Any):
+        return super().submit(
+            contextvars.copy_context().run, self._run, fn, *args, **kwargs
+        )
+
+    def _run(self, fn: Callable, *args: Any, **kwargs: Any) -> Any:
+        with self._active_lock:
+            self._active += 1
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            with self._active_lock:
+                self._active -= 1
@@ -1,15 +1,19 @@
 import asyncio
+import contextvars
+import functools
+import importlib
+import inspect
 import os
 import subprocess
 import sys
 import threading
-import importlib
 import uuid
-from collections import defaultdict
-from io import StringIO
-from typing import Any, Dict, List, Union, Callable, Tuple
-import inspect
-import functools
+from collections import defaultdict, deque
+from collections.abc import MutableMapping
+from concurrent.futures import Executor, ProcessPoolExecutor
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Deque, Dict, List, Optional, TextIO, Tuple, Union
 
 import nest_asyncio
 from pydantic import BaseModel
@@ -95,19 +99,123 @@ def parse_uses_with(uses_with: Union[Dict, BaseModel, List]) -> Dict[str, Any]:
     return _uses_with
 
 
+STDOUT_BUFFER_MAX_CHARS = 1 << 20
+
+
+class StdoutRingBuffer:
+    """Bounded buffer for the stdout of a single request.
+
+    Keeps the last `max_chars` characters written, older writes are dropped.
+    """
+
+    def __init__(self, max_chars: int = STDOUT_BUFFER_MAX_CHARS):
+        self.max_chars = max_chars
+        self._chunks: Deque[str] = deque()
+        self._size = 0
+        self._dropped = 0
+        self._lock = threading.Lock()
+
+    def write(self, s: str) -> int:
+        if not s:
+            return 0
+
+        with self._lock:
+            self._chunks.append(s)
+            self._size += len(s)
+            while self._size > self.max_chars:
+                _overflow = self._size - self.max_chars
+                _oldest = self._chunks[0]
+                if len(_oldest) <= _overflow:
+                    self._chunks.popleft()
+                    self._size -= len(_oldest)
+                    self._dropped += len(_oldest)
+                else:
+                    self._chunks[0] = _oldest[_overflow:]
+                    self._size -= _overflow
+                    self._dropped += _overflow
+        return len(s)
+
+    def getvalue(self) -> str:
+        with self._lock:
+            _value = ''.join(self._chunks)
+            if self._dropped:
+                _value = f'[{self._dropped} characters truncated]\n' + _value
+            return _value
+
+
+_stdout_buffer: 'ContextVar[Optional[StdoutRingBuffer]]' = ContextVar(
+    'lcserve_stdout_buffer', default=None
+)
+
+
+class ContextualStdout:
+    """Replacement for `sys.stdout` that routes writes to the buffer of the current request.
+
+    Writes outside of a capturing request go to the original stream.
+    """
+
+    def __init__(self, stream: TextIO):
+        self._stream = stream
+
+    def write(self, s: str) -> int:
+        _buffer = _stdout_buffer.get()
+        if _buffer is None:
+            return self._stream.write(s)
+        return _buffer.write(s)
+
+    def flush(self):
+        if _stdout_buffer.get() is None:
+            self._stream.flush()
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._stream, name)
+
+
+def install_contextual_stdout():
+    if not isinstance(sys.stdout, ContextualStdout):
+        sys.stdout = ContextualStdout(sys.stdout)
+
+
+class StdoutCapture:
+    """Captures stdout written in the current context into a bounded buffer.
+
+    Executor threads running a copy of the context are captured too, while concurrent
+    captures don't see each other's output.
+    """
+
+    def __init__(self, max_chars: int = STDOUT_BUFFER_MAX_CHARS):
+        self.buffer = StdoutRingBuffer(max_chars=max_chars)
+        self._token = None
+
+    def __enter__(self):
+        install_contextual_stdout()
+        self._token = _stdout_buffer.set(self.buffer)
+        return self
+
+    def __exit__(self, *args):
+        _stdout_buffer.reset(self._token)
+
+    def getvalue(self) -> str:
+        """Captured output without the trailing newline"""
+        _value = self.buffer.getvalue()
+        return _value[:-1] if _value.endswith('\n') else _value
+
+
 class Capturing(list):
-    def __enter__(self, lock: threading.Lock = None):
+    def __init__(self, lock: threading.Lock = None):
+        super().__init__()
         self._lock = lock
+        self._capture = StdoutCapture()
+
+    def __enter__(self):
         if self._lock:
             self._lock.acquire()
-        self._stdout = sys.stdout
-        sys.stdout = self._stringio = StringIO()
+        self._capture.__enter__()
         return self
 
     def __exit__(self, *args):
-        self.extend(self._stringio.getvalue().splitlines())
-        del self._stringio  # free up some memory
-        sys.stdout = self._stdout
+        self._capture.__exit__(*args)
+        self.extend(self._capture.getvalue().splitlines())
         if self._lock:
             self._lock.release()
 
@@ -157,6 +265,283 @@ class ChangeDirCtxtManager:
         os.chdir(self._old_path)
 
 
+class RequestContext:
+    """State scoped to a single invocation of a `@serving` function"""
+
+    def __init__(self, envs: Dict = None, dirname: str = None):
+        """
+        :param envs: environment variables visible only to this invocation
+        :param dirname: the app directory, used as working directory for this invocation
+        """
+        # A value of None marks an environment variable deleted during the invocation
+        self.envs: Dict[str, Optional[str]] = {
+            k: str(v) for k, v in (envs or {}).items()
+        }
+        self.dirname = dirname
+        # set while the function of the invocation runs in the working directory
+        self.working_dir: Optional['WorkingDir'] = None
+
+
+_request_context: 'ContextVar[Optional[RequestContext]]' = ContextVar(
+    'lcserve_request_context', default=None
+)
+
+
+def get_request_context() -> Optional[RequestContext]:
+    return _request_context.get()
+
+
+class ContextualEnviron(MutableMapping):
+    """Replacement for `os.environ` that overlays the envs of the current request.
+
+    Outside of a request, reads & writes go to the process environment. Inside of a
+    request, reads check the envs of the request first and writes only update them,
+    so concurrent requests don't see each other's envs. Subprocesses started without
+    an explicit `env` only see the process environment.
+    """
+
+    def __init__(self, environ: MutableMapping):
+        self._environ = environ
+
+    @staticmethod
+    def _overlay() -> Optional[Dict[str, Optional[str]]]:
+        ctx = _request_context.get()
+        return ctx.envs if ctx is not None else None
+
+    def __getitem__(self, key: str) -> str:
+        overlay = self._overlay()
+        if overlay is not None and key in overlay:
+            if overlay[key] is None:
+                raise KeyError(key)
+            return overlay[key]
+        return self._environ[key]
+
+    def __setitem__(self, key: str, value: str):
+        overlay = self._overlay()
+        if overlay is None:
+            self._environ[key] = value
+        else:
+            overlay[key] = str(value)
+
+    def __delitem__(self, key: str):
+        overlay = self._overlay()
+        if overlay is None:
+            del self._environ[key]
+        elif key not in self:
+            raise KeyError(key)
+        else:
+            overlay[key] = None
+
+    def _keys(self) -> List[str]:
+        overlay = self._overlay()
+        if not overlay:
+            return list(self._environ)
+        keys = [k for k in self._environ if overlay.get(k, '') is not None]
+        keys.extend(
+            k for k, v in overlay.items() if v is not None and k not in self._environ
+        )
+        return keys
+
+    def __iter__(self):
+        return iter(self._keys())
+
+    def __len__(self) -> int:
+        return len(self._keys())
+
+    def __repr__(self) -> str:
+        return f'ContextualEnviron({dict(self)})'
+
+    def copy(self) -> Dict[str, str]:
+        return dict(self)
+
+
+def install_contextual_environ():
+    if not isinstance(os.environ, ContextualEnviron):
+        os.environ = ContextualEnviron(os.environ)
+
+
+class _WorkingDirGate:
+    """Shares the process working directory between concurrent requests.
+
+    Requests for the directory that is already current run in parallel. A request for
+    another directory waits until the current holders are done, and blocks new holders
+    of the current directory meanwhile, so that it doesn't starve. Once it switches the
+    directory, all the requests waiting for its directory are admitted together.
+    """
+
+    def __init__(self):
+        self._cond: Optional[asyncio.Condition] = None
+        self._dirname: Optional[str] = None
+        self._old_path: Optional[str] = None
+        self._holders = 0
+        # waiting requests by directory
+        self._waiting: Dict[str, int] = defaultdict(int)
+
+    def _others_waiting(self, dirname: str) -> bool:
+        return any(n > 0 for d, n in self._waiting.items() if d != dirname)
+
+    async def acquire(self, dirname: str):
+        if self._cond is None:
+            self._cond = asyncio.Condition()
+
+        async with self._cond:
+            if (
+                self._holders > 0
+                and self._dirname == dirname
+                and not self._others_waiting(dirname)
+            ):
+                self._holders += 1
+                return
+
+            self._waiting[dirname] += 1
+            try:
+                await self._cond.wait_for(
+                    lambda: self._holders == 0 or self._dirname == dirname
+                )
+            finally:
+                self._waiting[dirname] -= 1
+                if self._waiting[dirname] == 0:
+                    del self._waiting[dirname]
+
+            if self._holders == 0:
+                self._old_path = os.getcwd()
+                os.chdir(dirname)
+                self._dirname = dirname
+                # let in the other requests waiting for the same directory
+                self._cond.notify_all()
+            self._holders += 1
+
+    async def release(self):
+        async with self._cond:
+            self._holders -= 1
+            if self._holders == 0:
+                os.chdir(self._old_path)
+                self._dirname = None
+                self._cond.notify_all()
+
+
+_working_dir_gate = _WorkingDirGate()
+
+
+class WorkingDir:
+    """Holds the working directory `dirname` while the code of a function runs, shared with
+    the concurrent requests for the same directory.
+
+    It's taken once the function is admitted, e.g. past its worker pool & concurrency
+    limit, rather than for the whole request. `paused()` lets the requests for other
+    directories run meanwhile, e.g. while waiting for a human, or for the consumer of
+    a generator. Entered again by the same request, e.g. by a nested call, it's a no-op.
+    """
+
+    def __init__(self, dirname: Optional[str] = None):
+        self.dirname = dirname
+        self._held = False
+        self._ctx: Optional[RequestContext] = None
+        # the hold of the request, when entered again
+        self._outer: Optional['WorkingDir'] = None
+
+    async def acquire(self):
+        if self.dirname and not self._held and self._outer is None:
+            await _working_dir_gate.acquire(self.dirname)
+            self._held = True
+
+    async def release(self):
+        if self._held:
+            await _working_dir_gate.release()
+            self._held = False
+
+    @asynccontextmanager
+    async def paused(self):
+        if self._outer is not None:
+            async with self._outer.paused():
+                yield
+            return
+
+        _held = self._held
+        await self.release()
+        try:
+            yield
+        finally:
+            if _held:
+                await self.acquire()
+
+    async def __aenter__(self) -> 'WorkingDir':
+        _ctx = get_request_context()
+        if _ctx is not None and _ctx.working_dir is not None:
+            if _ctx.working_dir.dirname == self.dirname:
+                self._outer = _ctx.working_dir
+                return self
+
+        await self.acquire()
+        if _ctx is not None and _ctx.working_dir is None and self._held:
+            # found by `input()`, to pause it while waiting for a human
+            _ctx.working_dir, self._ctx = self, _ctx
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        if self._ctx is not None:
+            self._ctx.working_dir, self._ctx = None, None
+        self._outer = None
+        await self.release()
+
+
+@asynccontextmanager
+async def paused_working_dir():
+    """Lets requests for other directories run while the current request waits"""
+    _ctx = get_request_context()
+    if _ctx is None or _ctx.working_dir is None:
+        yield
+        return
+
+    async with _ctx.working_dir.paused():
+        yield
+
+
+class RequestCtxtManager:
+    """a class to scope envs & working directory to a single request
+
+    Used with `async with`, the working directory is shared with concurrent requests
+    for the same directory, until the end of the block. Used with `with`, it is changed
+    directly, which is only safe in single threaded workers. The gateway scopes the envs
+    to the whole request, and the working directory to the function with `WorkingDir`.
+    """
+
+    def __init__(self, envs: Dict, dirname: str = None):
+        """
+        :param envs: a dictionary of environment variables
+        :param dirname: a path to change to
+        """
+        self._ctx = RequestContext(envs=envs, dirname=dirname)
+        self._token = None
+        self._change_dir = None
+        self._working_dir = WorkingDir(dirname)
+
+    def __enter__(self):
+        if self._ctx.dirname:
+            self._change_dir = ChangeDirCtxtManager(self._ctx.dirname)
+            self._change_dir.__enter__()
+        self._token = _request_context.set(self._ctx)
+        return self._ctx
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        _request_context.reset(self._token)
+        if self._change_dir is not None:
+            self._change_dir.__exit__(exc_type, exc_val, exc_tb)
+
+    async def __aenter__(self):
+        self._token = _request_context.set(self._ctx)
+        try:
+            await self._working_dir.__aenter__()
+        except BaseException:
+            _request_context.reset(self._token)
+            raise
+        return self._ctx
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self._working_dir.__aexit__(exc_type, exc_val, exc_tb)
+        _request_context.reset(self._token)
+
+
 def run_cmd(command, std_output=False, wait=True):
     if isinstance(command, str):
         command = command.split()
@@ -179,14 +564,64 @@ def get_random_name():
     return 'n-' + uuid.uuid4().hex[:5]
 
 
+async def run_in_executor(executor: Optional[Executor], func: Callable, **kwargs):
+    if isinstance(executor, ProcessPoolExecutor):
+        _func = functools.partial(func, **kwargs)
+    else:
+        # copy the context, so that the request context is visible in the executor thread
+        _func = functools.partial(contextvars.copy_context().run, func, **kwargs)
+    return await asyncio.get_running_loop().run_in_executor(executor, _func)
+
+
+async def run_in_executor_until_done(
+    executor: Optional[Executor], func: Callable, **kwargs
+):
+    """Like `run_in_executor`, but a call that already started in a thread (or process)
+    can't be interrupted, so when the caller is cancelled, it waits for the call to finish
+    before raising. Whatever the caller holds, e.g. the slots of a route, stays taken by
+    the call running on. A call still queued in the executor is dropped right away.
+    """
+    if isinstance(executor, ProcessPoolExecutor):
+        _call = executor.submit(functools.partial(func, **kwargs))
+        _future = asyncio.wrap_future(_call)
+        # `False` once the call is running
+        _drop = _call.cancel
+    else:
+        _lock = threading.Lock()
+        _state = {'started': False, 'dropped': False}
+        _run = functools.partial(contextvars.copy_context().run, func, **kwargs)
+
+        def _start_and_run():
+            with _lock:
+                if _state['dropped']:
+                    return None
+                _state['started'] = True
+            return _run()
+
+        def _drop() -> bool:
+            with _lock:
+                _state['dropped'] = not _state['started']
+                return _state['dropped']
+
+        _future = asyncio.get_running_loop().run_in_executor(executor, _start_and_run)
+
+    try:
+        return await asyncio.shield(_future)
+    except asyncio.CancelledError:
+        if not _drop():
+            while not _future.done():
+                try:
+                    await asyncio.wait([_future])
+                except asyncio.CancelledError:
+                    pass
+        raise
+
+
 async def run_function(func: Callable, **kwargs):
     if inspect.iscoroutinefunction(func):
         return await func(**kwargs)
     else:
-        return await asyncio.get_running_loop().run_in_executor(
-            None,
-            functools.partial(func, **kwargs),
-        )
+        return await run_in_executor_until_done(None, func, **kwargs)
 
 
 class ImportFromStringError(Exception):
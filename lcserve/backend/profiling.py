@@ -0,0 +1,182 @@
+import functools
+import hmac
+import inspect
+import queue
+import sys
+import threading
+import uuid
+from collections import Counter, OrderedDict
+from concurrent.futures import thread as futures_thread
+from types import CodeType, FrameType
+from typing import Callable, List, Mapping, Optional, Set
+
+PROFILE_HEADER = 'X-LCServe-Profile'
+PROFILE_ID_HEADER = 'X-LCServe-Profile-Id'
+# Key of the profile id in the state of a request
+PROFILE_ID_STATE = 'lcserve_profile_id'
+PROFILE_CONTENT_TYPE = 'text/plain'
+
+DEFAULT_PROFILE_SECONDS = 30
+MAX_PROFILE_SECONDS = 300
+# 100 samples per second, like most sampling profilers
+SAMPLE_INTERVAL = 0.01
+MAX_KEPT_PROFILES = 32
+
+# Frames of a thread waiting for work, rather than doing any
+_WAITING_FILES = (threading.__file__, queue.__file__)
+
+
+def _label(code: CodeType) -> str:
+    return f'{code.co_name} ({code.co_filename}:{code.co_firstlineno})'
+
+
+def _is_idle(stack: List[FrameType]) -> bool:
+    """Whether the thread is an executor thread waiting for a work item"""
+    for _frame in stack:
+        if _frame.f_code.co_filename in _WAITING_FILES:
+            continue
+        return (
+            _frame.f_code.co_name == '_worker'
+            and _frame.f_code.co_filename == futures_thread.__file__
+        )
+    return True
+
+
+def get_code(func: Callable) -> Optional[CodeType]:
+    return getattr(inspect.unwrap(func), '__code__', None)
+
+
+class SamplingProfiler:
+    """Samples the stacks of the threads of the gateway, i.e. the event loop & the
+    executor threads, every `interval` seconds from a thread of its own, and counts them
+    as collapsed stacks, the input of flamegraph tools (`flamegraph.pl`, speedscope).
+
+    With `code`, e.g. the one of the function of a route, only the stacks running it
+    are kept. With `wrapped`, only the stacks of the calls of the functions wrapped
+    with `wrap` are.
+    """
+
+    def __init__(
+        self,
+        interval: float = SAMPLE_INTERVAL,
+        code: Optional[CodeType] = None,
+        wrapped: bool = False,
+    ):
+        self.interval = interval
+        self.code = code
+        self.wrapped = wrapped
+        self.samples: Counter = Counter()
+        self._frames: Set[FrameType] = set()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def __enter__(self) -> 'SamplingProfiler':
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def start(self):
+        self._stopped.clear()
+        self._thread = threading.Thread(
+            target=self._sample, name='lcserve-profiler', daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def wrap(self, func: Callable) -> Callable:
+        """Wraps `func` so that its calls are sampled, be it on the loop or in a thread"""
+        _frames = self._frames
+
+        if inspect.iscoroutinefunction(func):
+
+            @functools.wraps(func)
+            async def _profiled(*args, **kwargs):
+                # the frame of a coroutine is the same across its suspensions
+                _frame = sys._getframe()
+                _frames.add(_frame)
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    _frames.discard(_frame)
+
+        else:
+
+            @functools.wraps(func)
+            def _profiled(*args, **kwargs):
+                _frame = sys._getframe()
+                _frames.add(_frame)
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    _frames.discard(_frame)
+
+        return _profiled
+
+    def collapsed(self) -> str:
+        """Returns the samples as lines of `root;...;leaf count`"""
+        return ''.join(
+            f'{_stack} {_count}\n' for _stack, _count in self.samples.most_common()
+        )
+
+    def _sample(self):
+        _own_id = threading.get_ident()
+        while not self._stopped.wait(self.interval):
+            _frames = set(self._frames) if self.wrapped else None
+            for _thread_id, _frame in sys._current_frames().items():
+                if _thread_id == _own_id:
+                    continue
+                _stack = self._collapse(_frame, _frames)
+                if _stack:
+                    self.samples[_stack] += 1
+
+    def _collapse(
+        self, frame: Optional[FrameType], frames: Optional[Set[FrameType]]
+    ) -> Optional[str]:
+        _stack: List[FrameType] = []
+        while frame is not None:
+            _stack.append(frame)
+            frame = frame.f_back
+
+        if frames is not None and not any(f in frames for f in _stack):
+            return None
+        if self.code is not None and not any(f.f_code is self.code for f in _stack):
+            return None
+        if _is_idle(_stack):
+            return None
+        return ';'.join(_label(f.f_code) for f in reversed(_stack))
+
+
+class InvocationProfiles:
+    """Profiles of single invocations, requested with the debug token in the
+    `X-LCServe-Profile` header, and kept until they're fetched by their id.
+    """
+
+    def __init__(self, token: str, max_profiles: int = MAX_KEPT_PROFILES):
+        self.token = token
+        self.max_profiles = max_profiles
+        self._profiles: OrderedDict = OrderedDict()
+
+    def authorize(self, token: Optional[str]) -> bool:
+        return token is not None and hmac.compare_digest(
+            token.encode(), self.token.encode()
+        )
+
+    def requested(self, headers: Mapping[str, str]) -> bool:
+        return self.authorize(headers.get(PROFILE_HEADER))
+
+    def add(self, collapsed: str) -> str:
+        _id = uuid.uuid4().hex
+        self._profiles[_id] = collapsed
+        while len(self._profiles) > self.max_profiles:
+            self._profiles.popitem(last=False)
+        return _id
+
+    def pop(self, profile_id: str) -> Optional[str]:
+        return self._profiles.pop(profile_id, None)
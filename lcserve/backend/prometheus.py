@@ -0,0 +1,235 @@
+import math
+import threading
+from bisect import bisect_left
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# the charset is added by the response
+CONTENT_TYPE = 'text/plain; version=0.0.4'
+# Same as the default buckets of opentelemetry, so that both exports look alike
+DEFAULT_BUCKETS = (
+    0,
+    5,
+    10,
+    25,
+    50,
+    75,
+    100,
+    250,
+    500,
+    750,
+    1000,
+    2500,
+    5000,
+    7500,
+    10000,
+)
+
+_Labels = Tuple[Tuple[str, str], ...]
+
+
+def _get_labels(attributes: Optional[Dict[str, Any]]) -> _Labels:
+    if not attributes:
+        return ()
+    return tuple(sorted((str(k), str(v)) for k, v in attributes.items()))
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(labels: _Labels) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in labels) + '}'
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return '+Inf'
+    if isinstance(value, int) or float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Instrument:
+    """Aggregates into one shard per thread, which only that thread writes to, so that
+    recording takes no lock. Shards are merged when the metrics are scraped.
+    """
+
+    type = ''
+
+    def __init__(self, name: str, description: str = '', unit: str = ''):
+        self.name = name
+        self.description = description
+        self.unit = unit
+        self._local = threading.local()
+        self._shards: List[Dict[_Labels, Any]] = []
+
+    def _shard(self) -> Dict[_Labels, Any]:
+        try:
+            return self._local.shard
+        except AttributeError:
+            _shard = self._local.shard = {}
+            self._shards.append(_shard)
+            return _shard
+
+    def _merged(self) -> Dict[_Labels, Any]:
+        raise NotImplementedError
+
+    def _samples(self) -> Iterable[Tuple[str, _Labels, float]]:
+        for _labels, _value in sorted(self._merged().items()):
+            yield self.name, _labels, _value
+
+    def render(self) -> List[str]:
+        _lines = [
+            f'# HELP {self.name} {_escape(self.description)}',
+            f'# TYPE {self.name} {self.type}',
+        ]
+        for _name, _labels, _value in self._samples():
+            _lines.append(f'{_name}{_format_labels(_labels)} {_format_value(_value)}')
+        return _lines
+
+
+class Counter(_Instrument):
+    type = 'counter'
+
+    def add(self, amount: float, attributes: Optional[Dict[str, Any]] = None):
+        _shard = self._shard()
+        _labels = _get_labels(attributes)
+        _shard[_labels] = _shard.get(_labels, 0) + amount
+
+    def _merged(self) -> Dict[_Labels, float]:
+        _merged: Dict[_Labels, float] = {}
+        for _shard in list(self._shards):
+            for _labels, _value in list(_shard.items()):
+                _merged[_labels] = _merged.get(_labels, 0) + _value
+        return _merged
+
+
+class UpDownCounter(Counter):
+    type = 'gauge'
+
+
+class Histogram(_Instrument):
+    type = 'histogram'
+
+    def __init__(
+        self,
+        name: str,
+        description: str = '',
+        unit: str = '',
+        boundaries: Optional[Sequence[float]] = None,
+    ):
+        super().__init__(name, description, unit)
+        self.boundaries = tuple(boundaries or DEFAULT_BUCKETS)
+
+    def record(self, amount: float, attributes: Optional[Dict[str, Any]] = None):
+        _shard = self._shard()
+        _labels = _get_labels(attributes)
+        _series = _shard.get(_labels)
+        if _series is None:
+            # count per bucket, +Inf included, then sum & count
+            _series = _shard[_labels] = [0] * (len(self.boundaries) + 1) + [0, 0]
+        _series[bisect_left(self.boundaries, amount)] += 1
+        _series[-2] += amount
+        _series[-1] += 1
+
+    def _merged(self) -> Dict[_Labels, List[float]]:
+        _merged: Dict[_Labels, List[float]] = {}
+        for _shard in list(self._shards):
+            for _labels, _series in list(_shard.items()):
+                _total = _merged.setdefault(_labels, [0] * len(_series))
+                for i, _value in enumerate(list(_series)):
+                    _total[i] += _value
+        return _merged
+
+    def _samples(self) -> Iterable[Tuple[str, _Labels, float]]:
+        for _labels, _series in sorted(self._merged().items()):
+            _cumulative = 0
+            for _bound, _count in zip(self.boundaries + (math.inf,), _series):
+                _cumulative += _count
+                yield (
+                    f'{self.name}_bucket',
+                    _labels + (('le', _format_value(_bound)),),
+                    _cumulative,
+                )
+            yield f'{self.name}_sum', _labels, _series[-2]
+            yield f'{self.name}_count', _labels, _series[-1]
+
+
+class ObservableGauge(_Instrument):
+    type = 'gauge'
+
+    def __init__(
+        self,
+        name: str,
+        callbacks: Sequence[Callable] = (),
+        description: str = '',
+        unit: str = '',
+    ):
+        super().__init__(name, description, unit)
+        self.callbacks = list(callbacks)
+
+    def _merged(self) -> Dict[_Labels, float]:
+        _merged: Dict[_Labels, float] = {}
+        for _callback in self.callbacks:
+            for _observation in _callback(None):
+                _merged[_get_labels(_observation.attributes)] = _observation.value
+        return _merged
+
+
+class PrometheusRegistry:
+    """In-process metrics, created like with an opentelemetry `Meter`, and rendered in
+    the Prometheus text format on scrape.
+    """
+
+    def __init__(self):
+        self._instruments: Dict[str, _Instrument] = {}
+
+    def _register(self, instrument: _Instrument) -> Any:
+        return self._instruments.setdefault(instrument.name, instrument)
+
+    def create_counter(
+        self, name: str, unit: str = '', description: str = ''
+    ) -> Counter:
+        return self._register(Counter(name, description=description, unit=unit))
+
+    def create_up_down_counter(
+        self, name: str, unit: str = '', description: str = ''
+    ) -> UpDownCounter:
+        return self._register(UpDownCounter(name, description=description, unit=unit))
+
+    def create_histogram(
+        self,
+        name: str,
+        unit: str = '',
+        description: str = '',
+        explicit_bucket_boundaries_advisory: Optional[Sequence[float]] = None,
+    ) -> Histogram:
+        return self._register(
+            Histogram(
+                name,
+                description=description,
+                unit=unit,
+                boundaries=explicit_bucket_boundaries_advisory,
+            )
+        )
+
+    def create_observable_gauge(
+        self,
+        name: str,
+        callbacks: Optional[Sequence[Callable]] = None,
+        unit: str = '',
+        description: str = '',
+    ) -> ObservableGauge:
+        return self._register(
+            ObservableGauge(
+                name, callbacks=callbacks or (), description=description, unit=unit
+            )
+        )
+
+    def render(self) -> str:
+        _lines = []
+        for _instrument in list(self._instruments.values()):
+            _lines.extend(_instrument.render())
+        return '\n'.join(_lines) + '\n'
@@ -0,0 +1,160 @@
+import asyncio
+import heapq
+import itertools
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+# Tenants tracked at once, the least recently seen ones are forgotten first
+MAX_TRACKED_TENANTS = 10000
+
+
+@dataclass
+class TenantConfig:
+    """Per-tenant scheduling of a `@serving` route, tenants being identified by the
+    `auth_response` of the route's `auth` function.
+
+    :param key: how to get the tenant from the `auth_response`, the whole `auth_response`
+        if None, the item or attribute of that name if a string, else a callable
+    :param weights: weight of each tenant, a tenant with weight 2 gets twice as many
+        workers as a tenant with weight 1 when both have requests waiting
+    :param default_weight: weight of the tenants not in `weights`
+    :param rate: requests per second allowed per tenant, unlimited if None
+    :param burst: requests a tenant can send at once, above its `rate`
+    :param queue_size: maximum number of waiting requests per tenant, unbounded if None
+    """
+
+    key: Union[str, Callable[[Any], Any], None] = None
+    weights: Dict[str, float] = field(default_factory=dict)
+    default_weight: float = 1
+    rate: Optional[float] = None
+    burst: Optional[int] = None
+    queue_size: Optional[int] = None
+
+    def __post_init__(self):
+        if self.default_weight <= 0 or any(w <= 0 for w in self.weights.values()):
+            raise ValueError('tenant weights must be positive numbers')
+        if self.rate is not None and self.rate <= 0:
+            raise ValueError(f'rate must be a positive number, got {self.rate}')
+        if self.burst is not None and self.burst < 1:
+            raise ValueError(f'burst must be a positive integer, got {self.burst}')
+
+    def get_tenant(self, auth_response: Any) -> str:
+        if callable(self.key):
+            _tenant = self.key(auth_response)
+        elif self.key is None:
+            _tenant = auth_response
+        elif isinstance(auth_response, dict):
+            _tenant = auth_response.get(self.key)
+        else:
+            _tenant = getattr(auth_response, self.key, None)
+        return '' if _tenant is None else str(_tenant)
+
+    def get_weight(self, tenant: str) -> float:
+        return self.weights.get(tenant, self.default_weight)
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated_at = time.monotonic()
+
+    def take(self) -> float:
+        """Takes a token, returns 0 if there was one, else the seconds until there is"""
+        _now = time.monotonic()
+        self._tokens = min(
+            self.burst, self._tokens + (_now - self._updated_at) * self.rate
+        )
+        self._updated_at = _now
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return 0
+        return (1 - self._tokens) / self.rate
+
+
+class RateLimiter:
+    """Token bucket per tenant"""
+
+    def __init__(self, rate: float, burst: Optional[int] = None):
+        self.rate = rate
+        self.burst = burst or max(1, int(rate))
+        self._buckets: 'OrderedDict[str, TokenBucket]' = OrderedDict()
+
+    def take(self, tenant: str) -> float:
+        _bucket = self._buckets.get(tenant)
+        if _bucket is None:
+            _bucket = self._buckets[tenant] = TokenBucket(self.rate, self.burst)
+            if len(self._buckets) > MAX_TRACKED_TENANTS:
+                self._buckets.popitem(last=False)
+        self._buckets.move_to_end(tenant)
+        return _bucket.take()
+
+
+class FairQueue:
+    """Weighted fair queue in front of `max_concurrency` slots.
+
+    Each request is tagged with the virtual time at which it would finish if every tenant
+    with waiting requests got its share, `1 / weight` per request. Free slots go to the
+    smallest tag first, so a tenant sending many requests only delays its own.
+    """
+
+    def __init__(self, max_concurrency: int):
+        self._free = max_concurrency
+        self._virtual_time = 0.0
+        self._finish_tags: Dict[str, float] = {}
+        self._waiters: List[Tuple[float, int, float, asyncio.Future]] = []
+        self._seq = itertools.count()
+        self._waiting: Dict[str, int] = {}
+
+    def locked(self) -> bool:
+        return self._free == 0
+
+    def waiting(self, tenant: str) -> int:
+        return self._waiting.get(tenant, 0)
+
+    def _tag(self, tenant: str, weight: float) -> Tuple[float, float]:
+        if len(self._finish_tags) > MAX_TRACKED_TENANTS:
+            # tenants without waiting requests start again from the virtual time anyway
+            self._finish_tags = {
+                t: f for t, f in self._finish_tags.items() if f > self._virtual_time
+            }
+        _start = max(self._virtual_time, self._finish_tags.get(tenant, 0.0))
+        _finish = _start + 1.0 / weight
+        self._finish_tags[tenant] = _finish
+        return _start, _finish
+
+    async def acquire(self, tenant: str = '', weight: float = 1):
+        _start, _finish = self._tag(tenant, weight)
+        if self._free > 0 and not self._waiters:
+            self._free -= 1
+            self._virtual_time = _start
+            return
+
+        _future = asyncio.get_event_loop().create_future()
+        heapq.heappush(self._waiters, (_finish, next(self._seq), _start, _future))
+        self._waiting[tenant] = self._waiting.get(tenant, 0) + 1
+        try:
+            await _future
+        except asyncio.CancelledError:
+            if _future.done() and not _future.cancelled():
+                # got a slot while being cancelled, hand it over
+                self.release()
+            raise
+        finally:
+            self._waiting[tenant] -= 1
+            if self._waiting[tenant] == 0:
+                del self._waiting[tenant]
+
+    def release(self):
+        while self._waiters:
+            _, _, _start, _future = heapq.heappop(self._waiters)
+            if _future.done():
+                # cancelled while waiting
+                continue
+            self._virtual_time = _start
+            _future.set_result(None)
+            return
+        self._free += 1
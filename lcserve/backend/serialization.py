@@ -0,0 +1,39 @@
+from typing import Any, Dict, List, Union
+
+# Types that can be sent as is, without a pydantic validation round-trip. `Any` & untyped
+# containers aren't, as they can hold models or objects that orjson can't encode.
+_JSON_NATIVE_TYPES = (str, int, float, bool, type(None))
+
+
+class JSONEncoderType:
+    DEFAULT = 'default'
+    ORJSON = 'orjson'
+
+
+def import_orjson():
+    try:
+        import orjson
+    except ImportError:
+        raise ImportError('Please install orjson using `pip install orjson`')
+    return orjson
+
+
+def is_json_native_type(annotation: Any) -> bool:
+    """Whether values of the annotated type are already JSON-native"""
+    if annotation in _JSON_NATIVE_TYPES:
+        return True
+
+    _origin = getattr(annotation, '__origin__', None)
+    _args = getattr(annotation, '__args__', None) or ()
+    if _origin in (list, List, Union):
+        return bool(_args) and all(is_json_native_type(_arg) for _arg in _args)
+    elif _origin in (dict, Dict):
+        return len(_args) == 2 and _args[0] is str and is_json_native_type(_args[1])
+    return False
+
+
+def orjson_dumps(content: Any) -> str:
+    orjson = import_orjson()
+    return orjson.dumps(
+        content, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+    ).decode()
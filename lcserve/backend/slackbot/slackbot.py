@@ -28,7 +28,7 @@ from slack_sdk.errors import SlackApiError
 from tenacity import retry, stop_after_attempt, wait_exponential
 
 if TYPE_CHECKING:
-    from opentelemetry.sdk.metrics import Counter
+    from opentelemetry.sdk.metrics import Counter, Histogram
 
     from ..langchain_helper import OpenAICallbackHandler, TracingCallbackHandler
 
@@ -44,7 +44,7 @@ class SlackBot:
         workspace: str,
         tracing_handler: Union['OpenAICallbackHandler', 'TracingCallbackHandler'],
         request_counter: Optional['Counter'] = None,
-        duration_counter: Optional['Counter'] = None,
+        duration_histogram: Optional['Histogram'] = None,
     ):
         from langchain.output_parsers import PydanticOutputParser
         from slack_bolt import App
@@ -58,7 +58,7 @@ class SlackBot:
         self.slack_app = App()
         self.workspace = workspace
         self.request_counter = request_counter
-        self.duration_counter = duration_counter
+        self.duration_histogram = duration_histogram
         self.tracing_handler = tracing_handler
         self.handler = SlackRequestHandler(self.slack_app)
         self._parser = PydanticOutputParser(pydantic_object=TextOrBlock)
@@ -388,8 +388,8 @@ Human: {input}
             elapsed_time = end_time - start_time
             if self.request_counter:
                 self.request_counter.add(1)
-            if self.duration_counter:
-                self.duration_counter.add(elapsed_time)
+            if self.duration_histogram:
+                self.duration_histogram.record(elapsed_time)
             return result
 
         return wrapper_timer
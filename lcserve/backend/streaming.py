@@ -0,0 +1,341 @@
+import asyncio
+import inspect
+import json
+import threading
+from collections import deque
+from dataclasses import dataclass
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Deque,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+)
+
+from starlette.datastructures import Headers
+from starlette.responses import StreamingResponse
+from starlette.types import Receive, Scope, Send
+
+from .playground.utils.helper import WorkingDir, run_in_executor
+
+NDJSON_MEDIA_TYPE = 'application/x-ndjson'
+SSE_MEDIA_TYPE = 'text/event-stream'
+# Number of items a sync generator can produce ahead of the consumer
+GENERATOR_QUEUE_SIZE = 64
+
+_END = object()
+
+
+class BackpressurePolicy:
+    BLOCK = 'block'
+    DROP = 'drop'
+
+
+class FrameKind:
+    RESULT = 'result'
+    STDOUT = 'stdout'
+
+
+@dataclass
+class StreamConfig:
+    """Configuration of the token streaming of a websocket `@serving` route.
+
+    :param flush_ms: milliseconds during which tokens are collected into a single frame,
+        0 sends every token right away
+    :param max_chars: a frame is sent as soon as this many characters are pending
+    :param max_pending: maximum number of tokens waiting to be sent
+    :param backpressure: what happens to a producer when `max_pending` tokens are waiting,
+        `block` pauses it until there's room, `drop` drops its tokens
+    """
+
+    flush_ms: float = 20
+    max_chars: int = 1024
+    max_pending: int = 4096
+    backpressure: str = BackpressurePolicy.BLOCK
+
+    def __post_init__(self):
+        if self.backpressure not in (BackpressurePolicy.BLOCK, BackpressurePolicy.DROP):
+            raise ValueError(
+                f'backpressure must be one of `block` or `drop`, got {self.backpressure}'
+            )
+        if self.flush_ms < 0:
+            raise ValueError(f'flush_ms must be non-negative, got {self.flush_ms}')
+        if self.max_chars < 1 or self.max_pending < 1:
+            raise ValueError('max_chars & max_pending must be positive integers')
+
+
+def is_generator_function(func: Callable) -> bool:
+    """Whether the (possibly decorated) function is a sync or async generator function"""
+    _func = inspect.unwrap(func)
+    return inspect.isgeneratorfunction(_func) or inspect.isasyncgenfunction(_func)
+
+
+async def iterate_in_thread(
+    generator: Iterator,
+    maxsize: int = GENERATOR_QUEUE_SIZE,
+    working_dir: Optional[WorkingDir] = None,
+) -> AsyncIterator:
+    """Iterates a sync generator on a worker thread, so that blocking work between items
+    doesn't block the event loop.
+
+    Items are handed over through a bounded queue, so that a slow consumer pauses the
+    generator. If the consumer stops early, the generator is closed on its thread.
+    The `working_dir` held for the generator is paused while it waits for the consumer,
+    and released once it's exhausted.
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue(maxsize)
+    stopped = threading.Event()
+
+    async def _aput(item: Any, error: Optional[BaseException]):
+        if working_dir is None:
+            await queue.put((item, error))
+        elif item is _END:
+            await working_dir.release()
+            await queue.put((item, error))
+        elif queue.full():
+            async with working_dir.paused():
+                await queue.put((item, error))
+        else:
+            queue.put_nowait((item, error))
+
+    def _put(item: Any, error: Optional[BaseException] = None):
+        asyncio.run_coroutine_threadsafe(_aput(item, error), loop).result()
+
+    def _produce():
+        try:
+            for item in generator:
+                if stopped.is_set():
+                    break
+                _put(item)
+        except BaseException as e:
+            if not stopped.is_set():
+                _put(_END, e)
+            return
+        finally:
+            if stopped.is_set():
+                generator.close()
+
+        if not stopped.is_set():
+            _put(_END)
+
+    _producer = asyncio.ensure_future(run_in_executor(None, _produce))
+    try:
+        while True:
+            item, error = await queue.get()
+            if error is not None:
+                raise error
+            if item is _END:
+                break
+            yield item
+    finally:
+        if not _producer.done():
+            stopped.set()
+            # unblock the producer, if it's waiting on a full queue
+            while not queue.empty():
+                queue.get_nowait()
+
+
+async def iterate(result: Any, dirname: Optional[str] = None) -> AsyncIterator:
+    """Iterates the result of a generator function, without blocking the event loop.
+
+    The generator runs in the working directory `dirname`, which other requests can
+    change while an item waits for the consumer.
+    """
+    async with WorkingDir(dirname) as working_dir:
+        if inspect.isasyncgen(result):
+            async for item in result:
+                async with working_dir.paused():
+                    yield item
+        else:
+            async for item in iterate_in_thread(result, working_dir=working_dir):
+                yield item
+
+
+class TokenStream:
+    """Hands over tokens from callback handlers, running on any thread, to the event loop"""
+
+    def __init__(self, loop: Optional[asyncio.AbstractEventLoop] = None):
+        self.loop = loop or asyncio.get_event_loop()
+        self._queue: asyncio.Queue = asyncio.Queue()
+
+    def put(self, token: Any):
+        self.loop.call_soon_threadsafe(self._queue.put_nowait, token)
+
+    def close(self):
+        self.loop.call_soon_threadsafe(self._queue.put_nowait, _END)
+
+    async def __aiter__(self) -> AsyncIterator:
+        while True:
+            token = await self._queue.get()
+            if token is _END:
+                break
+            yield token
+
+
+def _coalesce(items: List[Tuple[str, str]]) -> List[Tuple[str, str]]:
+    # join consecutive tokens of the same kind, keeping the order of the kinds
+    _frames: List[Tuple[str, List[str]]] = []
+    for kind, text in items:
+        if _frames and _frames[-1][0] == kind:
+            _frames[-1][1].append(text)
+        else:
+            _frames.append((kind, [text]))
+    return [(kind, ''.join(texts)) for kind, texts in _frames]
+
+
+class TokenPipeline:
+    """Sends tokens produced on any thread to a client, from a single sender task on the
+    event loop.
+
+    Producers push tokens into a bounded queue, without spinning up an event loop per token.
+    The sender coalesces them into frames, sent every `flush_ms` or as soon as `max_chars`
+    are pending.
+    """
+
+    def __init__(
+        self,
+        send_frame: Callable[[str, str], Awaitable[None]],
+        config: Optional[StreamConfig] = None,
+        loop: Optional[asyncio.AbstractEventLoop] = None,
+    ):
+        self.config = config or StreamConfig()
+        self.loop = loop or asyncio.get_event_loop()
+        self.dropped = 0
+        self._send_frame = send_frame
+        self._cond = threading.Condition()
+        self._items: Deque[Tuple[str, str]] = deque()
+        self._pending_chars = 0
+        self._put_seq = 0
+        self._sent_seq = 0
+        self._closed = False
+        self._failed = False
+        self._wakeup = asyncio.Event()
+        self._flush_now = asyncio.Event()
+        self._sent = asyncio.Condition()
+        self._task: Optional[asyncio.Future] = None
+        self._loop_thread = threading.get_ident()
+
+    def start(self) -> 'TokenPipeline':
+        self._task = asyncio.ensure_future(self._run())
+        return self
+
+    def put(self, text: str, kind: str = FrameKind.RESULT):
+        """Queues a token, can be called from any thread"""
+        if not text:
+            return
+
+        with self._cond:
+            while not self._closed and len(self._items) >= self.config.max_pending:
+                if self.config.backpressure == BackpressurePolicy.DROP:
+                    self.dropped += 1
+                    return
+                if threading.get_ident() == self._loop_thread:
+                    # blocking here would block the sender too
+                    break
+                self._cond.wait()
+
+            if self._closed:
+                return
+
+            self._items.append((kind, text))
+            self._pending_chars += len(text)
+            self._put_seq += 1
+            _wakeup = len(self._items) == 1
+            _flush_now = self._pending_chars >= self.config.max_chars
+
+        if _wakeup or _flush_now:
+            self.loop.call_soon_threadsafe(self._notify, _flush_now)
+
+    def _notify(self, flush_now: bool = False):
+        self._wakeup.set()
+        if flush_now:
+            self._flush_now.set()
+
+    async def _run(self):
+        _flush_s = self.config.flush_ms / 1000
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            if _flush_s > 0 and not self._flush_now.is_set():
+                try:
+                    await asyncio.wait_for(self._flush_now.wait(), _flush_s)
+                except asyncio.TimeoutError:
+                    pass
+            self._flush_now.clear()
+
+            with self._cond:
+                _items = list(self._items)
+                self._items.clear()
+                self._pending_chars = 0
+                _seq = self._put_seq
+                self._cond.notify_all()
+
+            if not self._failed:
+                try:
+                    for kind, text in _coalesce(_items):
+                        await self._send_frame(kind, text)
+                except Exception:
+                    # the client is gone, stop accepting tokens
+                    self._failed = True
+                    with self._cond:
+                        self._closed = True
+                        self._cond.notify_all()
+
+            async with self._sent:
+                self._sent_seq = _seq
+                self._sent.notify_all()
+
+    async def flush(self):
+        """Waits until all the tokens queued so far are sent"""
+        with self._cond:
+            _target = self._put_seq
+        if self._sent_seq >= _target or self._task is None or self._task.done():
+            return
+
+        self._notify(flush_now=True)
+        async with self._sent:
+            await self._sent.wait_for(lambda: self._sent_seq >= _target)
+
+    async def aclose(self):
+        await self.flush()
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self._task is not None:
+            self._task.cancel()
+
+
+class StreamingOutputResponse(StreamingResponse):
+    """Streams outputs as server-sent events if the client accepts `text/event-stream`,
+    else as newline-delimited JSON.
+    """
+
+    def __init__(
+        self,
+        outputs: AsyncIterator[Dict],
+        dumps: Callable[[Any], str] = json.dumps,
+    ):
+        self.outputs = outputs
+        self.dumps = dumps
+        super().__init__(self._ndjson(), media_type=NDJSON_MEDIA_TYPE)
+
+    async def _ndjson(self) -> AsyncIterator[str]:
+        async for output in self.outputs:
+            yield self.dumps(output) + '\n'
+
+    async def _sse(self) -> AsyncIterator[str]:
+        async for output in self.outputs:
+            yield f'data: {self.dumps(output)}\n\n'
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if SSE_MEDIA_TYPE in Headers(scope=scope).get('accept', ''):
+            self.media_type = SSE_MEDIA_TYPE
+            self.body_iterator = self._sse()
+            self.init_headers({'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+        await super().__call__(scope, receive, send)
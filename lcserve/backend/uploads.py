@@ -0,0 +1,103 @@
+import hashlib
+import os
+import re
+import uuid
+from dataclasses import dataclass
+from typing import Any, BinaryIO, Optional, Tuple, Union
+
+from ..errors import UploadTooLargeError
+from .playground.utils.helper import run_in_executor
+
+UPLOADS_DIR = 'uploads'
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+
+@dataclass
+class WorkspaceFile:
+    """A file uploaded to a `@serving` route & stored in the workspace.
+
+    Annotate a param with `WorkspaceFile` instead of `UploadFile` to receive the path of
+    the stored file, rather than reading the whole upload in memory. Identical uploads are
+    stored once, under their sha256.
+    """
+
+    path: str
+    sha256: str
+    filename: str = ''
+    content_type: str = ''
+    size: int = 0
+
+
+def unwrap_optional(annotation: Any) -> Any:
+    """`X` for an `Optional[X]` annotation, the annotation itself otherwise"""
+    _args = getattr(annotation, '__args__', None) or ()
+    if getattr(annotation, '__origin__', None) is Union and type(None) in _args:
+        _types = [_a for _a in _args if _a is not type(None)]
+        if len(_types) == 1:
+            return _types[0]
+    return annotation
+
+
+def _get_suffix(filename: str) -> str:
+    # keep the extension, loaders often pick a parser by it
+    _suffix = os.path.splitext(os.path.basename(filename or ''))[1]
+    return _suffix.lower() if re.fullmatch(r'\.[A-Za-z0-9]{1,16}', _suffix) else ''
+
+
+def _store(
+    file: BinaryIO, workspace: str, filename: str, max_size: Optional[int] = None
+) -> Tuple[str, str, int]:
+    _dir = os.path.join(workspace, UPLOADS_DIR)
+    os.makedirs(_dir, exist_ok=True)
+    _hash = hashlib.sha256()
+    _size = 0
+    _tmp_path = os.path.join(_dir, f'.{uuid.uuid4().hex}.part')
+    try:
+        with open(_tmp_path, 'wb') as f:
+            while True:
+                _chunk = file.read(UPLOAD_CHUNK_SIZE)
+                if not _chunk:
+                    break
+                _size += len(_chunk)
+                if max_size is not None and _size > max_size:
+                    raise UploadTooLargeError(filename, max_size)
+                _hash.update(_chunk)
+                f.write(_chunk)
+
+        _sha256 = _hash.hexdigest()
+        _path = os.path.join(_dir, _sha256 + _get_suffix(filename))
+        if os.path.exists(_path):
+            # identical upload, already stored
+            os.remove(_tmp_path)
+        else:
+            os.replace(_tmp_path, _path)
+    except BaseException:
+        if os.path.exists(_tmp_path):
+            os.remove(_tmp_path)
+        raise
+
+    return _path, _sha256, _size
+
+
+async def save_to_workspace(
+    upload_file: Any, workspace: str, max_size: Optional[int] = None
+) -> WorkspaceFile:
+    """Copies an upload, spooled by the multipart parser, to the workspace in chunks.
+    Raises `UploadTooLargeError`, leaving nothing behind, if it's over `max_size` bytes.
+    """
+    await upload_file.seek(0)
+    _path, _sha256, _size = await run_in_executor(
+        None,
+        _store,
+        file=upload_file.file,
+        workspace=workspace,
+        filename=upload_file.filename,
+        max_size=max_size,
+    )
+    return WorkspaceFile(
+        path=_path,
+        sha256=_sha256,
+        filename=upload_file.filename or '',
+        content_type=upload_file.content_type or '',
+        size=_size,
+    )
@@ -20,3 +20,31 @@ class InvalidDiskSizeError(ValueError):
     def __init__(self, disk_size):
         super().__init__("Invalid disk size: {}".format(disk_size))
         self.disk_size = disk_size
+
+
+class UploadTooLargeError(Exception):
+    def __init__(self, filename, max_size):
+        super().__init__(
+            "Upload {} is larger than {} bytes".format(filename or 'file', max_size)
+        )
+        self.filename = filename
+        self.max_size = max_size
+
+
+class RouteOverloadedError(Exception):
+    def __init__(self, route, status_code, retry_after=None):
+        super().__init__("Route {} is overloaded".format(route))
+        self.route = route
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class RunCancelledError(Exception):
+    def __init__(self, route, reason, timeout=None):
+        if timeout is not None and reason == 'timeout':
+            super().__init__("Route {} timed out after {}s".format(route, timeout))
+        else:
+            super().__init__("Route {} was cancelled: {}".format(route, reason))
+        self.route = route
+        self.reason = reason
+        self.timeout = timeout
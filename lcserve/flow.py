@@ -434,11 +434,22 @@ def get_global_jcloud_args(app_id: str = None, name: str = APP_NAME) -> Dict:
     }
 
 
-def get_uvicorn_args() -> Dict:
+def get_ws_per_message_deflate(envs: Dict = {}) -> bool:
+    # Set through the envs of the gateway, e.g. with `--env`, like `LCSERVE_COMPRESSION`
+    _value = envs.get(
+        'LCSERVE_WS_PER_MESSAGE_DEFLATE',
+        os.environ.get('LCSERVE_WS_PER_MESSAGE_DEFLATE', 'true'),
+    )
+    return str(_value).lower() not in ('0', 'false', 'no')
+
+
+def get_uvicorn_args(ws_per_message_deflate: bool = True) -> Dict:
     return {
         'uvicorn_kwargs': {
             'ws_ping_interval': None,
             'ws_ping_timeout': None,
+            # compress websocket messages, if the client supports it
+            'ws_per_message_deflate': ws_per_message_deflate,
         }
     }
 
@@ -449,7 +460,7 @@ def get_with_args_for_jcloud(cors: bool = True, envs: Dict = {}) -> Dict:
             'cors': cors,
             'extra_search_paths': ['/workdir/lcserve'],
             'env': envs or {},
-            **get_uvicorn_args(),
+            **get_uvicorn_args(get_ws_per_message_deflate(envs or {})),
         }
     }
 
@@ -502,7 +513,7 @@ def get_flow_dict(
             'port': [port],
             'protocol': ['websocket'] if is_websocket else ['http'],
             'env': _envs if _envs else {},
-            **get_uvicorn_args(),
+            **get_uvicorn_args(get_ws_per_message_deflate(_envs)),
             **(jcloud_config.to_dict() if jcloud else {}),
         },
         **(get_global_jcloud_args(app_id=app_id, name=name) if jcloud else {}),
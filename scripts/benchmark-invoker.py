@@ -0,0 +1,92 @@
+## under langchain-serve root dir
+# python scripts/benchmark-invoker.py
+## times requests to real HTTP routes, in-process through httpx, so that the numbers are
+## the per-request overhead of the gateway around a function doing nothing. Run it on two
+## checkouts to compare them, e.g. with `git worktree add /tmp/baseline <commit>` and
+# PYTHONPATH=/tmp/baseline python scripts/benchmark-invoker.py
+
+import asyncio
+import logging
+import tempfile
+import time
+from typing import Dict
+
+import httpx
+from fastapi import FastAPI
+from pydantic import Field, create_model
+
+from lcserve.backend.gateway import (
+    _get_input_model_fields,
+    _get_output_model_fields,
+    create_http_route,
+)
+
+N = 1_000
+ROUNDS = 10
+
+
+async def ask(question: str, urls: list, top_k: int = 5) -> str:
+    return question
+
+
+async def ask_with_kwargs(question: str, urls: list, top_k: int = 5, **kwargs) -> str:
+    return question
+
+
+class _Config:
+    arbitrary_types_allowed = True
+
+
+def _app(func) -> FastAPI:
+    app = FastAPI()
+    _name = func.__name__.title().replace('_', '')
+    _input_fields, _ = _get_input_model_fields(func)
+    create_http_route(
+        app=app,
+        func=func,
+        dirname=None,
+        auth_func=None,
+        file_params=[],
+        input_model=create_model(
+            f'Input{_name}',
+            __config__=_Config,
+            **_input_fields,
+            **{'envs': (Dict[str, str], Field(default={}, alias='envs'))},
+        ),
+        output_model=create_model(
+            f'Output{_name}', __config__=_Config, **_get_output_model_fields(func)
+        ),
+        openai_tracing=False,
+        post_kwargs={
+            'path': f'/{func.__name__}',
+            'name': _name,
+            'description': '',
+            'tags': [],
+        },
+        workspace=tempfile.mkdtemp(),
+        logger=logging.getLogger('lcserve-benchmark'),
+        tracer=None,
+    )
+    return app
+
+
+async def _time_requests(func) -> float:
+    """Seconds per request of the fastest of `ROUNDS` rounds of `N` sequential requests,
+    the others being slowed down by other processes, like `timeit` does"""
+    _body = {'question': 'What is lc-serve?', 'urls': ['a', 'b']}
+    _rounds = []
+    async with httpx.AsyncClient(app=_app(func), base_url='http://test') as client:
+        _response = await client.post(f'/{func.__name__}', json=_body)
+        assert _response.json()['result'] == _body['question'], _response.text
+        for _ in range(ROUNDS):
+            _start = time.perf_counter()
+            for _ in range(N):
+                await client.post(f'/{func.__name__}', json=_body)
+            _rounds.append((time.perf_counter() - _start) / N)
+    return min(_rounds)
+
+
+if __name__ == '__main__':
+    for func in [ask, ask_with_kwargs]:
+        _seconds = asyncio.run(_time_requests(func))
+        print(f'{func.__name__:>16}: {_seconds * 1e6:7.1f}µs per request')
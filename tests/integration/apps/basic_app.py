@@ -198,3 +198,9 @@ def tracing_ws(dummy: str, **kwargs):
     agent.run(dummy)
 
     return 'ok'
+
+
+@serving(websocket=True, multiplex=True)
+async def multiplexed_ws(interval: int, **kwargs) -> str:
+    await asyncio.sleep(interval)
+    return f"slept {interval}"
@@ -199,7 +199,7 @@ def examine_request_duration_with_retry(start_time, expected_value, route):
             pytest.fail("Timed out waiting for the Prometheus data to be populated")
 
         duration_seconds = get_values_from_prom(
-            "lcserve_request_duration_seconds", route
+            "lcserve_request_duration_seconds_sum", route
         )
         if round(float(duration_seconds)) == expected_value:
             break
@@ -55,6 +55,27 @@ async def test_basic_app_ws(run_test_app_locally, route):
         assert received_messages == ["0", "1", "2", "3", "4"]
 
 
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "run_test_app_locally, route",
+    [("basic_app", "multiplexed_ws")],
+    indirect=["run_test_app_locally"],
+)
+async def test_basic_app_ws_multiplexed(run_test_app_locally, route):
+    async with websockets.connect(os.path.join(WS_HOST, route)) as websocket:
+        await websocket.send(json.dumps({"request_id": "slow", "interval": 3}))
+        await websocket.send(json.dumps({"request_id": "fast", "interval": 1}))
+
+        received_messages = []
+        for _ in range(2):
+            message = json.loads(await websocket.recv())
+            assert message["done"]
+            received_messages.append((message["request_id"], message["result"]))
+
+        # both ran concurrently on the same connection, the fast one finished first
+        assert received_messages == [("fast", "slept 1"), ("slow", "slept 3")]
+
+
 @pytest.mark.parametrize(
     "run_test_app_locally, route",
     [
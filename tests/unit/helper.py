@@ -0,0 +1,91 @@
+import logging
+import tempfile
+from typing import Callable, Dict
+
+from fastapi import FastAPI
+from pydantic import Field, create_model
+
+from lcserve.backend.gateway import (
+    _get_batch_item_fields,
+    _get_file_field_params,
+    _get_input_model_fields,
+    _get_output_model_fields,
+    create_http_route,
+    create_websocket_route,
+)
+
+logger = logging.getLogger('lcserve-test')
+
+
+class _Config:
+    arbitrary_types_allowed = True
+
+
+def _get_models(func: Callable, batch: bool = False):
+    _name = func.__name__.title().replace('_', '')
+    _input_fields, _file_fields = _get_input_model_fields(func)
+    if batch:
+        _input_fields = _get_batch_item_fields(func, _input_fields)
+    input_model = create_model(
+        f'Input{_name}',
+        __config__=_Config,
+        **_input_fields,
+        **{'envs': (Dict[str, str], Field(default={}, alias='envs'))},
+    )
+    output_model = create_model(
+        f'Output{_name}',
+        __config__=_Config,
+        **_get_output_model_fields(func, batch=batch),
+    )
+    return _name, input_model, output_model, _get_file_field_params(_file_fields)
+
+
+def make_http_app(func: Callable, **kwargs) -> FastAPI:
+    """An app serving `func` on an HTTP route, like a `@serving` function"""
+    app = FastAPI()
+    _name, input_model, output_model, file_params = _get_models(
+        func, batch=kwargs.get('route_batcher') is not None
+    )
+    kwargs.setdefault('dirname', None)
+    create_http_route(
+        app=app,
+        func=func,
+        auth_func=None,
+        file_params=file_params,
+        input_model=input_model,
+        output_model=output_model,
+        openai_tracing=False,
+        post_kwargs={
+            'path': f'/{func.__name__}',
+            'name': _name,
+            'description': '',
+            'tags': [],
+        },
+        workspace=tempfile.mkdtemp(),
+        logger=logger,
+        tracer=None,
+        **kwargs,
+    )
+    return app
+
+
+def make_websocket_app(func: Callable, **kwargs) -> FastAPI:
+    """An app serving `func` on a websocket route, like a `@serving(websocket=True)` function"""
+    app = FastAPI()
+    _name, input_model, output_model, _ = _get_models(func)
+    kwargs.setdefault('dirname', None)
+    kwargs.setdefault('include_ws_callback_handlers', False)
+    create_websocket_route(
+        app=app,
+        func=func,
+        auth=None,
+        input_model=input_model,
+        output_model=output_model,
+        openai_tracing=False,
+        ws_kwargs={'path': f'/{func.__name__}', 'name': _name},
+        workspace=tempfile.mkdtemp(),
+        logger=logger,
+        tracer=None,
+        **kwargs,
+    )
+    return app
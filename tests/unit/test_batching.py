@@ -0,0 +1,75 @@
+import asyncio
+from typing import Dict, List
+
+import httpx
+import pytest
+
+from lcserve.backend.batching import MicroBatcher, get_batch_item_type
+
+from .helper import make_http_app
+
+
+def test_get_batch_item_type():
+    assert get_batch_item_type(List[str]) is str
+    assert get_batch_item_type(List[Dict[str, int]]) == Dict[str, int]
+    assert get_batch_item_type(str) is None
+
+
+@pytest.mark.asyncio
+async def test_micro_batcher_collects_concurrent_requests():
+    batches = []
+
+    async def _run_batch(items: List[Dict]) -> List[int]:
+        batches.append(len(items))
+        return [item['x'] * 2 for item in items]
+
+    batcher = MicroBatcher('/double', max_batch_size=3, max_wait_ms=50)
+    results = await asyncio.gather(
+        *[batcher.submit('', {'x': i}, _run_batch) for i in range(5)]
+    )
+    assert results == [0, 2, 4, 6, 8]
+    assert batches == [3, 2]
+
+
+@pytest.mark.asyncio
+async def test_micro_batcher_separates_keys_and_propagates_errors():
+    async def _run_batch(items: List[Dict]) -> List[int]:
+        if any(item['x'] < 0 for item in items):
+            raise ValueError('negative')
+        return [item['x'] for item in items]
+
+    batcher = MicroBatcher('/identity', max_batch_size=4, max_wait_ms=10)
+    results = await asyncio.gather(
+        batcher.submit('a', {'x': 1}, _run_batch),
+        batcher.submit('b', {'x': -1}, _run_batch),
+        return_exceptions=True,
+    )
+    assert results[0] == 1
+    assert isinstance(results[1], ValueError)
+
+
+def test_micro_batcher_validates_args():
+    with pytest.raises(ValueError):
+        MicroBatcher('/double', max_batch_size=0)
+
+    with pytest.raises(ValueError):
+        MicroBatcher('/double', max_wait_ms=-1)
+
+
+@pytest.mark.asyncio
+async def test_batched_route_returns_the_stdout_of_the_call_once():
+    def count(text: List[str]) -> List[int]:
+        print(f'counting {len(text)} texts')
+        return [len(t) for t in text]
+
+    app = make_http_app(
+        count, route_batcher=MicroBatcher('/count', max_batch_size=3, max_wait_ms=200)
+    )
+    async with httpx.AsyncClient(app=app, base_url='http://test') as client:
+        responses = await asyncio.gather(
+            *[client.post('/count', json={'text': 'a' * i}) for i in range(3)]
+        )
+
+    outputs = [response.json() for response in responses]
+    assert [o['result'] for o in outputs] == [0, 1, 2]
+    assert sorted(o['stdout'] for o in outputs) == ['', '', 'counting 3 texts']
@@ -0,0 +1,66 @@
+import asyncio
+import json
+
+from fastapi.testclient import TestClient
+
+from lcserve.backend.concurrency import RouteWorkerPool
+
+from .helper import make_http_app
+
+
+def _post_bulk(app, path: str, inputs: list, concurrency: int) -> list:
+    response = TestClient(app).post(
+        f'{path}/batch', params={'concurrency': concurrency}, json=inputs
+    )
+    assert response.status_code == 200
+    assert response.headers['content-type'].startswith('application/x-ndjson')
+    return [json.loads(line) for line in response.text.splitlines()]
+
+
+def test_bulk_route_streams_a_line_per_input_with_its_index():
+    running, peak = 0, 0
+
+    async def double(n: int) -> int:
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        # later inputs complete first
+        await asyncio.sleep(0.05 * (6 - n))
+        running -= 1
+        return n * 2
+
+    lines = _post_bulk(
+        make_http_app(double), '/double', [{'n': n} for n in range(6)], concurrency=2
+    )
+
+    assert sorted(line['index'] for line in lines) == list(range(6))
+    assert all(line['result'] == line['index'] * 2 for line in lines)
+    assert all(line['error'] == '' for line in lines)
+    # results are streamed as they complete, never more than `concurrency` at once
+    assert [line['index'] for line in lines] != list(range(6))
+    assert peak == 2
+
+
+def test_bulk_route_reports_rejected_inputs_on_their_line():
+    async def slow(n: int) -> int:
+        await asyncio.sleep(0.2)
+        return n
+
+    pool = RouteWorkerPool(route='/slow', max_concurrency=1, queue_size=0)
+    lines = _post_bulk(
+        make_http_app(slow, route_pool=pool),
+        '/slow',
+        [{'n': n} for n in range(3)],
+        concurrency=3,
+    )
+
+    by_index = {line['index']: line for line in lines}
+    assert sorted(by_index) == [0, 1, 2]
+    completed = [line for line in lines if line['error'] == '']
+    rejected = [line for line in lines if line['error'] != '']
+    assert len(completed) == 1
+    assert completed[0]['result'] == completed[0]['index']
+    # the 429 of the full pool ends up on the line of its input
+    assert len(rejected) == 2
+    assert all(line['error'] == 'Route /slow is overloaded' for line in rejected)
+    assert all(line['result'] == '' for line in rejected)
@@ -0,0 +1,148 @@
+import asyncio
+from typing import Dict
+
+import pytest
+from pydantic import BaseModel
+
+from lcserve.backend.caching import (
+    AuthCache,
+    CacheConfig,
+    RouteCache,
+    SingleFlight,
+    make_cache_key,
+)
+from lcserve.backend.decorators import serving
+
+
+class _Input(BaseModel):
+    question: str
+    envs: Dict[str, str] = {}
+
+
+def test_cache_key_excludes_envs_unless_configured():
+    a = _Input(question='q', envs={'OPENAI_API_KEY': 'a'})
+    b = _Input(question='q', envs={'OPENAI_API_KEY': 'b'})
+    assert make_cache_key('/ask', a) == make_cache_key('/ask', b)
+    assert make_cache_key('/ask', a, include_envs=True) != make_cache_key(
+        '/ask', b, include_envs=True
+    )
+    assert make_cache_key('/ask', a) != make_cache_key('/other', a)
+    assert make_cache_key('/ask', a, auth_response='u1') != make_cache_key(
+        '/ask', a, auth_response='u2'
+    )
+
+
+class _User:
+    def __init__(self, name: str):
+        self.name = name
+
+
+def test_cache_key_varies_on_a_json_serializable_auth_response(tmpdir):
+    data = _Input(question='q')
+    cache = RouteCache('/ask', CacheConfig(), workspace=str(tmpdir))
+    with pytest.raises(TypeError, match='CacheConfig\\(key=...\\)'):
+        cache.key(data, _User('alice'))
+
+    for key in ('name', lambda user: user.name):
+        cache = RouteCache('/ask', CacheConfig(key=key), workspace=str(tmpdir))
+        assert cache.key(data, _User('alice')) == cache.key(data, _User('alice'))
+        assert cache.key(data, _User('alice')) != cache.key(data, _User('bob'))
+
+    cache = RouteCache('/ask', CacheConfig(key='name'), workspace=str(tmpdir))
+    assert cache.key(data, {'name': 'alice'}) != cache.key(data, {'name': 'bob'})
+    # requests that can't be told apart aren't coalesced
+    assert SingleFlight('/ask').key(data, _User('alice')) is None
+
+
+@pytest.mark.asyncio
+async def test_memory_cache_evicts_least_recently_used(tmpdir):
+    cache = RouteCache('/ask', CacheConfig(max_entries=2), workspace=str(tmpdir))
+    await cache.set('a', {'result': 'a'})
+    await cache.set('b', {'result': 'b'})
+    assert await cache.get('a') == {'result': 'a'}
+    await cache.set('c', {'result': 'c'})
+    assert await cache.get('b') is None
+    assert await cache.get('a') == {'result': 'a'}
+    assert await cache.clear() == 2
+
+
+@pytest.mark.asyncio
+async def test_workspace_cache_survives_restarts(tmpdir):
+    config = CacheConfig(backend='workspace', max_entries=2)
+    cache = RouteCache('/ask', config, workspace=str(tmpdir))
+    for key in ['a', 'b', 'c']:
+        await cache.set(key, {'result': key})
+
+    cache = RouteCache('/ask', config, workspace=str(tmpdir))
+    assert await cache.get('a') is None
+    assert await cache.get('c') == {'result': 'c'}
+    assert await RouteCache('/other', config, workspace=str(tmpdir)).clear() == 0
+    assert await cache.clear() == 2
+
+
+@pytest.mark.asyncio
+async def test_expired_entries_are_not_returned(tmpdir):
+    for backend in ['memory', 'workspace']:
+        cache = RouteCache(
+            '/ask', CacheConfig(ttl=-1, backend=backend), workspace=str(tmpdir)
+        )
+        await cache.set('a', {'result': 'a'})
+        assert await cache.get('a') is None
+
+
+def test_cache_config_validates_args():
+    with pytest.raises(ValueError):
+        CacheConfig(backend='redis')
+
+    with pytest.raises(ValueError):
+        CacheConfig(max_entries=0)
+
+
+@pytest.mark.asyncio
+async def test_single_flight_shares_one_execution():
+    calls = []
+
+    async def _ask():
+        calls.append(1)
+        await asyncio.sleep(0.1)
+        return len(calls)
+
+    flight = SingleFlight('/ask')
+    results = await asyncio.gather(*[flight.do('a', _ask) for _ in range(3)])
+    assert results == [1, 1, 1]
+    assert await flight.do('a', _ask) == 2
+
+
+@pytest.mark.asyncio
+async def test_auth_cache_coalesces_lookups_and_caches_failures():
+    calls = []
+
+    async def _lookup(token: str):
+        calls.append(token)
+        await asyncio.sleep(0.05)
+        if token != 'valid':
+            raise Exception('Invalid token')
+        return 'username'
+
+    cache = AuthCache('authorizer', ttl=60, negative_ttl=60)
+    results = await asyncio.gather(
+        *[cache.authorize('valid', lambda: _lookup('valid')) for _ in range(3)]
+    )
+    assert results == ['username'] * 3
+    assert await cache.authorize('valid', lambda: _lookup('valid')) == 'username'
+
+    for _ in range(2):
+        with pytest.raises(Exception, match='Invalid token'):
+            await cache.authorize('invalid', lambda: _lookup('invalid'))
+    assert calls == ['valid', 'invalid']
+
+
+def test_websocket_routes_reject_caching_and_coalescing():
+    def talk(question: str) -> str:
+        return question
+
+    with pytest.raises(ValueError, match='cache'):
+        serving(talk, websocket=True, cache=True)
+    with pytest.raises(ValueError, match='coalesce'):
+        serving(talk, websocket=True, coalesce=True)
+    serving(talk, cache=True, coalesce=True)
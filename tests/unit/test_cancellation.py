@@ -0,0 +1,106 @@
+import asyncio
+import threading
+
+import pytest
+
+from lcserve.backend.cancellation import CancelReason, CancelToken, RunGuard
+from lcserve.errors import RunCancelledError
+
+
+class _Counter:
+    def __init__(self):
+        self.outcomes = []
+
+    def add(self, value, attributes):
+        self.outcomes.append(attributes['outcome'])
+
+
+@pytest.mark.asyncio
+async def test_run_guard_times_out_async_functions():
+    counter = _Counter()
+    guard = RunGuard('/slow', timeout=0.05, outcome_counter=counter)
+    cancelled = asyncio.Event()
+
+    async def _slow():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    with pytest.raises(RunCancelledError) as e:
+        await guard.run(_slow)
+    assert e.value.reason == CancelReason.TIMEOUT
+
+    await asyncio.wait_for(cancelled.wait(), 1)
+    assert await guard.run(lambda: asyncio.sleep(0, result=42)) == 42
+    assert counter.outcomes == ['timeout', 'completed']
+
+
+@pytest.mark.asyncio
+async def test_run_guard_cancels_sync_functions_on_disconnect():
+    counter = _Counter()
+    guard = RunGuard('/sync', outcome_counter=counter)
+    token = CancelToken()
+    stopped = threading.Event()
+    disconnected = asyncio.Event()
+
+    def _sync():
+        # a cooperative sync function, checking its token between steps
+        while not token.wait(0.01):
+            pass
+        stopped.set()
+
+    async def _run():
+        return await asyncio.get_running_loop().run_in_executor(None, _sync)
+
+    _task = asyncio.ensure_future(
+        guard.run(_run, cancel_token=token, disconnected=disconnected.wait)
+    )
+    await asyncio.sleep(0.05)
+    disconnected.set()
+
+    with pytest.raises(RunCancelledError) as e:
+        await _task
+    assert e.value.reason == CancelReason.DISCONNECTED
+    assert token.reason == CancelReason.DISCONNECTED
+    assert stopped.wait(1)
+    assert counter.outcomes == ['cancelled']
+
+
+@pytest.mark.asyncio
+async def test_run_guard_streams_under_a_single_deadline():
+    counter = _Counter()
+    guard = RunGuard('/stream', timeout=0.25, outcome_counter=counter)
+
+    async def _count(interval: float):
+        for i in range(5):
+            await asyncio.sleep(interval)
+            yield i
+
+    assert [i async for i in guard.stream(lambda: _count(0))] == [0, 1, 2, 3, 4]
+
+    items = []
+    with pytest.raises(RunCancelledError) as e:
+        async for i in guard.stream(lambda: _count(0.1)):
+            items.append(i)
+    assert e.value.reason == CancelReason.TIMEOUT
+    assert items == [0, 1]
+    assert counter.outcomes == ['completed', 'timeout']
+
+
+def test_cancel_token_of_all_tokens_waits_for_the_last_one():
+    tokens = [CancelToken() for _ in range(3)]
+    batch = CancelToken.all_of(tokens)
+
+    tokens[0].cancel()
+    tokens[1].cancel()
+    assert not batch.cancelled
+    tokens[2].cancel(CancelReason.CANCELLED)
+    assert batch.cancelled
+    assert batch.reason == CancelReason.CANCELLED
+
+    # still cancelled on its own, e.g. by the deadline of the batch
+    batch = CancelToken.all_of([CancelToken(), CancelToken()])
+    batch.cancel(CancelReason.TIMEOUT)
+    assert batch.wait(0)
@@ -0,0 +1,49 @@
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from fastapi.testclient import TestClient
+
+from lcserve.backend.compression import CompressionMiddleware
+
+
+def _client(minimum_size: int = 100) -> TestClient:
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware, minimum_size=minimum_size)
+
+    @app.get('/large')
+    def _large():
+        return PlainTextResponse('x' * 1000)
+
+    @app.get('/small')
+    def _small():
+        return PlainTextResponse('x' * 10)
+
+    @app.get('/stream')
+    def _stream():
+        return StreamingResponse(
+            iter(['x' * 1000, 'y' * 1000]), media_type='application/x-ndjson'
+        )
+
+    return TestClient(app)
+
+
+def test_compresses_large_responses_only():
+    client = _client()
+
+    response = client.get('/large', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['content-encoding'] == 'gzip'
+    assert response.headers['vary'] == 'Accept-Encoding'
+    assert int(response.headers['content-length']) < 1000
+    assert response.text == 'x' * 1000
+
+    response = client.get('/small', headers={'Accept-Encoding': 'gzip'})
+    assert 'content-encoding' not in response.headers
+
+    response = client.get('/large', headers={'Accept-Encoding': 'identity'})
+    assert 'content-encoding' not in response.headers
+    assert response.text == 'x' * 1000
+
+
+def test_streamed_responses_are_not_compressed():
+    response = _client().get('/stream', headers={'Accept-Encoding': 'gzip'})
+    assert 'content-encoding' not in response.headers
+    assert response.text == 'x' * 1000 + 'y' * 1000
@@ -0,0 +1,121 @@
+import asyncio
+import json
+import os
+import time
+from typing import AsyncGenerator
+
+import pytest
+from fastapi.testclient import TestClient
+
+from lcserve.backend.cancellation import RunGuard
+from lcserve.backend.concurrency import RouteWorkerPool
+from lcserve.backend.limiter import AdaptiveLimiter
+from lcserve.errors import RouteOverloadedError
+
+from .helper import make_http_app
+
+
+def _sleep(interval: float) -> float:
+    time.sleep(interval)
+    return interval
+
+
+@pytest.mark.asyncio
+async def test_route_worker_pool_rejects_when_queue_is_full():
+    pool = RouteWorkerPool(route='/sleep', max_concurrency=2, queue_size=1)
+    results = await asyncio.gather(
+        *[pool.run(_sleep, {'interval': 0.2}) for _ in range(5)], return_exceptions=True
+    )
+    rejected = [r for r in results if isinstance(r, RouteOverloadedError)]
+    assert len(rejected) == 2
+    assert all(r.status_code == 429 for r in rejected)
+    assert results.count(0.2) == 3
+    pool.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_route_worker_pool_rejects_after_queue_timeout():
+    pool = RouteWorkerPool(route='/sleep', max_concurrency=1, queue_timeout=0.1)
+    results = await asyncio.gather(
+        pool.run(_sleep, {'interval': 0.5}),
+        pool.run(_sleep, {'interval': 0.5}),
+        return_exceptions=True,
+    )
+    assert results[0] == 0.5
+    assert isinstance(results[1], RouteOverloadedError)
+    assert results[1].status_code == 503
+    assert pool.waiting == 0
+    pool.shutdown()
+
+
+def _getpid_and_env(name: str) -> tuple:
+    return os.getpid(), os.environ.get(name)
+
+
+@pytest.mark.asyncio
+async def test_route_worker_pool_runs_in_processes():
+    pool = RouteWorkerPool(route='/getpid', executor='process', workers=2)
+    pid, value = await pool.run(
+        _getpid_and_env, {'name': 'LCSERVE_TEST_ENV'}, envs={'LCSERVE_TEST_ENV': '1'}
+    )
+    assert pid != os.getpid()
+    assert value == '1'
+    pool.shutdown()
+
+
+def test_route_worker_pool_validates_args():
+    with pytest.raises(ValueError):
+        RouteWorkerPool(route='/sleep', max_concurrency=0)
+
+    with pytest.raises(ValueError):
+        RouteWorkerPool(route='/sleep', max_concurrency=1, queue_size=-1)
+
+    with pytest.raises(ValueError):
+        RouteWorkerPool(route='/sleep', max_concurrency=1, executor='greenlet')
+
+
+def test_generator_routes_hold_their_slots_until_exhausted():
+    pool = RouteWorkerPool(route='/count', max_concurrency=1)
+    limiter = AdaptiveLimiter('/count')
+    slots = []
+
+    async def count(n: int) -> AsyncGenerator[int, None]:
+        for i in range(n):
+            await asyncio.sleep(0)
+            slots.append((pool.running, limiter.inflight))
+            yield i
+
+    app = make_http_app(count, route_pool=pool, route_limiter=limiter)
+    response = TestClient(app).post('/count', json={'n': 3})
+
+    outputs = [json.loads(line) for line in response.text.splitlines()]
+
+    assert [o['result'] for o in outputs] == [0, 1, 2]
+    assert slots == [(1, 1)] * 3
+    assert (pool.running, limiter.inflight) == (0, 0)
+
+
+@pytest.mark.parametrize('pooled', [False, True])
+def test_timed_out_sync_routes_hold_their_slots_until_their_thread_is_done(pooled):
+    pool = RouteWorkerPool(route='/_sleep', max_concurrency=1) if pooled else None
+    limiter = AdaptiveLimiter('/_sleep')
+    app = make_http_app(
+        _sleep,
+        route_pool=pool,
+        route_limiter=limiter,
+        route_guard=RunGuard('/_sleep', timeout=0.1),
+    )
+
+    with TestClient(app) as client:
+        _start = time.perf_counter()
+        response = client.post('/_sleep', json={'interval': 0.5})
+        assert response.status_code == 504
+        assert time.perf_counter() - _start < 0.3
+        # the thread can't be stopped, so its slots aren't given to other requests yet
+        time.sleep(0.1)
+        assert limiter.inflight == 1
+        assert pool is None or pool.running == 1
+
+        time.sleep(0.5)
+        assert limiter.inflight == 0
+        assert pool is None or pool.running == 0
@@ -18,7 +18,11 @@ flow_dict_template = {
     "with": {
         "cors": True,
         "extra_search_paths": ["/workdir/lcserve"],
-        "uvicorn_kwargs": {"ws_ping_interval": None, "ws_ping_timeout": None},
+        "uvicorn_kwargs": {
+            "ws_ping_interval": None,
+            "ws_ping_timeout": None,
+            "ws_per_message_deflate": True,
+        },
         "env": {},
     },
     "gateway": {
@@ -30,7 +34,11 @@ flow_dict_template = {
         },
         "port": [8080],
         "protocol": [None],
-        "uvicorn_kwargs": {"ws_ping_interval": None, "ws_ping_timeout": None},
+        "uvicorn_kwargs": {
+            "ws_ping_interval": None,
+            "ws_ping_timeout": None,
+            "ws_per_message_deflate": True,
+        },
         "env": {},
         "jcloud": {
             "expose": True,
@@ -133,12 +141,41 @@ def test_get_flow_dict_for_local():
             },
             "port": [8080],
             "protocol": ["http"],
-            "uvicorn_kwargs": {"ws_ping_interval": None, "ws_ping_timeout": None},
+            "uvicorn_kwargs": {
+                "ws_ping_interval": None,
+                "ws_ping_timeout": None,
+                "ws_per_message_deflate": True,
+            },
             "env": {},
         },
     }
 
 
+@pytest.mark.parametrize(
+    "envs,per_message_deflate",
+    [
+        ({}, True),
+        ({"LCSERVE_WS_PER_MESSAGE_DEFLATE": "false"}, False),
+        ({"LCSERVE_WS_PER_MESSAGE_DEFLATE": "true"}, True),
+    ],
+)
+def test_get_flow_dict_sets_ws_per_message_deflate_from_envs(
+    envs, per_message_deflate, monkeypatch
+):
+    monkeypatch.setattr("dotenv.dotenv_values", lambda _: envs)
+    flow_dict = get_flow_dict(
+        module_str="dummy",
+        fastapi_app_str="dummy",
+        jcloud=False,
+        is_websocket=True,
+        env="dummy.env",
+    )
+    assert (
+        flow_dict["gateway"]["uvicorn_kwargs"]["ws_per_message_deflate"]
+        is per_message_deflate
+    )
+
+
 @pytest.mark.parametrize(
     "is_websocket,has_config,instance,autoscale_min,disk_size",
     [
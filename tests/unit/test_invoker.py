@@ -0,0 +1,62 @@
+from typing import Dict, Optional
+
+from pydantic import BaseModel
+
+from lcserve.backend.invoker import RouteInvoker
+from lcserve.backend.uploads import WorkspaceFile
+
+
+class _Input(BaseModel):
+    question: str
+    envs: Dict[str, str] = {}
+
+
+def _plain(question: str) -> str:
+    return question
+
+
+def _with_auth(question: str, auth_response: str, workspace: str) -> str:
+    return question
+
+
+def _with_kwargs(question: str, **kwargs) -> str:
+    return question
+
+
+def _with_files(
+    question: str, file: WorkspaceFile, extra: Optional[WorkspaceFile] = None
+) -> str:
+    return question
+
+
+def test_invoker_only_builds_what_the_function_takes():
+    input_data = _Input(question='q', envs={'KEY': 'value'})
+    extras = {'tracing_handler': object()}
+
+    func_data, envs = RouteInvoker(_plain, workspace='/ws').get_func_data(
+        input_data, auth_response='user', to_support_in_kwargs=extras
+    )
+    assert func_data == {'question': 'q'}
+    assert envs == {'KEY': 'value'}
+
+    func_data, _ = RouteInvoker(_with_auth, workspace='/ws').get_func_data(
+        input_data, auth_response='user', to_support_in_kwargs=extras
+    )
+    assert func_data == {'question': 'q', 'auth_response': 'user', 'workspace': '/ws'}
+
+    invoker = RouteInvoker(_with_kwargs, workspace='/ws')
+    assert invoker.takes_kwargs
+    func_data, _ = invoker.get_func_data(
+        '{"question": "q"}', auth_response='user', to_support_in_kwargs=extras
+    )
+    assert func_data == {
+        'question': 'q',
+        'auth_response': 'user',
+        'workspace': '/ws',
+        **extras,
+    }
+
+
+def test_invoker_stores_optional_workspace_files_too():
+    invoker = RouteInvoker(_with_files, workspace='/ws')
+    assert invoker.workspace_files == {'file', 'extra'}
@@ -0,0 +1,62 @@
+import asyncio
+
+import pytest
+
+from lcserve.backend.limiter import AdaptiveConcurrencyConfig, AdaptiveLimiter
+from lcserve.errors import RouteOverloadedError
+
+
+@pytest.mark.asyncio
+async def test_adaptive_limiter_sheds_requests_over_the_limit():
+    limiter = AdaptiveLimiter(
+        route='/ask', config=AdaptiveConcurrencyConfig(initial_limit=2)
+    )
+    release = asyncio.Event()
+
+    async def _request():
+        async with limiter.acquire():
+            await release.wait()
+
+    tasks = [asyncio.ensure_future(_request()) for _ in range(2)]
+    await asyncio.sleep(0)
+    with pytest.raises(RouteOverloadedError) as e:
+        async with limiter.acquire():
+            pass
+    assert e.value.status_code == 503
+    assert e.value.retry_after == 1
+
+    release.set()
+    await asyncio.gather(*tasks)
+    assert limiter.inflight == 0
+
+
+@pytest.mark.parametrize('algorithm', ['gradient', 'aimd'])
+def test_adaptive_limiter_follows_latency(algorithm):
+    limiter = AdaptiveLimiter(
+        route='/ask',
+        config=AdaptiveConcurrencyConfig(algorithm=algorithm, initial_limit=10),
+    )
+    # a busy route with a steady latency grows its limit
+    limiter._inflight = 10
+    for _ in range(20):
+        limiter.record(0.1)
+    grown = limiter.limit
+    assert grown > 10
+
+    # the upstream slows down 10x
+    for _ in range(10):
+        limiter.record(1.0)
+    assert limiter.limit < grown
+
+    # errors back off down to `min_limit`
+    for _ in range(100):
+        limiter.record(0.1, dropped=True)
+    assert limiter.limit == 1
+
+
+def test_adaptive_concurrency_config_validates_args():
+    with pytest.raises(ValueError):
+        AdaptiveConcurrencyConfig(algorithm='vegas')
+
+    with pytest.raises(ValueError):
+        AdaptiveConcurrencyConfig(min_limit=5, initial_limit=2)
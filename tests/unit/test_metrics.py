@@ -0,0 +1,177 @@
+import time
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from opentelemetry.sdk.metrics import MeterProvider
+from opentelemetry.sdk.metrics.export import InMemoryMetricReader
+from opentelemetry.sdk.trace import TracerProvider
+
+from lcserve.backend.gateway import MetricsMiddleware
+from lcserve.backend.metrics import (
+    LLM_LATENCY_BUCKETS,
+    InflightRequests,
+    TokenHistograms,
+    TokenMetrics,
+    create_histogram,
+)
+
+
+def _get_points(reader: InMemoryMetricReader) -> dict:
+    points = {}
+    for resource_metrics in reader.get_metrics_data().resource_metrics:
+        for scope_metrics in resource_metrics.scope_metrics:
+            for metric in scope_metrics.metrics:
+                points[metric.name] = list(metric.data.data_points)
+    return points
+
+
+def test_metrics_middleware_records_durations_in_a_histogram():
+    reader = InMemoryMetricReader()
+    meter = MeterProvider(metric_readers=[reader]).get_meter('test')
+    inflight = InflightRequests()
+    meter.create_observable_gauge(
+        'lcserve_inflight_requests', callbacks=[inflight.observe_count]
+    )
+
+    app = FastAPI()
+    app.add_middleware(
+        MetricsMiddleware,
+        duration_histogram=create_histogram(
+            meter, 'lcserve_request_duration_seconds', boundaries=LLM_LATENCY_BUCKETS
+        ),
+        inflight_requests=inflight,
+    )
+
+    @app.get('/ask')
+    def _ask():
+        assert len(inflight) == 1
+        return 'ok'
+
+    assert TestClient(app).get('/ask').status_code == 200
+    assert len(inflight) == 0
+
+    points = _get_points(reader)
+    (duration,) = points['lcserve_request_duration_seconds']
+    assert duration.count == 1
+    assert tuple(duration.explicit_bounds) == LLM_LATENCY_BUCKETS
+    assert dict(duration.attributes) == {'route': '/ask', 'protocol': 'http'}
+
+    (inflight_requests,) = points['lcserve_inflight_requests']
+    assert inflight_requests.value == 0
+
+
+def test_inflight_requests_are_labelled_with_the_route_template():
+    reader = InMemoryMetricReader()
+    meter = MeterProvider(metric_readers=[reader]).get_meter('test')
+    inflight = InflightRequests()
+    meter.create_observable_gauge(
+        'lcserve_inflight_requests', callbacks=[inflight.observe_count]
+    )
+    request_counter = meter.create_counter('lcserve_request_count')
+
+    app = FastAPI()
+    app.add_middleware(
+        MetricsMiddleware, request_counter=request_counter, inflight_requests=inflight
+    )
+
+    @app.get('/profiles/{profile_id}')
+    def _profile(profile_id: str):
+        return profile_id
+
+    client = TestClient(app)
+    for i in range(3):
+        assert client.get(f'/profiles/{i}').status_code == 200
+        assert client.get(f'/probe-{i}').status_code == 404
+
+    points = _get_points(reader)
+    (count,) = points['lcserve_request_count']
+    assert dict(count.attributes) == {
+        'route': '/profiles/{profile_id}',
+        'protocol': 'http',
+    }
+    assert count.value == 3
+    (inflight_requests,) = points['lcserve_inflight_requests']
+    assert dict(inflight_requests.attributes) == dict(count.attributes)
+    assert inflight_requests.value == 0
+
+    # reported with 0 requests once, then dropped
+    assert 'lcserve_inflight_requests' not in _get_points(reader)
+
+
+def test_profile_fetches_are_not_recorded_as_route_traffic():
+    reader = InMemoryMetricReader()
+    meter = MeterProvider(metric_readers=[reader]).get_meter('test')
+    inflight = InflightRequests()
+    meter.create_observable_gauge(
+        'lcserve_inflight_requests', callbacks=[inflight.observe_count]
+    )
+    request_counter = meter.create_counter('lcserve_request_count')
+
+    app = FastAPI()
+    app.add_middleware(
+        MetricsMiddleware, request_counter=request_counter, inflight_requests=inflight
+    )
+
+    @app.get('/debug/profile/{profile_id}')
+    def _profile(profile_id: str):
+        return profile_id
+
+    @app.get('/ask')
+    def _ask():
+        return 'ok'
+
+    client = TestClient(app)
+    assert client.get('/debug/profile/abc').status_code == 200
+    assert client.get('/ask').status_code == 200
+
+    points = _get_points(reader)
+    (count,) = points['lcserve_request_count']
+    assert dict(count.attributes) == {'route': '/ask', 'protocol': 'http'}
+    (inflight_requests,) = points['lcserve_inflight_requests']
+    assert dict(inflight_requests.attributes) == dict(count.attributes)
+
+
+def test_token_metrics_times_the_streamed_tokens():
+    reader = InMemoryMetricReader()
+    meter = MeterProvider(metric_readers=[reader]).get_meter('test')
+    histograms = TokenHistograms(
+        time_to_first_token=meter.create_histogram('ttft'),
+        inter_token_gap=meter.create_histogram('gap'),
+        tokens_per_second=meter.create_histogram('tps'),
+    )
+
+    with TracerProvider().get_tracer('test').start_as_current_span('ws') as span:
+        metrics = TokenMetrics(route='/ask', histograms=histograms, span=span)
+        metrics.on_start('run-1')
+        for _ in range(5):
+            time.sleep(0.01)
+            metrics.on_token('run-1')
+        metrics.on_end('run-1')
+
+    points = _get_points(reader)
+    (ttft,) = points['ttft']
+    assert ttft.count == 1 and ttft.sum >= 0.01
+    assert dict(ttft.attributes) == {'route': '/ask'}
+    (gap,) = points['gap']
+    assert gap.count == 4
+    (tps,) = points['tps']
+    assert 0 < tps.sum <= 100
+
+    assert span.attributes['llm.streamed_tokens'] == 5
+    assert span.attributes['llm.time_to_first_token_seconds'] == ttft.sum
+    assert [e.name for e in span.events] == ['first_token']
+
+
+@pytest.mark.asyncio
+async def test_tracing_handler_forgets_the_tokens_of_failed_llm_runs():
+    from lcserve.backend.langchain_helper import TracingCallbackHandler
+
+    tracer = TracerProvider().get_tracer('test')
+    with tracer.start_as_current_span('http') as span:
+        handler = TracingCallbackHandler(tracer=tracer, parent_span=span)
+        handler.on_llm_start({}, ['prompt'], run_id='run-1')
+        handler.on_llm_new_token('a', run_id='run-1')
+        await handler.on_llm_error(ValueError('rate limited'), run_id='run-1')
+
+    assert handler._token_timer._runs == {}
@@ -0,0 +1,81 @@
+import asyncio
+import os
+import threading
+import time
+from unittest.mock import MagicMock
+
+import pytest
+
+from lcserve.backend.monitoring import InstrumentedThreadPoolExecutor, LoopLagMonitor
+from lcserve.backend.playground.utils.helper import (
+    RequestCtxtManager,
+    install_contextual_environ,
+)
+
+
+def _block_the_loop(seconds: float):
+    time.sleep(seconds)
+
+
+@pytest.mark.asyncio
+async def test_loop_lag_monitor_dumps_the_stack_of_a_blocked_loop():
+    logger = MagicMock()
+    lag_histogram = MagicMock()
+    monitor = LoopLagMonitor(
+        logger=logger, interval=0.05, threshold=0.2, lag_histogram=lag_histogram
+    )
+    monitor.start()
+    try:
+        await asyncio.sleep(0.1)
+        _block_the_loop(0.6)
+        await asyncio.sleep(0.1)
+    finally:
+        monitor.stop()
+
+    # dumped once for the stall, while the loop was blocked
+    logger.warning.assert_called_once()
+    (message,) = logger.warning.call_args[0]
+    assert message.startswith('Event loop blocked for')
+    assert '_block_the_loop' in message
+
+    lags = [c[0][0] for c in lag_histogram.record.call_args_list]
+    assert max(lags) >= 0.5
+
+
+def test_instrumented_executor_counts_active_and_queued_items():
+    release = threading.Event()
+    executor = InstrumentedThreadPoolExecutor(max_workers=2)
+    futures = [executor.submit(release.wait) for _ in range(5)]
+    try:
+        time.sleep(0.1)
+        assert executor.active == 2
+        assert executor.queued == 3
+    finally:
+        release.set()
+        for future in futures:
+            future.result()
+
+    assert executor.active == 0
+    assert executor.queued == 0
+    executor.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_instrumented_executor_runs_items_with_the_envs_of_the_request():
+    install_contextual_environ()
+    loop = asyncio.get_running_loop()
+    executor = InstrumentedThreadPoolExecutor(max_workers=1)
+    loop.set_default_executor(executor)
+    try:
+        async with RequestCtxtManager({'LCSERVE_EXECUTOR_KEY': 'a'}):
+            # e.g. the sync fallbacks of LangChain
+            assert (
+                await loop.run_in_executor(None, os.environ.get, 'LCSERVE_EXECUTOR_KEY')
+                == 'a'
+            )
+        assert (
+            await loop.run_in_executor(None, os.environ.get, 'LCSERVE_EXECUTOR_KEY')
+            is None
+        )
+    finally:
+        executor.shutdown()
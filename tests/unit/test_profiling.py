@@ -0,0 +1,86 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from lcserve.backend.profiling import (
+    PROFILE_HEADER,
+    InvocationProfiles,
+    SamplingProfiler,
+    get_code,
+)
+
+
+def _spin(seconds: float):
+    _end = time.perf_counter() + seconds
+    while time.perf_counter() < _end:
+        sum(range(100))
+
+
+def _profiled_route(seconds: float):
+    _spin(seconds)
+
+
+def _other_route(seconds: float):
+    _spin(seconds)
+
+
+def _counts(collapsed: str) -> dict:
+    counts = {}
+    for line in collapsed.splitlines():
+        stack, count = line.rsplit(' ', 1)
+        counts[stack] = int(count)
+    return counts
+
+
+def test_sampling_profiler_keeps_the_stacks_running_the_code():
+    other = threading.Thread(target=_other_route, args=(0.3,))
+    with SamplingProfiler(interval=0.005, code=get_code(_profiled_route)) as profiler:
+        other.start()
+        _profiled_route(0.3)
+        other.join()
+
+    counts = _counts(profiler.collapsed())
+    assert sum(counts.values()) > 0
+    for stack in counts:
+        frames = stack.split(';')
+        assert frames[-2].startswith('_profiled_route (')
+        assert frames[-1].startswith('_spin (')
+        assert '_other_route' not in stack
+
+
+@pytest.mark.asyncio
+async def test_sampling_profiler_samples_the_wrapped_calls_only():
+    async def _ask(seconds: float):
+        _spin(seconds)
+        await asyncio.sleep(0)
+
+    profiler = SamplingProfiler(interval=0.005, wrapped=True)
+    with profiler:
+        await _ask(0.1)
+        await profiler.wrap(_ask)(0.2)
+        await asyncio.get_running_loop().run_in_executor(
+            None, profiler.wrap(_profiled_route), 0.2
+        )
+
+    stacks = list(_counts(profiler.collapsed()))
+    # a single call of `_ask` was wrapped, and sampled on the loop
+    assert sum('_ask (' in stack for stack in stacks) >= 1
+    assert any('_profiled_route (' in stack for stack in stacks)
+    assert all('_profiled' in stack for stack in stacks)
+
+
+def test_invocation_profiles_are_requested_with_the_token():
+    profiles = InvocationProfiles(token='secret', max_profiles=2)
+    assert profiles.requested({PROFILE_HEADER: 'secret'})
+    assert not profiles.requested({PROFILE_HEADER: 'wrong'})
+    assert not profiles.requested({})
+
+    first = profiles.add('a;b 1\n')
+    second = profiles.add('a;c 1\n')
+    third = profiles.add('a;d 1\n')
+    assert profiles.pop(first) is None
+    assert profiles.pop(second) == 'a;c 1\n'
+    assert profiles.pop(second) is None
+    assert profiles.pop(third) == 'a;d 1\n'
@@ -0,0 +1,41 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from opentelemetry.metrics import Observation
+
+from lcserve.backend.prometheus import PrometheusRegistry
+
+
+def test_prometheus_registry_renders_all_instruments():
+    registry = PrometheusRegistry()
+    counter = registry.create_counter('lcserve_request_count', description='Requests')
+    histogram = registry.create_histogram(
+        'lcserve_request_duration_seconds',
+        unit='s',
+        explicit_bucket_boundaries_advisory=(0.5, 1),
+    )
+    registry.create_observable_gauge(
+        'lcserve_inflight_requests',
+        callbacks=[lambda options: [Observation(3, {'route': '/ask'})]],
+    )
+
+    def _request(duration: float):
+        counter.add(1, {'route': '/ask'})
+        histogram.record(duration, {'route': '/ask'})
+
+    # each thread aggregates on its own, merged on render
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        list(executor.map(_request, [0.25, 0.5, 0.75, 2] * 25))
+
+    lines = registry.render().splitlines()
+    assert '# HELP lcserve_request_count Requests' in lines
+    assert '# TYPE lcserve_request_count counter' in lines
+    assert 'lcserve_request_count{route="/ask"} 100' in lines
+    assert '# TYPE lcserve_request_duration_seconds histogram' in lines
+    assert 'lcserve_request_duration_seconds_bucket{route="/ask",le="0.5"} 50' in lines
+    assert 'lcserve_request_duration_seconds_bucket{route="/ask",le="1"} 75' in lines
+    assert (
+        'lcserve_request_duration_seconds_bucket{route="/ask",le="+Inf"} 100' in lines
+    )
+    assert 'lcserve_request_duration_seconds_sum{route="/ask"} 87.5' in lines
+    assert 'lcserve_request_duration_seconds_count{route="/ask"} 100' in lines
+    assert 'lcserve_inflight_requests{route="/ask"} 3' in lines
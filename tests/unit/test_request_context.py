@@ -0,0 +1,174 @@
+import asyncio
+import json
+import os
+import time
+from typing import AsyncGenerator
+
+import httpx
+import pytest
+
+from lcserve.backend.playground.utils.helper import (
+    RequestCtxtManager,
+    StdoutCapture,
+    StdoutRingBuffer,
+    install_contextual_environ,
+    run_function,
+)
+
+from .helper import make_http_app
+
+
+def _read_env(key: str, interval: float) -> str:
+    time.sleep(interval)
+    os.environ['LCSERVE_WRITTEN_IN_REQUEST'] = key
+    return os.environ.get(key)
+
+
+@pytest.mark.asyncio
+async def test_envs_are_scoped_to_the_request():
+    install_contextual_environ()
+
+    async def _request(value: str, dirname: str):
+        async with RequestCtxtManager({'LCSERVE_TEST_KEY': value}, dirname):
+            return (
+                await run_function(_read_env, key='LCSERVE_TEST_KEY', interval=0.1),
+                os.getcwd(),
+            )
+
+    cwd = os.getcwd()
+    results = await asyncio.gather(
+        *[_request(str(i), os.path.dirname(__file__)) for i in range(5)]
+    )
+    assert results == [(str(i), os.path.dirname(__file__)) for i in range(5)]
+    assert 'LCSERVE_TEST_KEY' not in os.environ
+    assert 'LCSERVE_WRITTEN_IN_REQUEST' not in os.environ
+    assert os.getcwd() == cwd
+
+
+@pytest.mark.asyncio
+async def test_requests_for_the_same_directory_run_together(tmp_path):
+    dir_a, dir_b = str(tmp_path / 'a'), str(tmp_path / 'b')
+    os.makedirs(dir_a)
+    os.makedirs(dir_b)
+    running = {dir_a: 0, dir_b: 0}
+    peaks = {dir_a: 0, dir_b: 0}
+
+    async def _request(dirname: str):
+        async with RequestCtxtManager({}, dirname):
+            assert os.getcwd() == dirname
+            running[dirname] += 1
+            peaks[dirname] = max(peaks[dirname], running[dirname])
+            assert running[dir_a] == 0 or running[dir_b] == 0
+            await asyncio.sleep(0.1)
+            assert os.getcwd() == dirname
+            running[dirname] -= 1
+
+    cwd = os.getcwd()
+    start = time.perf_counter()
+    await asyncio.gather(*[_request(d) for d in [dir_a, dir_b] * 5])
+    elapsed = time.perf_counter() - start
+
+    # each directory is entered by all of its requests at once, rather than one by one
+    assert peaks == {dir_a: 5, dir_b: 5}
+    assert elapsed < 0.5
+    assert os.getcwd() == cwd
+
+
+def _print_lines(prefix: str, count: int):
+    for i in range(count):
+        print(f'{prefix}-{i}')
+        time.sleep(0.01)
+
+
+@pytest.mark.asyncio
+async def test_stdout_is_captured_per_request():
+    async def _request(prefix: str):
+        with StdoutCapture() as stdout:
+            await run_function(_print_lines, prefix=prefix, count=3)
+        return stdout.getvalue()
+
+    results = await asyncio.gather(*[_request(f'req{i}') for i in range(3)])
+    assert results == [f'req{i}-0\nreq{i}-1\nreq{i}-2' for i in range(3)]
+
+
+def test_stdout_ring_buffer_drops_oldest_output():
+    buffer = StdoutRingBuffer(max_chars=10)
+    buffer.write('abcdef')
+    buffer.write('ghijkl')
+    assert buffer.getvalue() == '[2 characters truncated]\ncdefghijkl'
+
+
+async def _post_until_first_chunk(app, path: str, body: dict, resume: asyncio.Event):
+    """Posts to a streaming route, like a client that stops reading after the first line
+    until `resume` is set. Returns the lines of the response."""
+    _body = json.dumps(body).encode()
+    _received = False
+    _chunks = []
+
+    async def _receive():
+        nonlocal _received
+        if not _received:
+            _received = True
+            return {'type': 'http.request', 'body': _body, 'more_body': False}
+        await asyncio.Event().wait()
+
+    async def _send(message):
+        if message['type'] == 'http.response.body' and message.get('body'):
+            _chunks.append(message['body'])
+            await resume.wait()
+
+    await app(
+        {
+            'type': 'http',
+            'asgi': {'version': '3.0'},
+            'http_version': '1.1',
+            'method': 'POST',
+            'scheme': 'http',
+            'path': path,
+            'raw_path': path.encode(),
+            'root_path': '',
+            'query_string': b'',
+            'headers': [(b'content-type', b'application/json')],
+            'client': ('test', 1),
+            'server': ('test', 80),
+        },
+        _receive,
+        _send,
+    )
+    return [json.loads(line) for line in b''.join(_chunks).splitlines()]
+
+
+@pytest.mark.asyncio
+async def test_streams_dont_hold_their_directory_while_the_client_reads(tmp_path):
+    dir_a, dir_b = str(tmp_path / 'a'), str(tmp_path / 'b')
+    os.makedirs(dir_a)
+    os.makedirs(dir_b)
+
+    async def stream(n: int) -> AsyncGenerator[str, None]:
+        for _ in range(n):
+            await asyncio.sleep(0)
+            yield os.getcwd()
+
+    def where() -> str:
+        return os.getcwd()
+
+    cwd = os.getcwd()
+    resume = asyncio.Event()
+    streaming = asyncio.ensure_future(
+        _post_until_first_chunk(
+            make_http_app(stream, dirname=dir_a), '/stream', {'n': 3}, resume
+        )
+    )
+    await asyncio.sleep(0.1)
+
+    # the client of the stream in `a` is slow, requests in `b` go ahead meanwhile
+    async with httpx.AsyncClient(
+        app=make_http_app(where, dirname=dir_b), base_url='http://test'
+    ) as client:
+        response = await asyncio.wait_for(client.post('/where', json={}), 1)
+    assert response.json()['result'] == dir_b
+
+    resume.set()
+    lines = await asyncio.wait_for(streaming, 1)
+    assert [line['result'] for line in lines] == [dir_a] * 3
+    assert os.getcwd() == cwd
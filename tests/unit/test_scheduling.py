@@ -0,0 +1,55 @@
+import asyncio
+
+import pytest
+
+from lcserve.backend.concurrency import RouteWorkerPool
+from lcserve.backend.scheduling import FairQueue, TenantConfig
+from lcserve.errors import RouteOverloadedError
+
+
+@pytest.mark.asyncio
+async def test_fair_queue_interleaves_tenants_by_weight():
+    queue = FairQueue(max_concurrency=1)
+    order = []
+
+    async def _request(tenant: str, weight: float):
+        await queue.acquire(tenant, weight)
+        order.append(tenant)
+        await asyncio.sleep(0)
+        queue.release()
+
+    await queue.acquire('heavy')
+    # the heavy tenant queues up first, yet the light one doesn't wait behind all of it
+    tasks = [asyncio.ensure_future(_request('heavy', 1)) for _ in range(6)]
+    tasks += [asyncio.ensure_future(_request('light', 2)) for _ in range(4)]
+    await asyncio.sleep(0)
+    queue.release()
+    await asyncio.gather(*tasks)
+
+    assert order[:6] == ['light', 'light', 'light', 'heavy', 'light', 'heavy']
+    assert not queue.locked()
+
+
+@pytest.mark.asyncio
+async def test_route_worker_pool_rate_limits_per_tenant():
+    pool = RouteWorkerPool(
+        route='/echo',
+        max_concurrency=2,
+        tenants=TenantConfig(key='tenant', rate=1, burst=2),
+    )
+
+    async def _echo(value: str) -> str:
+        return value
+
+    tenant = pool.get_tenant({'tenant': 'acme', 'user': 'alice'})
+    assert tenant == 'acme'
+    assert await pool.run(_echo, {'value': 'a'}, tenant=tenant) == 'a'
+    assert await pool.run(_echo, {'value': 'b'}, tenant=tenant) == 'b'
+    with pytest.raises(RouteOverloadedError) as e:
+        await pool.run(_echo, {'value': 'c'}, tenant=tenant)
+    assert e.value.status_code == 429
+    assert e.value.retry_after == 1
+
+    # other tenants have their own bucket
+    assert await pool.run(_echo, {'value': 'd'}, tenant='globex') == 'd'
+    pool.shutdown()
@@ -0,0 +1,64 @@
+from typing import Any, Dict, List, Optional
+
+import pytest
+from fastapi.testclient import TestClient
+from pydantic import BaseModel
+
+from lcserve.backend.serialization import is_json_native_type, orjson_dumps
+
+from .helper import make_http_app
+
+
+class _Model(BaseModel):
+    a: int
+
+
+@pytest.mark.parametrize(
+    'annotation, expected',
+    [
+        (str, True),
+        (Any, False),
+        (Optional[int], True),
+        (List[Dict[str, float]], True),
+        (Dict, False),
+        (list, False),
+        (Dict[str, Any], False),
+        (Dict[int, str], False),
+        (List[_Model], False),
+        (_Model, False),
+    ],
+)
+def test_is_json_native_type(annotation, expected):
+    assert is_json_native_type(annotation) is expected
+
+
+def test_orjson_dumps():
+    pytest.importorskip('orjson')
+    assert orjson_dumps({'result': [1, 'a', None], 'error': ''}) == (
+        '{"result":[1,"a",null],"error":""}'
+    )
+
+
+def test_orjson_route_returns_a_model_typed_as_any():
+    pytest.importorskip('orjson')
+
+    def ask(question: str) -> Any:
+        return _Model(a=len(question))
+
+    client = TestClient(make_http_app(ask, json_encoder='orjson'))
+    response = client.post('/ask', json={'question': 'hey'})
+    assert response.status_code == 200
+    assert response.json() == {'result': {'a': 3}, 'error': '', 'stdout': ''}
+
+
+def test_orjson_route_falls_back_for_values_orjson_cant_encode():
+    pytest.importorskip('orjson')
+
+    def tags(question: str) -> List[str]:
+        # not a list, sent without validation as the annotation is JSON-native
+        return {question}
+
+    client = TestClient(make_http_app(tags, json_encoder='orjson'))
+    response = client.post('/tags', json={'question': 'hey'})
+    assert response.status_code == 200
+    assert response.json() == {'result': ['hey'], 'error': '', 'stdout': ''}
@@ -0,0 +1,274 @@
+import asyncio
+import json
+import time
+from typing import AsyncGenerator, Dict, Generator
+
+import pytest
+from fastapi.testclient import TestClient
+
+from lcserve.backend.cancellation import RunGuard
+from lcserve.backend.decorators import serving
+from lcserve.backend.gateway import _get_output_model_fields
+from lcserve.backend.streaming import (
+    FrameKind,
+    StreamConfig,
+    TokenPipeline,
+    TokenStream,
+    is_generator_function,
+    iterate,
+    iterate_in_thread,
+)
+
+from .helper import make_http_app, make_websocket_app
+
+
+def _count(n: int, interval: float = 0):
+    for i in range(n):
+        time.sleep(interval)
+        yield i
+
+
+async def _acount(n: int):
+    for i in range(n):
+        yield i
+
+
+def test_is_generator_function():
+    assert is_generator_function(_count)
+    assert is_generator_function(_acount)
+    assert not is_generator_function(time.sleep)
+
+
+@pytest.mark.asyncio
+async def test_iterate_in_thread_does_not_block_the_loop():
+    ticks = []
+
+    async def _tick():
+        for _ in range(5):
+            ticks.append(time.perf_counter())
+            await asyncio.sleep(0.01)
+
+    _ticker = asyncio.ensure_future(_tick())
+    assert [i async for i in iterate_in_thread(_count(5, 0.02), maxsize=2)] == list(
+        range(5)
+    )
+    # the ticker kept running while the generator was sleeping
+    assert len(ticks) == 5
+    await _ticker
+
+
+@pytest.mark.asyncio
+async def test_iterate_in_thread_closes_the_generator_on_early_exit():
+    closed = []
+
+    def _forever():
+        try:
+            while True:
+                yield 1
+        finally:
+            closed.append(True)
+
+    async for _ in iterate_in_thread(_forever(), maxsize=1):
+        break
+    await asyncio.sleep(0.1)
+    assert closed == [True]
+
+
+@pytest.mark.asyncio
+async def test_iterate_propagates_errors():
+    def _fail():
+        yield 1
+        raise ValueError('bad')
+
+    items = []
+    with pytest.raises(ValueError):
+        async for item in iterate(_fail()):
+            items.append(item)
+    assert items == [1]
+    assert [i async for i in iterate(_acount(3))] == [0, 1, 2]
+
+
+@pytest.mark.asyncio
+async def test_token_stream_hands_over_tokens_from_threads():
+    stream = TokenStream()
+
+    def _produce():
+        for token in ['a', 'b', 'c']:
+            stream.put(token)
+        stream.close()
+
+    await asyncio.get_running_loop().run_in_executor(None, _produce)
+    assert [t async for t in stream] == ['a', 'b', 'c']
+
+
+@pytest.mark.asyncio
+async def test_token_pipeline_coalesces_tokens_into_frames():
+    frames = []
+
+    async def _send_frame(kind: str, text: str):
+        frames.append((kind, text))
+
+    pipeline = TokenPipeline(_send_frame, StreamConfig(flush_ms=50)).start()
+
+    def _produce():
+        for token in ['a', 'b', 'c']:
+            pipeline.put(token)
+        pipeline.put('printed\n', kind=FrameKind.STDOUT)
+        pipeline.put('d')
+
+    await asyncio.get_running_loop().run_in_executor(None, _produce)
+    await pipeline.flush()
+    assert frames == [
+        (FrameKind.RESULT, 'abc'),
+        (FrameKind.STDOUT, 'printed\n'),
+        (FrameKind.RESULT, 'd'),
+    ]
+    await pipeline.aclose()
+
+
+@pytest.mark.asyncio
+async def test_token_pipeline_flushes_at_max_chars():
+    frames = []
+
+    async def _send_frame(kind: str, text: str):
+        frames.append(text)
+
+    pipeline = TokenPipeline(_send_frame, StreamConfig(flush_ms=10000, max_chars=4))
+    pipeline.start()
+    pipeline.put('ab')
+    pipeline.put('cd')
+    await asyncio.sleep(0.05)
+    assert frames == ['abcd']
+    pipeline.put('e')
+    await asyncio.sleep(0.05)
+    assert frames == ['abcd']
+    await pipeline.aclose()
+    assert frames == ['abcd', 'e']
+
+
+@pytest.mark.asyncio
+async def test_token_pipeline_backpressure():
+    async def _send_frame(kind: str, text: str):
+        await asyncio.sleep(0.01)
+
+    config = StreamConfig(flush_ms=0, max_pending=2, backpressure='drop')
+    pipeline = TokenPipeline(_send_frame, config).start()
+    for _ in range(5):
+        pipeline.put('a')
+    assert pipeline.dropped == 3
+    await pipeline.aclose()
+
+    with pytest.raises(ValueError):
+        StreamConfig(backpressure='explode')
+
+
+@pytest.mark.asyncio
+async def test_token_pipeline_unblocks_producers_when_the_client_is_gone():
+    async def _send_frame(kind: str, text: str):
+        raise ConnectionError
+
+    pipeline = TokenPipeline(_send_frame, StreamConfig(flush_ms=0, max_pending=1))
+    pipeline.start()
+
+    def _produce():
+        for _ in range(10):
+            pipeline.put('a')
+
+    await asyncio.wait_for(
+        asyncio.get_running_loop().run_in_executor(None, _produce), timeout=1
+    )
+    await asyncio.wait_for(pipeline.aclose(), timeout=1)
+
+
+def test_output_model_of_annotated_generators_has_the_yielded_type():
+    def _words() -> Generator[str, None, None]:
+        yield 'a'
+
+    async def _counts() -> AsyncGenerator[Dict[str, int], None]:
+        yield {'a': 1}
+
+    assert _get_output_model_fields(_words)['result'][0] is str
+    assert _get_output_model_fields(_counts)['result'][0] == Dict[str, int]
+
+
+def test_websocket_route_streams_an_async_generator():
+    async def count(n: int) -> AsyncGenerator[int, None]:
+        for i in range(n):
+            await asyncio.sleep(0)
+            yield i
+
+    client = TestClient(make_websocket_app(count))
+    with client.websocket_connect('/count') as websocket:
+        websocket.send_json({'n': 3})
+        messages = [websocket.receive_json() for _ in range(3)]
+
+    assert [m['result'] for m in messages] == [0, 1, 2]
+    assert all(m['error'] == '' for m in messages)
+
+
+def test_slow_generator_route_times_out_with_an_error_line():
+    async def slow(n: int) -> AsyncGenerator[int, None]:
+        for i in range(n):
+            await asyncio.sleep(0.1)
+            yield i
+
+    app = make_http_app(slow, route_guard=RunGuard(route='/slow', timeout=0.35))
+    response = TestClient(app).post('/slow', json={'n': 100})
+    outputs = [json.loads(line) for line in response.text.splitlines()]
+
+    # the deadline covers the iteration, not only the call returning the generator
+    assert [o['result'] for o in outputs[:-1]] == [0, 1, 2]
+    assert all(o['error'] == '' for o in outputs[:-1])
+    assert outputs[-1]['result'] == ''
+    assert 'timed out' in outputs[-1]['error']
+
+
+def test_multiplexed_routes_reject_the_fields_of_their_messages():
+    def talk(question: str, request_id: str) -> str:
+        return question
+
+    with pytest.raises(ValueError, match='request_id'):
+        serving(talk, websocket=True, multiplex=True)
+    # fine on a connection per call
+    serving(talk, websocket=True)
+
+
+def test_multiplexed_route_tags_concurrent_invocations():
+    async def talk(question: str, delay: float, **kwargs) -> str:
+        await asyncio.sleep(delay)
+        return f'{question}:{"websocket" in kwargs}'
+
+    client = TestClient(
+        make_websocket_app(talk, multiplex=True, include_ws_callback_handlers=True)
+    )
+    with client.websocket_connect('/talk') as websocket:
+        websocket.send_json({'question': 'missing', 'delay': 0})
+        missing = websocket.receive_json()
+        assert missing['request_id'] is None
+        assert missing['error'] == '`request_id` is required'
+        assert missing['done']
+
+        # the second one completes first, on the same connection
+        websocket.send_json({'request_id': 'a', 'question': 'slow', 'delay': 0.3})
+        websocket.send_json({'request_id': 'b', 'question': 'fast', 'delay': 0})
+        # an id is rejected while it's running
+        websocket.send_json({'request_id': 'a', 'question': 'again', 'delay': 0})
+        outputs = [websocket.receive_json() for _ in range(3)]
+        assert [(o['request_id'], o['result'], o['done']) for o in outputs] == [
+            ('a', '', True),
+            ('b', 'fast:False', True),
+            ('a', 'slow:False', True),
+        ]
+        assert outputs[0]['error'] == 'a is already running'
+
+        # the last output is sent, a late cancel is ignored & the id can be reused
+        websocket.send_json({'request_id': 'a', 'cancel': True})
+        websocket.send_json({'request_id': 'c', 'question': 'long', 'delay': 10})
+        websocket.send_json({'request_id': 'c', 'cancel': True})
+        websocket.send_json({'request_id': 'a', 'question': 'reused', 'delay': 0})
+        outputs = [websocket.receive_json() for _ in range(2)]
+        assert [(o['request_id'], o['error'], o['done']) for o in outputs] == [
+            ('c', 'Cancelled', True),
+            ('a', '', True),
+        ]
+        assert outputs[1]['result'] == 'reused:False'
@@ -0,0 +1,88 @@
+import io
+import json
+import os
+from typing import Optional
+
+import pytest
+from fastapi.testclient import TestClient
+from starlette.datastructures import UploadFile
+
+from lcserve.backend import uploads
+from lcserve.backend.uploads import UPLOADS_DIR, WorkspaceFile, save_to_workspace
+from lcserve.errors import UploadTooLargeError
+
+from .helper import make_http_app
+
+
+@pytest.mark.asyncio
+async def test_save_to_workspace_dedupes_identical_uploads(tmpdir, monkeypatch):
+    monkeypatch.setattr(uploads, 'UPLOAD_CHUNK_SIZE', 7)
+    _content = b'hello world, ' * 100
+
+    first = await save_to_workspace(
+        UploadFile(io.BytesIO(_content), filename='a.pdf'), str(tmpdir)
+    )
+    assert first.size == len(_content)
+    assert first.filename == 'a.pdf'
+    assert first.path.endswith(f'{first.sha256}.pdf')
+    with open(first.path, 'rb') as f:
+        assert f.read() == _content
+
+    second = await save_to_workspace(
+        UploadFile(io.BytesIO(_content), filename='b.pdf'), str(tmpdir)
+    )
+    assert second.path == first.path
+    assert os.listdir(os.path.join(str(tmpdir), UPLOADS_DIR)) == [
+        os.path.basename(first.path)
+    ]
+
+
+@pytest.mark.asyncio
+async def test_save_to_workspace_aborts_uploads_over_the_max_size(tmpdir, monkeypatch):
+    monkeypatch.setattr(uploads, 'UPLOAD_CHUNK_SIZE', 7)
+    _content = b'hello world, ' * 100
+
+    with pytest.raises(UploadTooLargeError):
+        await save_to_workspace(
+            UploadFile(io.BytesIO(_content), filename='a.pdf'),
+            str(tmpdir),
+            max_size=len(_content) - 1,
+        )
+    # the partial copy is removed
+    assert os.listdir(os.path.join(str(tmpdir), UPLOADS_DIR)) == []
+
+    saved = await save_to_workspace(
+        UploadFile(io.BytesIO(_content), filename='a.pdf'),
+        str(tmpdir),
+        max_size=len(_content),
+    )
+    assert saved.size == len(_content)
+
+
+def test_route_rejects_uploads_over_the_max_size_with_413():
+    async def upload(
+        name: str,
+        file: WorkspaceFile,
+        extra: Optional[WorkspaceFile],
+        workspace: str,
+    ) -> str:
+        assert extra is None
+        return f'{name}:{file.size}:{os.listdir(os.path.join(workspace, UPLOADS_DIR))}'
+
+    client = TestClient(make_http_app(upload, max_upload_size=10))
+
+    response = client.post(
+        '/upload',
+        params={'input_data': json.dumps({'name': 'small'})},
+        files={'file': ('a.pdf', b'0123456789')},
+    )
+    assert response.status_code == 200, response.text
+    assert response.json()['result'].startswith('small:10:')
+
+    response = client.post(
+        '/upload',
+        params={'input_data': json.dumps({'name': 'large'})},
+        files={'file': ('a.pdf', b'0123456789a')},
+    )
+    assert response.status_code == 413
+    assert response.json()['detail'] == 'Upload a.pdf is larger than 10 bytes'